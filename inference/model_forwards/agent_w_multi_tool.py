@@ -2,6 +2,7 @@ from atexit import register
 from uuid import uuid4
 from typing import Dict, Callable
 from openai import OpenAI
+import asyncio
 import json
 import requests
 import time
@@ -20,6 +21,11 @@ base_url = os.getenv("BASE_URL")
 api_key = os.getenv("API_KEY")
 
 base_manager = StreamToolManager(url="http://localhost:30010", timeout=1800)
+# Close the manager's pooled async client when the benchmark run finishes
+register(lambda: asyncio.run(base_manager.aclose()))
+# "code" wraps each call in a print(tool(...)) snippet executed in the sandbox,
+# "direct" calls tools through the structured /call_tools fast path
+TOOL_CALL_MODE = os.getenv("TOOL_CALL_MODE", "code")
 
 
 def exec_code(code_snippet:str):
@@ -68,6 +74,28 @@ def serper_google_search(query, serper_api_key, top_k, region, lang, depth=0):
         print(traceback.format_exc())
         return []
     
+def exec_code_batch(code_snippets:list):
+    """Executes one snippet per tool call in a single round-trip, each in its own temporary session."""
+    print(f"executing {len(code_snippets)} code snippets in one batch")
+    results = base_manager.execute_batch(code_snippets)
+    return [r['output'] if not r['error'] else r['error'] for r in results]
+
+
+def call_tools_direct(calls:list):
+    """Calls (tool_name, args) pairs through the tool server without code generation."""
+    print(f"calling {len(calls)} tools directly")
+    results = base_manager.call_tools(calls)
+    contents = []
+    for r in results:
+        if not r['status']:
+            contents.append(r['error'])
+        elif isinstance(r['result'], str):
+            contents.append(r['result'])
+        else:
+            contents.append(json.dumps(r['result'], ensure_ascii=False))
+    return contents
+
+
 def web_search(key_word:str):
     return serper_google_search(key_word, serper_api_key, 10, "us", "en")
 
@@ -176,22 +204,38 @@ def call_model(
         
         tool_call_list = completion.choices[0].message.tool_calls
 
-        for tool_call in tool_call_list:
+        # Parse every tool call, then run all of them in a single round-trip
+        results = [None] * len(tool_call_list)
+        call_args_list = [None] * len(tool_call_list)
+        pending = []
+        for i, tool_call in enumerate(tool_call_list):
             try:
                 call_args = json.loads(tool_call.function.arguments)
+                call_args_list[i] = call_args
                 # 清理函数名中的非打印字符
                 clean_func_name = tool_call.function.name.replace('\u00a0', ' ')
                 clean_func_name = ''.join(c for c in clean_func_name if c.isprintable() or c in '\t\n\r')
-                code_snippest = "print("+ clean_func_name + dict_to_args_str(call_args) + ")"
-
-                result = exec_code(code_snippest)
-                print(f"Execution Results: {result}")
-
+                pending.append((i, clean_func_name.strip(), call_args))
+            except Exception as e:
+                results[i] = traceback.format_exc()
 
-                # result = tool_functions[tool_call.function.name](**call_args)
+        if pending:
+            try:
+                if TOOL_CALL_MODE == "direct":
+                    batch_results = call_tools_direct([(name, args) for _, name, args in pending])
+                else:
+                    batch_results = exec_code_batch([
+                        "print(" + name + dict_to_args_str(args) + ")" for _, name, args in pending
+                    ])
+                for (i, _, _), result in zip(pending, batch_results):
+                    results[i] = result
+                    print(f"Execution Results: {result}")
             except Exception as e:
-                result = traceback.format_exc()
+                error = traceback.format_exc()
+                for i, _, _ in pending:
+                    results[i] = error
 
+        for tool_call, call_args, result in zip(tool_call_list, call_args_list, results):
             print(f"Tool Call: {tool_call.function.name} with arguments {call_args} -> {result}")
             messages.append({
                 "role": "tool",
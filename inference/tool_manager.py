@@ -1,11 +1,15 @@
 from uuid import uuid4
+import os
 import requests
 import asyncio
 import aiohttp
 import httpx
 import json
-import threading
-
+from tool_backends.MCP.http_session import (
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_POOL_MAXSIZE,
+    get_http_session,
+)
 
 
 class BaseToolManager:
@@ -27,7 +31,7 @@ class BaseToolManager:
             "timeout": self.timeout
         }
         # print("execution...")
-        resp = requests.post(
+        resp = get_http_session().post(
             f"{self.server_url}/execute",
             headers=self.headers,
             json=payload
@@ -35,13 +39,55 @@ class BaseToolManager:
         # print(resp)
         return resp.json()
     
+    def execute_batch(self, snippets:list):
+        """
+        Executes several independent snippets in one /execute_batch request.
+
+        Each snippet is either a code string or a dict with 'code' and optional
+        'session_id'/'timeout'. Snippets without a session run in a temporary one.
+        Returns the per-snippet results in the same order.
+        """
+        payload = {
+            "snippets": [{"code": s} if isinstance(s, str) else s for s in snippets],
+            "timeout": self.timeout
+        }
+        resp = get_http_session().post(
+            f"{self.server_url}/execute_batch",
+            headers=self.headers,
+            json=payload
+        )
+        resp.raise_for_status()
+        return resp.json()["results"]
+
+    def call_tools(self, calls:list, max_result_chars:int=None, truncate:bool=True, session_id:str=None):
+        """
+        Calls tools directly through /call_tools, without generating or executing code.
+
+        `calls` is a list of (tool_name, args) pairs. Agent tools report to
+        `session_id`, or to a temporary session if it is not given. Returns the
+        per-call results (status, result, error, elapsed, truncated, ...) in the same order.
+        """
+        payload = {
+            "calls": [{"tool_name": name, "args": args} for name, args in calls],
+            "session_id": session_id,
+            "max_result_chars": max_result_chars,
+            "truncate": truncate
+        }
+        resp = get_http_session().post(
+            f"{self.server_url}/call_tools",
+            headers=self.headers,
+            json=payload
+        )
+        resp.raise_for_status()
+        return resp.json()["results"]
+
     def del_session(self):
         print(self.session_id)
         url = f"{self.server_url}/del_session"
         params = {"session_id": self.session_id}
         headers = self.headers
 
-        resp = requests.post(url, params=params, headers=headers)
+        resp = get_http_session().post(url, params=params, headers=headers)
         
         return resp.json()
 
@@ -49,25 +95,58 @@ class BaseToolManager:
 class AsyncToolManager(BaseToolManager):
     def __init__(self, url):
         super().__init__(url)
+        self._session = None
+        self._session_loop = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # The session is bound to the event loop it was created in, so recreate it
+        # if the manager is reused from a different loop (e.g. repeated asyncio.run)
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            await self.aclose()
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_MAXSIZE, keepalive_timeout=HTTP_KEEPALIVE_EXPIRY
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._session_loop = loop
+        return self._session
 
     async def execute_tool_async(self, tool_call: str):
         # tool_call = "from tools import *\n" + tool_call
         payload = {
             "code": tool_call
         }
-        async with aiohttp.ClientSession() as session:
+        session = await self._get_session()
+        try:
+            async with session.post(
+                f"{self.server_url}/execute",
+                headers=self.headers,
+                json=payload
+            ) as resp:
+                if resp.status == 200:
+                    return await resp.json()
+                else:
+                    return {"error": "Request failed", "status_code": resp.status}
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def aclose(self):
+        """
+        Closes the pooled aiohttp session. A session left over from an event loop
+        that has already been closed is closed on a best-effort basis.
+        """
+        session, self._session = self._session, None
+        if session is not None and not session.closed:
             try:
-                async with session.post(
-                    f"{self.server_url}/execute",
-                    headers=self.headers,
-                    json=payload
-                ) as resp:
-                    if resp.status == 200:
-                        return await resp.json()
-                    else:
-                        return {"error": "Request failed", "status_code": resp.status}
-            except Exception as e:
-                return {"error": str(e)}    
+                await session.close()
+            except RuntimeError as e:
+                print(f"Failed to close HTTP session of a previous event loop: {e}")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
 
 
 class StreamToolManager(BaseToolManager):
@@ -77,50 +156,96 @@ class StreamToolManager(BaseToolManager):
         self.headers['session_id'] = session_id
         # self.session_id = str("test_id2")
         self.timeout = timeout
+        self._client = None
+        self._client_loop = None
 
-    async def submit_task(self, code:str):
+    async def _get_client(self) -> httpx.AsyncClient:
+        # One pooled client per manager, recreated only if the event loop changed
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            await self.aclose()
+            limits = httpx.Limits(
+                max_connections=HTTP_POOL_MAXSIZE,
+                max_keepalive_connections=HTTP_POOL_MAXSIZE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            )
+            self._client = httpx.AsyncClient(timeout=None, limits=limits)
+            self._client_loop = loop
+        return self._client
+
+    async def submit_task(self, code:str, stream_output:bool=False):
         submit_url = f"{self.server_url}/submit"
 
         payload = {
             "code":code,
             "session_id":self.session_id,
-            "timeout": self.timeout
+            "timeout": self.timeout,
+            # stream stdout as "code_output" items while the code runs
+            "stream_output": stream_output
         }
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    submit_url,
-                    headers=self.headers,
-                    json=payload
-                ) as resp:
-                    if resp.status == 200:
-                        return await resp.json()
-                    else:
-                        return {"status": "fail", "status_code": resp.status}
-            except Exception as e:
-                return {"status": "fail", "error":f"{e}"}
-
-
-    async def recieve_task_process(self, ):
+        client = await self._get_client()
+        try:
+            resp = await client.post(
+                submit_url,
+                headers=self.headers,
+                json=payload,
+                timeout=300,
+            )
+            if resp.status_code == 200:
+                return resp.json()
+            else:
+                return {"status": "fail", "status_code": resp.status_code}
+        except Exception as e:
+            return {"status": "fail", "error":f"{e}"}
+
+
+    async def recieve_task_process(self, max_reconnects:int=5):
         recieve_url = f"{self.server_url}/get_mcp_result/{self.session_id}"
-        async with httpx.AsyncClient(timeout=None) as client:
-            async with client.stream("GET", recieve_url, headers=self.headers) as response:
-                async for line in response.aiter_lines():
-                    if not line.strip():
-                        continue
-                    data = json.loads(line)
-                    # print("Received:", data)
-                    # print(data['content'], end="", flush=True)
-                    # print(data['content'], data['stream_state'])
-
-
-                    if (not data.get("sub_stream_type")) and (data.get("stream_state") == "end"):
-                        yield data
-                        break    
-                    else:
+        headers = {**self.headers, "Accept": "text/event-stream"}
+        client = await self._get_client()
+        last_event_id = None
+        reconnects = 0
+        while True:
+            if last_event_id is not None:
+                # Resume right after the last event we received
+                headers["Last-Event-ID"] = str(last_event_id)
+            try:
+                async with client.stream("GET", recieve_url, headers=headers) as response:
+                    event_id, data_lines = None, []
+                    async for line in response.aiter_lines():
+                        if line.startswith(":"):
+                            # SSE comment, e.g. keep-alive
+                            continue
+                        if line:
+                            field, _, value = line.partition(":")
+                            value = value[1:] if value.startswith(" ") else value
+                            if field == "id":
+                                event_id = int(value)
+                            elif field == "data":
+                                data_lines.append(value)
+                            continue
+
+                        # A blank line terminates the event
+                        if not data_lines:
+                            continue
+                        data = json.loads("\n".join(data_lines))
+                        if event_id is not None:
+                            last_event_id = event_id
+                        event_id, data_lines = None, []
+
                         yield data
-                        
+                        if (not data.get("sub_stream_type")) and (data.get("stream_state") == "end"):
+                            return
+                # The server closed the stream without an end item
+                return
+            except httpx.TransportError as e:
+                reconnects += 1
+                if reconnects > max_reconnects:
+                    raise
+                print(f"Result stream interrupted ({e}), resuming after event {last_event_id}")
+                await asyncio.sleep(min(0.2 * 2 ** reconnects, 5))
+
     async def execute_code_async_stream(self, tool_call: str,):
         submit_status = await self.submit_task(tool_call)
         if submit_status["status"] == "fail":
@@ -146,13 +271,32 @@ class StreamToolManager(BaseToolManager):
         return return_value
 
     async def close_session(self):
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f"{self.server_url}/del_session",
-                params={"session_id": self.session_id},
-                headers=self.headers
-            )
-            return resp.json()
+        client = await self._get_client()
+        resp = await client.post(
+            f"{self.server_url}/del_session",
+            params={"session_id": self.session_id},
+            headers=self.headers,
+            timeout=300,
+        )
+        return resp.json()
+
+    async def aclose(self):
+        """
+        Closes the pooled httpx client. A client left over from an event loop that
+        has already been closed is closed on a best-effort basis.
+        """
+        client, self._client = self._client, None
+        if client is not None and not client.is_closed:
+            try:
+                await client.aclose()
+            except RuntimeError as e:
+                print(f"Failed to close HTTP client of a previous event loop: {e}")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
 
 
 
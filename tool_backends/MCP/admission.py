@@ -0,0 +1,183 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Optional
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a code execution cannot be admitted because the wait queue is full.
+    """
+
+
+class _SessionSlot:
+    """
+    A per-session semaphore together with the number of callers currently
+    holding or waiting on it, so idle slots can be dropped.
+    """
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.refs = 0
+
+
+class Admission:
+    """
+    An admitted execution, as yielded by ``AdmissionController.admit``.
+
+    :ivar wait_time: The time in seconds spent waiting for admission.
+    """
+
+    def __init__(self, wait_time: float):
+        self.wait_time = wait_time
+        self.pending: Optional[asyncio.Future] = None
+
+    def hold_session_until(self, future: asyncio.Future):
+        """
+        Keeps the session slot and the global slot held after the context exits,
+        until ``future`` finishes. Used when the caller stops waiting for work
+        that keeps running (e.g. a timed-out execution thread): the next
+        execution of the session cannot run concurrently with it in the same
+        namespace, and abandoned threads count against ``max_in_flight`` so that
+        repeated timeouts queue or reject new work instead of piling up threads.
+        """
+        self.pending = future
+
+
+class AdmissionController:
+    """
+    Admission control for sandbox code executions.
+
+    It enforces three limits:
+      - a global number of executions running at once (``max_in_flight``),
+      - a per-session number of executions running at once (``per_session``),
+        since executions of one session share the same namespace,
+      - a bounded number of callers waiting for a slot (``max_queue``); callers
+        arriving when the wait queue is full are rejected immediately.
+
+    :ivar max_in_flight: Maximum number of executions running concurrently.
+    :ivar max_queue: Maximum number of executions waiting for admission.
+    :ivar per_session: Maximum number of concurrent executions per session.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, per_session: int = 1):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.per_session = per_session
+
+        self._global = asyncio.Semaphore(max_in_flight)
+        self._sessions: Dict[str, _SessionSlot] = {}
+
+        self.waiting = 0
+        self.in_flight = 0
+        # Abandoned (timed-out) executions still running, holding their session and global slots
+        self.lingering = 0
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.last_wait_time = 0.0
+
+    def has_capacity(self) -> bool:
+        """
+        Returns True if a new caller would currently be accepted into the wait queue.
+        """
+        return self.waiting < self.max_queue
+
+    def _retain_slot(self, session_id: str) -> _SessionSlot:
+        slot = self._sessions.get(session_id)
+        if slot is None:
+            slot = _SessionSlot(self.per_session)
+            self._sessions[session_id] = slot
+        slot.refs += 1
+        return slot
+
+    def _release_slot(self, session_id: str, slot: _SessionSlot):
+        slot.refs -= 1
+        if slot.refs == 0 and self._sessions.get(session_id) is slot:
+            del self._sessions[session_id]
+
+    @asynccontextmanager
+    async def admit(self, session_id: str) -> AsyncIterator[Admission]:
+        """
+        Waits for a session slot and a global slot, holding both for the duration
+        of the context.
+
+        The session slot is acquired first so that a session waiting on its own
+        previous execution does not occupy a global slot. If the caller registered
+        unfinished work with ``Admission.hold_session_until``, both slots are
+        released only once that work finishes.
+
+        :param session_id: The session the execution belongs to.
+        :raises AdmissionRejected: If the wait queue is already full.
+        :return: The Admission, holding the time spent waiting for admission.
+        """
+        if not self.has_capacity():
+            self.rejected_total += 1
+            raise AdmissionRejected(
+                f"Execution queue is full ({self.waiting} waiting, {self.in_flight} running)"
+            )
+
+        slot = self._retain_slot(session_id)
+        self.waiting += 1
+        start_time = time.monotonic()
+        session_acquired = False
+        try:
+            await slot.semaphore.acquire()
+            session_acquired = True
+            await self._global.acquire()
+        except BaseException:
+            if session_acquired:
+                slot.semaphore.release()
+            self._release_slot(session_id, slot)
+            raise
+        finally:
+            self.waiting -= 1
+
+        wait_time = time.monotonic() - start_time
+        self.admitted_total += 1
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+        self.last_wait_time = wait_time
+        self.in_flight += 1
+        admission = Admission(wait_time)
+
+        def release(_=None):
+            self._global.release()
+            slot.semaphore.release()
+            self._release_slot(session_id, slot)
+
+        try:
+            yield admission
+        finally:
+            self.in_flight -= 1
+            if admission.pending is not None and not admission.pending.done():
+                self.lingering += 1
+                admission.pending.add_done_callback(self._end_linger)
+                admission.pending.add_done_callback(release)
+            else:
+                release()
+
+    def _end_linger(self, _):
+        self.lingering -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns a snapshot of the current queue depth, concurrency and wait times.
+        """
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "per_session": self.per_session,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "lingering": self.lingering,
+            "active_sessions": len(self._sessions),
+            "admitted_total": self.admitted_total,
+            "rejected_total": self.rejected_total,
+            "wait_time_avg": (
+                self.wait_time_total / self.admitted_total if self.admitted_total else 0.0
+            ),
+            "wait_time_max": self.wait_time_max,
+            "last_wait_time": self.last_wait_time,
+        }
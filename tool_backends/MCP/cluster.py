@@ -0,0 +1,99 @@
+import os
+import json
+import asyncio
+import logging
+import httpx
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Proxy side: static list of "host:port" backends
+PROXY_BACKENDS_FILE = os.getenv(
+    "PROXY_BACKENDS_FILE", os.path.join(current_dir, "config/proxy_backends.json")
+)
+
+# Worker side: where to register and which address to advertise
+PROXY_URL = os.getenv("PROXY_URL", "")
+ADVERTISE_HOST = os.getenv("ADVERTISE_HOST", "127.0.0.1")
+REGISTER_INTERVAL = float(os.getenv("REGISTER_INTERVAL", 30))
+
+
+def load_backends(start_port: int, num_workers: int) -> List[str]:
+    """
+    Returns the backend workers the proxy should start with.
+
+    Backends are read, in order of precedence, from the comma-separated
+    ``BACKENDS`` environment variable, from the JSON list in
+    ``config/proxy_backends.json``, and finally from the local port range
+    ``127.0.0.1:{start_port}`` .. ``127.0.0.1:{start_port + num_workers - 1}``.
+
+    :param start_port: First port of the local worker range.
+    :param num_workers: Number of local workers.
+    :return: A list of backends as "host:port".
+    """
+    env_backends = os.getenv("BACKENDS", "")
+    if env_backends.strip():
+        return [b.strip() for b in env_backends.split(",") if b.strip()]
+
+    if os.path.exists(PROXY_BACKENDS_FILE):
+        try:
+            with open(PROXY_BACKENDS_FILE, "r") as file:
+                backends = json.load(file)
+            if backends:
+                return [str(b).strip() for b in backends]
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"Failed to load backends from {PROXY_BACKENDS_FILE}: {e}")
+
+    return [f"127.0.0.1:{port}" for port in range(start_port, start_port + num_workers)]
+
+
+def advertise_address(port: int) -> str:
+    """Returns the "host:port" under which this worker registers with the proxy."""
+    return f"{ADVERTISE_HOST}:{port}"
+
+
+async def _post_to_proxy(endpoint: str, payload: dict) -> bool:
+    try:
+        async with httpx.AsyncClient(timeout=5) as client:
+            resp = await client.post(f"{PROXY_URL}{endpoint}", json=payload)
+            return resp.status_code == 200
+    except Exception as e:
+        logger.warning(f"Could not reach proxy at {PROXY_URL}: {e}")
+        return False
+
+
+async def registration_loop(port: int):
+    """
+    Registers this worker with the proxy and keeps re-announcing it, so that a
+    restarted proxy learns about the worker again. Announcements never undo a
+    drain that an operator started on the proxy.
+
+    Does nothing unless ``PROXY_URL`` is configured.
+
+    :param port: The port this worker listens on.
+    """
+    if not PROXY_URL:
+        return
+    backend = advertise_address(port)
+    registered = False
+    while True:
+        ok = await _post_to_proxy("/admin/workers/heartbeat", {"backend": backend})
+        if ok and not registered:
+            logger.info(f"Registered worker {backend} with proxy {PROXY_URL}")
+        registered = ok
+        await asyncio.sleep(REGISTER_INTERVAL if ok else min(REGISTER_INTERVAL, 2))
+
+
+async def deregister(port: int):
+    """
+    Removes this worker from the proxy on shutdown. Does nothing unless
+    ``PROXY_URL`` is configured.
+
+    :param port: The port this worker listens on.
+    """
+    if not PROXY_URL:
+        return
+    backend = advertise_address(port)
+    if await _post_to_proxy("/admin/workers/deregister", {"backend": backend}):
+        logger.info(f"Deregistered worker {backend} from proxy {PROXY_URL}")
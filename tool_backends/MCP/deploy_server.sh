@@ -7,10 +7,14 @@ CONFIG_FILE="$SCRIPT_DIR/config/api_keys.json"
 TEMPLATE_FILE="$SCRIPT_DIR/config/api_keys.template.json"
 
 # Set default port configuration
-export START_PORT=40001
-export NUM_WORKERS=1
+export START_PORT=${START_PORT:-40001}
+export NUM_WORKERS=${NUM_WORKERS:-1}
 export END_PORT=$((START_PORT + NUM_WORKERS - 1))
 
+# Cluster mode: set START_PROXY=0 on hosts that only run workers, and point
+# PROXY_URL (plus ADVERTISE_HOST, this host's reachable address) at the proxy
+START_PROXY=${START_PROXY:-1}
+
 # Check if config file exists, if not copy from template
 if [ ! -f "$CONFIG_FILE" ]; then
     if [ -f "$TEMPLATE_FILE" ]; then
@@ -49,8 +53,10 @@ fi
 
 # Start proxy service
 # ! Attention: change the port to your own
-echo "Starting Proxy Service on port $START_PORT"
-python proxy_service.py &
+if [ "$START_PROXY" = "1" ]; then
+    echo "Starting Proxy Service on port ${PROXY_PORT:-30010}"
+    python proxy_service.py &
+fi
 
 # Starting working instances...
 for port in $(seq $START_PORT $END_PORT); do
@@ -0,0 +1,91 @@
+import bisect
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+class ConsistentHashRing:
+    """
+    A consistent-hash ring with virtual nodes.
+
+    Every node is placed on the ring ``vnodes`` times, so keys spread evenly and
+    adding or removing a node only remaps the keys that node gains or loses,
+    instead of nearly every key as with ``hash % num_nodes``.
+
+    :ivar vnodes: Number of virtual nodes placed on the ring per node.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 160):
+        self.vnodes = vnodes
+        self._keys: List[int] = []
+        self._ring: Dict[int, str] = {}
+        self._nodes: set = set()
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # The first 8 bytes of MD5 give a well-distributed 64-bit position
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    @property
+    def nodes(self) -> List[str]:
+        """Returns the nodes currently on the ring."""
+        return sorted(self._nodes)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._nodes
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def add_node(self, node: str):
+        """
+        Places a node and its virtual nodes on the ring. Adding an existing node is a no-op.
+        """
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for i in range(self.vnodes):
+            position = self._hash(f"{node}#{i}")
+            # On the (very unlikely) event of a collision the first node keeps the point
+            if position in self._ring:
+                continue
+            self._ring[position] = node
+            bisect.insort(self._keys, position)
+
+    def remove_node(self, node: str):
+        """
+        Removes a node and its virtual nodes from the ring. Removing an unknown node is a no-op.
+        """
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        self._keys = [k for k in self._keys if self._ring[k] != node]
+        self._ring = {k: self._ring[k] for k in self._keys}
+
+    def iter_nodes(self, key: str) -> Iterator[str]:
+        """
+        Yields each distinct node in ring order, starting from the owner of ``key``.
+
+        The first node yielded is the owner; the following ones are the failover
+        candidates, in the order they would take over the key.
+
+        :param key: The key to locate on the ring.
+        """
+        if not self._keys:
+            return
+        start = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        seen = set()
+        for offset in range(len(self._keys)):
+            node = self._ring[self._keys[(start + offset) % len(self._keys)]]
+            if node not in seen:
+                seen.add(node)
+                yield node
+                if len(seen) == len(self._nodes):
+                    return
+
+    def get_node(self, key: str) -> Optional[str]:
+        """
+        Returns the node owning ``key``, or None if the ring is empty.
+        """
+        return next(self.iter_nodes(key), None)
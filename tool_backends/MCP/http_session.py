@@ -0,0 +1,48 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connection pool settings for HTTP calls to the tool server, shared by the
+# sandbox (calls back into the server) and the inference tool managers
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 4))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 16))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 0))
+HTTP_KEEP_ALIVE = os.getenv("HTTP_KEEP_ALIVE", "1") != "0"
+# Seconds an idle keep-alive connection of the async clients is kept open
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 60))
+
+_local = threading.local()
+
+
+def _create_session() -> requests.Session:
+    """
+    Creates a requests.Session whose HTTPAdapter keeps a pool of reusable connections.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=HTTP_MAX_RETRIES,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Connection"] = "keep-alive" if HTTP_KEEP_ALIVE else "close"
+    return session
+
+
+def get_http_session() -> requests.Session:
+    """
+    Returns the calling thread's long-lived requests.Session.
+
+    requests.Session is not safe to share across threads, and both sandbox code and
+    benchmark workers run in many threads at once, so each thread gets its own
+    pooled session which is reused for every subsequent call from that thread.
+
+    :return: The thread-local requests.Session.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _create_session()
+        _local.session = session
+    return session
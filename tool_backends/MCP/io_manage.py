@@ -1,28 +1,191 @@
+import os
+import time
+import threading
 from io import StringIO
+from collections import deque
+from typing import Callable, Dict, Optional
+
+# Maximum stdout bytes kept per execution; the first and last halves are retained
+MAX_OUTPUT_BYTES = int(os.getenv("MAX_OUTPUT_BYTES", 1024 * 1024))
+# Streamed output is sent once this many bytes are pending, or when the interval has passed
+OUTPUT_CHUNK_BYTES = int(os.getenv("OUTPUT_CHUNK_BYTES", 4096))
+OUTPUT_CHUNK_INTERVAL = float(os.getenv("OUTPUT_CHUNK_INTERVAL", 0.5))
+
+TRUNCATION_MARKER = "\n... [output truncated: {dropped} bytes omitted] ...\n"
+
 
 class OutputCapture:
-    def __init__(self):
-        self.stdout = StringIO()  # catch std out
+    """
+    Captures the stdout of one code execution with bounded memory.
+
+    Up to ``max_bytes`` are kept: the first half of the output and its most recent
+    half. Everything in between is dropped and replaced by a truncation marker in
+    ``get_stdout``. When ``on_chunk`` is given, output is also handed to it in chunks
+    of about ``chunk_bytes`` while the code runs, until ``max_bytes`` have been streamed.
+
+    :ivar total_bytes: Number of bytes written in total.
+    :ivar dropped_bytes: Number of bytes dropped from the middle of the output.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = MAX_OUTPUT_BYTES,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        chunk_bytes: int = OUTPUT_CHUNK_BYTES,
+        chunk_interval: float = OUTPUT_CHUNK_INTERVAL,
+    ):
+        self.stdout = StringIO()  # catch std out (head of the output)
         self.stderr = StringIO()  # catch std err
+        self.max_bytes = max_bytes
+        self.head_limit = max_bytes - max_bytes // 2
+        self.tail_limit = max_bytes // 2
+        self.total_bytes = 0
+        self.dropped_bytes = 0
+        self.head_bytes = 0
+        self.closed = False
+        self._tail = deque()
+        self._tail_bytes = 0
+        self._lock = threading.Lock()
+
+        self.on_chunk = on_chunk
+        self.chunk_bytes = chunk_bytes
+        self.chunk_interval = chunk_interval
+        self.streamed_bytes = 0
+        self._pending = []
+        self._pending_bytes = 0
+        self._last_emit = time.monotonic()
+
+    @property
+    def truncated(self) -> bool:
+        return self.dropped_bytes > 0
 
     def write(self, data: str):
-        self.stdout.write(data)
+        if not data or self.closed:
+            return
+        encoded = data.encode("utf-8", errors="replace")
+        with self._lock:
+            self.total_bytes += len(encoded)
+            self._keep(data, encoded)
+            chunk = self._stream(data, len(encoded))
+        if chunk:
+            self.on_chunk(chunk)
+
+    def _keep(self, data: str, encoded: bytes):
+        room = self.head_limit - self.head_bytes
+        if room > 0:
+            if len(encoded) <= room:
+                self.stdout.write(data)
+                self.head_bytes += len(encoded)
+                return
+            head = encoded[:room].decode("utf-8", errors="ignore")
+            self.stdout.write(head)
+            self.head_bytes = self.head_limit
+            encoded = encoded[room:]
+
+        # Keep only the most recent tail_limit bytes after the head
+        self._tail.append(encoded)
+        self._tail_bytes += len(encoded)
+        while self._tail_bytes > self.tail_limit:
+            excess = self._tail_bytes - self.tail_limit
+            oldest = self._tail[0]
+            if len(oldest) <= excess:
+                self._tail.popleft()
+                self._tail_bytes -= len(oldest)
+                self.dropped_bytes += len(oldest)
+            else:
+                self._tail[0] = oldest[excess:]
+                self._tail_bytes -= excess
+                self.dropped_bytes += excess
+
+    def _stream(self, data: str, size: int) -> Optional[str]:
+        if self.on_chunk is None or self.streamed_bytes >= self.max_bytes:
+            return None
+        self._pending.append(data)
+        self._pending_bytes += size
+        if (
+            self._pending_bytes >= self.chunk_bytes
+            or time.monotonic() - self._last_emit >= self.chunk_interval
+        ):
+            return self._take_pending()
+        return None
+
+    def _take_pending(self) -> Optional[str]:
+        if not self._pending:
+            return None
+        chunk = "".join(self._pending)
+        self.streamed_bytes += self._pending_bytes
+        self._pending = []
+        self._pending_bytes = 0
+        self._last_emit = time.monotonic()
+        if self.streamed_bytes >= self.max_bytes:
+            chunk += "\n... [output streaming stopped: limit of {} bytes reached] ...\n".format(
+                self.max_bytes
+            )
+        return chunk
 
     def flush(self):
         self.stdout.flush()
         self.stderr.flush()
+        if self.on_chunk is None:
+            return
+        with self._lock:
+            chunk = self._take_pending()
+        if chunk:
+            self.on_chunk(chunk)
 
     def get_stdout(self) -> str:
-        return self.stdout.getvalue()
+        with self._lock:
+            head = self.stdout.getvalue()
+            tail = b"".join(self._tail).decode("utf-8", errors="ignore")
+            dropped = self.dropped_bytes
+        if dropped:
+            return head + TRUNCATION_MARKER.format(dropped=dropped) + tail
+        return head + tail
 
     def get_stderr(self) -> str:
         return self.stderr.getvalue()
 
     def close(self):
+        self.closed = True
         self.stdout.close()
         self.stderr.close()
+        self._tail.clear()
+        self._pending = []
+
 
 # thread-safe output manager
 class ThreadOutputManager:
-    def get_capture(self) -> OutputCapture:
-        return OutputCapture() 
\ No newline at end of file
+    """
+    Creates output captures and keeps running statistics about captured output.
+    """
+
+    def __init__(self, max_bytes: int = MAX_OUTPUT_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {
+            "captures": 0,
+            "truncated_captures": 0,
+            "total_bytes": 0,
+            "dropped_bytes": 0,
+            "streamed_bytes": 0,
+            "max_capture_bytes": 0,
+        }
+
+    def get_capture(self, on_chunk: Optional[Callable[[str], None]] = None) -> OutputCapture:
+        return OutputCapture(max_bytes=self.max_bytes, on_chunk=on_chunk)
+
+    def record(self, capture: OutputCapture):
+        """Adds a finished capture to the statistics."""
+        with self._lock:
+            self._stats["captures"] += 1
+            self._stats["truncated_captures"] += int(capture.truncated)
+            self._stats["total_bytes"] += capture.total_bytes
+            self._stats["dropped_bytes"] += capture.dropped_bytes
+            self._stats["streamed_bytes"] += capture.streamed_bytes
+            self._stats["max_capture_bytes"] = max(
+                self._stats["max_capture_bytes"], capture.total_bytes
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"max_output_bytes": self.max_bytes, **self._stats}
@@ -1,10 +1,47 @@
 import os, sys
 import asyncio
+import anyio
 from typing import Optional
 from contextlib import AsyncExitStack
-from mcp import ClientSession, StdioServerParameters
+from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
 from mcp.client.sse import sse_client
+from mcp.shared.exceptions import McpError
+
+# JSON-RPC error code the mcp client uses when the transport closes mid-request
+CONNECTION_CLOSED = getattr(types, "CONNECTION_CLOSED", -32000)
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """
+    Returns True if an exception raised by a tool call means the connection to the
+    server is broken (closed streams, dead subprocess), as opposed to the tool
+    itself failing.
+
+    :param error: The exception raised by the call.
+    :rtype: bool
+    """
+    if isinstance(
+        error,
+        (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream, ConnectionError),
+    ):
+        return True
+    if isinstance(error, McpError):
+        return getattr(error.error, "code", None) == CONNECTION_CLOSED
+    return False
+
+
+def is_send_error(error: BaseException) -> bool:
+    """
+    Returns True if a connection error was raised while writing the request, so
+    the server never received the call and it is safe to send it again. A
+    connection that closes while waiting for the response raises McpError
+    instead; the call may have run by then.
+
+    :param error: The exception raised by the call.
+    :rtype: bool
+    """
+    return isinstance(error, (anyio.ClosedResourceError, anyio.BrokenResourceError))
 
 
 class MCPClient:
@@ -228,6 +265,22 @@ class MCPClient:
                         results.append(r_dict.get("resource")) # Assuming 'resource' field holds URI/identifier
             return results
 
+    async def ping(self, timeout: float) -> bool:
+        """
+        Checks that the server still answers requests.
+
+        :param timeout: Seconds to wait for the ping response.
+        :return: True if the server answered in time, False otherwise.
+        :rtype: bool
+        """
+        if not self.session:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout)
+            return True
+        except Exception:
+            return False
+
     async def cleanup(self):
         """
         Performs asynchronous cleanup by closing the AsyncExitStack,
@@ -1,29 +1,156 @@
 import os, sys
 import json
-from typing import List, Dict, Any
-from mcp_client import MCPClient
+import time
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
+from mcp_client import MCPClient, is_connection_error, is_send_error
+from tool_cache import ToolCache
+from rate_limiter import RateLimiter, RateLimitExceeded
+from metrics import REGISTRY
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
 
-
-def load_serverlist() -> List[str]:
+# Seconds one server may take to start, initialize and list its tools
+SERVER_CONNECT_TIMEOUT = float(os.getenv("SERVER_CONNECT_TIMEOUT", 60))
+# Backoff between connection attempts for servers that failed or are not up yet
+SERVER_RETRY_INITIAL = float(os.getenv("SERVER_RETRY_INITIAL", 2))
+SERVER_RETRY_MAX = float(os.getenv("SERVER_RETRY_MAX", 60))
+# Connections (stdio subprocesses or SSE sessions) opened per server by default;
+# every extra connection to a stdio server is one more subprocess
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", 1))
+# Idle connections are pinged every MCP_HEALTH_INTERVAL seconds and reconnected
+# after MCP_HEALTH_FAIL_THRESHOLD consecutive failed pings
+MCP_HEALTH_INTERVAL = float(os.getenv("MCP_HEALTH_INTERVAL", 30))
+MCP_HEALTH_TIMEOUT = float(os.getenv("MCP_HEALTH_TIMEOUT", 10))
+MCP_HEALTH_FAIL_THRESHOLD = int(os.getenv("MCP_HEALTH_FAIL_THRESHOLD", 2))
+# Seconds between automatic tool list refreshes; 0 disables them
+TOOL_REFRESH_INTERVAL = float(os.getenv("TOOL_REFRESH_INTERVAL", 0))
+
+TOOL_CALL_SECONDS = REGISTRY.histogram(
+    "mcp_tool_call_seconds", "Latency of tool calls through MCPManager, including cache hits", ["tool"]
+)
+TOOL_CALLS = REGISTRY.counter(
+    "mcp_tool_calls_total", "Tool calls through MCPManager by outcome", ["tool", "status"]
+)
+
+
+def load_serverlist() -> List[Any]:
     """
     Loads the list of server endpoints from the 'config/server_list.json' file.
 
-    The configuration file is expected to be a JSON array of strings, where
-    each string is a server path (local file) or an SSE URL (http/https link).
+    The configuration file is expected to be a JSON array. Each entry is either a
+    string, the server path (local file) or an SSE URL (http/https link), or an
+    object {"server": ..., "pool_size": N} to open N connections to that server
+    instead of MCP_POOL_SIZE.
 
     :raises FileNotFoundError: If the configuration file is missing.
     :raises json.JSONDecodeError: If the configuration file content is invalid JSON.
-    :return: A list of server configuration strings.
-    :rtype: List[str]
+    :return: A list of server configuration entries.
+    :rtype: List[Any]
     """
     config_path = os.path.join(current_dir, "config/server_list.json")
     with open(config_path, "r") as file:
         return json.load(file)
 
 
+class ToolUnavailableError(RuntimeError):
+    """
+    Raised when a tool cannot be called because its server is not connected,
+    either because it is still starting or because its connection was lost.
+    """
+
+
+class Replica:
+    """
+    One connection to a server: a stdio subprocess or an SSE session.
+
+    :ivar index: Position of the replica in its server's pool.
+    :ivar status: "pending" before the first connection attempt finished,
+                  "ready" while connected, "failed" otherwise.
+    :ivar in_flight: Number of tool calls currently running on this connection.
+    """
+
+    def __init__(self, index: int):
+        self.index = index
+        self.status: str = "pending"
+        self.client: Optional[MCPClient] = None
+        self.in_flight: int = 0
+        self.calls: int = 0
+        self.attempts: int = 0
+        self.reconnects: int = 0
+        self.error: Optional[str] = None
+        self.ready_since: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        # Set to release the current connection
+        self.stop = asyncio.Event()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "status": self.status,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "attempts": self.attempts,
+            "reconnects": self.reconnects,
+            "error": self.error,
+            "ready_since": self.ready_since,
+        }
+
+
+class ServerState:
+    """
+    Connection state of one server from the server list and its pool of replicas.
+
+    :ivar server: The server path or SSE URL.
+    :ivar name: The server name reported on initialization, once known.
+    :ivar replicas: The connections opened to this server.
+    :ivar tools: Sanitized tool descriptions from the last successful connection.
+    """
+
+    def __init__(self, server: str, pool_size: int = 1):
+        self.server = server
+        self.name: Optional[str] = None
+        self.replicas: List[Replica] = [Replica(i) for i in range(max(1, pool_size))]
+        self.tools: List[Dict[str, Any]] = []
+        # Set when the server was removed from the server list by a reload
+        self.removed: bool = False
+        # Set once the server is ready or every replica failed its first attempt
+        self.settled = asyncio.Event()
+
+    @property
+    def status(self) -> str:
+        """"ready" if any replica is connected, "pending" while replicas are still starting, else "failed"."""
+        statuses = {replica.status for replica in self.replicas}
+        if "ready" in statuses:
+            return "ready"
+        if "pending" in statuses:
+            return "pending"
+        return "failed"
+
+    @property
+    def error(self) -> Optional[str]:
+        errors = [replica.error for replica in self.replicas if replica.error]
+        return errors[-1] if errors else None
+
+    def pick(self) -> Optional[Replica]:
+        """Returns the connected replica with the fewest calls in flight, or None."""
+        ready = [replica for replica in self.replicas if replica.status == "ready"]
+        if not ready:
+            return None
+        return min(ready, key=lambda replica: replica.in_flight)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "server": self.server,
+            "name": self.name,
+            "status": self.status,
+            "tools": [tool["name"] for tool in self.tools],
+            "error": self.error,
+            "replicas": [replica.describe() for replica in self.replicas],
+        }
+
+
 class MCPManager:
     """
     Manages connections to multiple Multi-Content Protocol (MCP) servers
@@ -31,103 +158,420 @@ class MCPManager:
 
     It handles initialization, connection, tool renaming (converting 'tool-name'
     to 'tool_name'), and routing tool calls to the correct MCPClient instance.
+
+    Every server is served by a pool of replicas (connections), each kept alive
+    by its own supervisor task: replicas connect concurrently in the background,
+    idle replicas are health-checked with pings, and replicas that fail are
+    reconnected with exponential backoff. Tool calls go to the least busy
+    connected replica of the tool's server.
+
+    The tool registry is versioned: every change to the set of available tools
+    swaps in new registry containers and increments ``registry_version``, so
+    sessions can tell when their tool wrappers are out of date.
     """
 
     def __init__(self):
         """
         Initializes the MCPManager with empty lists and dictionaries to store
-        clients, tools, and the mapping between original tool names and
+        servers, tools, and the mapping between original tool names and
         sanitized function names.
         """
-        self.client_list: List[MCPClient] = []
-        # Maps sanitized tool function name (e.g., 'search_papers_enhanced') to its client
-        self.tool_client: Dict[str, MCPClient] = {}
+        self.servers: List[ServerState] = []
+        # Maps sanitized tool function name (e.g., 'search_papers_enhanced') to the
+        # server providing it, for servers that are connected
+        self.tool_ready: Dict[str, ServerState] = {}
+        # Maps sanitized tool function name to the server providing it,
+        # including servers that are currently not connected
+        self.tool_server: Dict[str, ServerState] = {}
         # List of aggregated tool descriptions, with names sanitized for use in Python
         self.tool_list: List[Dict[str, Any]] = []
         self.is_ready: bool = False
+        # Incremented whenever the set of available tools changes
+        self.registry_version: int = 0
+        self.registry: Tuple[int, List[Dict[str, Any]]] = (0, [])
+        self._signatures: Dict[str, str] = {}
 
         # Maps original tool name (e.g., 'search-papers-enhanced') to sanitized function name
         self.tool_to_func: Dict[str, str] = {}
         # Maps sanitized function name to original tool name
         self.func_to_tool: Dict[str, str] = {}
 
-    async def ready(self) -> List[str]:
+        # Result cache for idempotent tools, configured by config/tool_cache_policies.json
+        self.cache = ToolCache.from_config()
+        # Per-tool and per-provider limits on upstream calls, from config/rate_limits.json
+        self.limiter = RateLimiter.from_config()
+        REGISTRY.add_collector(self.collect_metrics)
+
+        self._started = False
+        self._closing = False
+        self._venv_path: Optional[str] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_lock = asyncio.Lock()
+
+    @property
+    def client_list(self) -> List[MCPClient]:
+        """Returns the clients of all currently connected replicas."""
+        return [
+            replica.client
+            for state in self.servers
+            for replica in state.replicas
+            if replica.status == "ready"
+        ]
+
+    def start(self):
+        """
+        Starts connecting to all servers in the server list in the background and
+        returns immediately. Calling it again has no effect.
         """
-        Connects to all servers specified in the server list and aggregates their tools.
+        if self._started:
+            return
+        self._started = True
 
-        This method attempts to connect each server, retrieves its tools, and maps
-        them to the correct `MCPClient`. It also performs a name sanitization
-        (replacing hyphens '-' with underscores '_') for easier use in Python
-        function calls. It filters tools for specific servers (like 'openapi-mcp-server').
+        # sys.prefix points to the active virtual environment root directory
+        self._venv_path = sys.prefix if hasattr(sys, "real_prefix") else None
+
+        for server, pool_size in self._parse_serverlist():
+            self._add_server(server, pool_size)
+
+        if TOOL_REFRESH_INTERVAL > 0:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    @staticmethod
+    def _parse_serverlist() -> List[Tuple[str, int]]:
+        """Returns (server, pool_size) for every entry of the server list."""
+        servers = []
+        for entry in load_serverlist():
+            if isinstance(entry, dict):
+                server = entry["server"]
+                pool_size = int(entry.get("pool_size", MCP_POOL_SIZE))
+            else:
+                server, pool_size = entry, MCP_POOL_SIZE
+            # Normalize local server paths relative to the current directory
+            if not server.startswith("http"):
+                server = os.path.join(current_dir, server)
+            servers.append((server, pool_size))
+        return servers
+
+    def _add_server(self, server: str, pool_size: int) -> ServerState:
+        state = ServerState(server, pool_size)
+        for replica in state.replicas:
+            replica.task = asyncio.create_task(
+                self._supervise(state, replica, self._venv_path)
+            )
+        self.servers = self.servers + [state]
+        return state
+
+    def _remove_server(self, state: ServerState):
+        state.removed = True
+        self.servers = [s for s in self.servers if s is not state]
+        for replica in state.replicas:
+            if replica.status == "ready":
+                # Let the supervisor release the connection
+                replica.stop.set()
+            elif replica.task is not None:
+                replica.task.cancel()
+        self._refresh_tools()
+
+    async def ready(self, timeout: Optional[float] = None) -> List[str]:
+        """
+        Starts connecting to all servers (if not started yet) and waits until every
+        server has either connected or failed its first attempt.
+
+        Failed servers keep being retried in the background after this returns.
 
+        :param timeout: Maximum number of seconds to wait; waits for all servers if None.
         :return: A list of names of the successfully connected servers.
         :rtype: List[str]
         """
-        self.is_ready = False
-        server_list: List[str] = load_serverlist()
-
-        # Normalize local server paths relative to the current directory
-        tmp = []
-        for server in server_list:
-            is_sse = server.startswith("http")
-            if not is_sse:
-                tmp.append(os.path.join(current_dir, server))
-            else:
-                tmp.append(server)
+        self.start()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(state.settled.wait() for state in self.servers)),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            pass
+        return [state.name for state in self.servers if state.status == "ready"]
+
+    async def _supervise(self, state: ServerState, replica: Replica, venv_path: Optional[str]):
+        """
+        Keeps one replica connected: connects it with a timeout, registers the
+        server's tools, health-checks the connection while it is idle, and
+        reconnects with exponential backoff when the attempt fails or the
+        connection ends.
+        """
+        loop = asyncio.get_running_loop()
+        delay = SERVER_RETRY_INITIAL
+        label = f"{state.server} (replica {replica.index})"
+        while not (self._closing or state.removed):
+            replica.attempts += 1
+            replica.stop = asyncio.Event()
+            client = MCPClient(venv_path=venv_path, server=state.server)
+            connected = loop.create_future()
+            # The connection lives in its own task, which enters and exits all of
+            # the client's async contexts, as the mcp transports require.
+            owner = asyncio.create_task(
+                self._hold_connection(client, connected, replica.stop)
+            )
+            try:
+                name, tools = await asyncio.wait_for(
+                    asyncio.shield(connected), SERVER_CONNECT_TIMEOUT
+                )
+            except asyncio.CancelledError:
+                owner.cancel()
+                raise
+            except Exception as e:
+                owner.cancel()
+                await asyncio.gather(owner, return_exceptions=True)
+                replica.status = "failed"
+                replica.error = str(e) or type(e).__name__
+                self._check_settled(state)
+                print(
+                    f"An error occurred while creating client: {replica.error}. For server {label}. "
+                    f"Retrying in {delay:g}s."
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, SERVER_RETRY_MAX)
+                continue
 
-        server_list = tmp
-        ready_server = []
+            replica.client = client
+            replica.status = "ready"
+            replica.error = None
+            replica.ready_since = time.time()
+            self._register(state, name, tools)
+            delay = SERVER_RETRY_INITIAL
+            print(f"Server {name} ready (replica {replica.index}).")
+
+            await self._watch(replica, owner)
+            replica.client = None
+            if self._closing or state.removed:
+                replica.status = "failed"
+                break
+            replica.status = "failed"
+            replica.reconnects += 1
+            self._refresh_tools()
+            print(f"Server {name} replica {replica.index} disconnected ({replica.error}), reconnecting.")
+
+    async def _watch(self, replica: Replica, owner: asyncio.Task):
+        """
+        Health-checks a connected replica until its connection ends.
 
-        # sys.prefix points to the active virtual environment root directory
-        venv_path = sys.prefix if hasattr(sys, "real_prefix") else None
+        Only idle replicas are pinged, so a long-running call on a server that
+        handles one request at a time is not mistaken for a dead connection.
+        """
+        failures = 0
+        while True:
+            done, _ = await asyncio.wait({owner}, timeout=MCP_HEALTH_INTERVAL)
+            if done:
+                if replica.error is None:
+                    replica.error = "connection closed"
+                return
+            if replica.in_flight or replica.stop.is_set():
+                continue
+            if await replica.client.ping(MCP_HEALTH_TIMEOUT):
+                failures = 0
+                continue
+            failures += 1
+            if failures >= MCP_HEALTH_FAIL_THRESHOLD:
+                self._drop(replica, f"{failures} health checks failed")
 
-        for server in server_list:
-            client = MCPClient(venv_path=venv_path, server=server)
+    async def _hold_connection(
+        self, client: MCPClient, connected: asyncio.Future, stop: asyncio.Event
+    ):
+        """
+        Connects the client, reports the result through `connected`, and holds the
+        connection open until `stop` is set or the task is cancelled.
+        """
+        try:
+            name = await client.connect_to_server()
+            tools = await client.get_tools()
+            connected.set_result((name, tools))
+            await stop.wait()
+        except asyncio.CancelledError:
+            if not connected.done():
+                connected.cancel()
+            raise
+        except Exception as e:
+            if not connected.done():
+                connected.set_exception(e)
+        finally:
             try:
-                name = await client.connect_to_server()
-
-                # Apply tool filtering rules based on server name
-                if name == "openapi-mcp-server":
-                    allowed_tools = ["search-papers-enhanced", "search-scholars"]
-                else:
-                    allowed_tools = "all"
-
-                tools = await client.get_tools()
-                self.client_list.append(client)
+                await client.cleanup()
+            except BaseException as e:
+                print(f"An error occurred while cleaning up client for {client.server}: {e}")
 
-                tool_list_tmp = []
+    def _drop(self, replica: Replica, reason: str):
+        """
+        Takes a replica out of rotation and releases its connection; its
+        supervisor then reconnects it.
+        """
+        if replica.status != "ready":
+            return
+        replica.status = "failed"
+        replica.error = reason
+        replica.stop.set()
+        self._refresh_tools()
+
+    def _check_settled(self, state: ServerState):
+        if state.status != "pending":
+            state.settled.set()
+
+    def _register(self, state: ServerState, name: str, tools: List[Dict[str, Any]]):
+        """
+        Marks a server as ready and exposes its tools.
 
-                for tool in tools:
-                    # Apply filtering
-                    if allowed_tools != "all" and (tool["name"] not in allowed_tools):
-                        continue
+        Tools are filtered for specific servers (like 'openapi-mcp-server') and
+        their names are sanitized (replacing hyphens '-' with underscores '_')
+        for easier use in Python function calls.
+        """
+        # Apply tool filtering rules based on server name
+        if name == "openapi-mcp-server":
+            allowed_tools = ["search-papers-enhanced", "search-scholars"]
+        else:
+            allowed_tools = "all"
+
+        tool_list_tmp = []
+        for tool in tools:
+            # Apply filtering
+            if allowed_tools != "all" and (tool["name"] not in allowed_tools):
+                continue
 
-                    # Sanitize tool name: "tool-name" -> "tool_name"
-                    func_name = tool["name"].replace("-", "_")
+            # Sanitize tool name: "tool-name" -> "tool_name"
+            func_name = tool["name"].replace("-", "_")
 
-                    self.tool_to_func[tool["name"]] = func_name
-                    self.func_to_tool[func_name] = tool["name"]
+            self.tool_to_func[tool["name"]] = func_name
+            self.func_to_tool[func_name] = tool["name"]
 
-                    # Update tool name in the exposed list
-                    tool["name"] = func_name
+            # Update tool name in the exposed list
+            tool["name"] = func_name
+            tool_list_tmp.append(tool)
 
-                    self.tool_client[tool["name"]] = client
-                    tool_list_tmp.append(tool)
+        state.name = name
+        state.tools = tool_list_tmp
+        state.settled.set()
+        self._refresh_tools()
 
-                self.tool_list.extend(tool_list_tmp)
+    @staticmethod
+    def _signature(tool: Dict[str, Any]) -> str:
+        return json.dumps(tool, sort_keys=True, default=str)
 
-                ready_server.append(name)
-                print(f"Server {name} ready.")
+    def _refresh_tools(self):
+        """
+        Rebuilds the aggregated tool registry from the connected servers, in server
+        list order. New containers are swapped in, so readers in other threads
+        never see a registry that is being modified.
+        """
+        tool_list: List[Dict[str, Any]] = []
+        tool_ready: Dict[str, ServerState] = {}
+        tool_server: Dict[str, ServerState] = {}
+        for state in self.servers:
+            ready = state.status == "ready"
+            for tool in state.tools:
+                tool_server.setdefault(tool["name"], state)
+                if ready and tool["name"] not in tool_ready:
+                    tool_ready[tool["name"]] = state
+                    tool_list.append(tool)
+        signatures = {tool["name"]: self._signature(tool) for tool in tool_list}
+        if signatures != self._signatures:
+            self._signatures = signatures
+            self.registry_version += 1
+        self.tool_list = tool_list
+        self.tool_ready = tool_ready
+        self.tool_server = tool_server
+        # Published as one tuple, so other threads read a consistent pair
+        self.registry = (self.registry_version, tool_list)
+        self.is_ready = any(state.status == "ready" for state in self.servers)
+
+    async def refresh_tools(self, reload_config: bool = False, restart: bool = False) -> Dict[str, Any]:
+        """
+        Re-lists the tools of every connected server and swaps in the new registry.
+
+        Sessions created afterwards get the new tool wrappers; existing sessions
+        are rebound to them before their next execution.
+
+        :param reload_config: Also re-read the server list, connecting servers that
+                              were added and disconnecting servers that were removed.
+                              Tools of added servers appear once they are ready.
+        :param restart: Reopen every connection, one replica at a time, so that
+                        upgraded stdio servers are restarted without downtime.
+        :return: A summary of the changes and the new registry version.
+        :rtype: Dict[str, Any]
+        """
+        async with self._refresh_lock:
+            before = dict(self._signatures)
+            added_servers, removed_servers = [], []
+
+            if reload_config:
+                configured = dict(self._parse_serverlist())
+                for state in list(self.servers):
+                    if state.server not in configured:
+                        self._remove_server(state)
+                        removed_servers.append(state.server)
+                known = {state.server for state in self.servers}
+                for server, pool_size in configured.items():
+                    if server not in known:
+                        self._add_server(server, pool_size)
+                        added_servers.append(server)
+
+            if restart:
+                await self._rolling_restart()
+
+            for state in list(self.servers):
+                replica = state.pick()
+                if replica is None or state.name is None:
+                    continue
+                try:
+                    tools = await replica.client.get_tools()
+                except Exception as e:
+                    print(f"Failed to list tools of server {state.name}: {e}")
+                    continue
+                self._register(state, state.name, tools)
+
+            after = self._signatures
+            return {
+                "version": self.registry_version,
+                "added_servers": added_servers,
+                "removed_servers": removed_servers,
+                "added_tools": sorted(after.keys() - before.keys()),
+                "removed_tools": sorted(before.keys() - after.keys()),
+                "changed_tools": sorted(
+                    name for name in after.keys() & before.keys() if after[name] != before[name]
+                ),
+            }
+
+    async def _rolling_restart(self):
+        """
+        Reopens the connections of every server one replica at a time. Each replica
+        is taken out of rotation, given time to finish its calls, and released;
+        the next one is restarted once it is connected again.
+        """
+        for state in list(self.servers):
+            for replica in state.replicas:
+                if replica.status != "ready":
+                    continue
+                replica.status = "failed"
+                replica.error = "restart requested"
+                self._refresh_tools()
+                deadline = time.time() + SERVER_CONNECT_TIMEOUT
+                while replica.in_flight and time.time() < deadline:
+                    await asyncio.sleep(0.1)
+                replica.stop.set()
+                # The supervisor reconnects the replica; wait for it before the next one
+                deadline = time.time() + SERVER_CONNECT_TIMEOUT
+                while replica.status != "ready" and time.time() < deadline:
+                    await asyncio.sleep(0.1)
+
+    async def _refresh_loop(self):
+        """Refreshes the tool lists every TOOL_REFRESH_INTERVAL seconds and logs changes."""
+        while True:
+            await asyncio.sleep(TOOL_REFRESH_INTERVAL)
+            try:
+                diff = await self.refresh_tools()
             except Exception as e:
-                print(
-                    f"An error occurred while creating client: {e}. For server {server}."
-                )
-                await client.cleanup()
+                print(f"Tool refresh failed: {e}")
                 continue
-
-        if ready_server:
-            self.is_ready = True
-        return ready_server
+            if diff["added_tools"] or diff["removed_tools"] or diff["changed_tools"]:
+                print(f"Tool registry updated to version {diff['version']}: {diff}")
 
     def get_tools(self) -> List[Dict[str, Any]]:
         """
@@ -147,7 +591,7 @@ class MCPManager:
         :return: A list of tool names (e.g., ['search_papers_enhanced']).
         :rtype: List[str]
         """
-        return list(self.tool_client.keys())
+        return list(self.tool_ready.keys())
 
     def get_status(self) -> bool:
         """
@@ -160,19 +604,62 @@ class MCPManager:
         """
         return self.is_ready
 
+    def is_starting(self) -> bool:
+        """
+        Returns True before start() and while some server has not finished its
+        first connection attempt.
+        """
+        return not self._started or any(state.status == "pending" for state in self.servers)
+
+    def tool_state(self, tool_name: str) -> str:
+        """
+        Returns whether a tool can be called right now.
+
+        :param tool_name: The sanitized name of the tool.
+        :return: "ready" if the tool's server is connected, "unavailable" if the tool
+                 belongs to a disconnected server or may belong to a server that is
+                 still starting, and "unknown" otherwise.
+        :rtype: str
+        """
+        if tool_name in self.tool_ready:
+            return "ready"
+        if tool_name in self.tool_server or self.is_starting():
+            return "unavailable"
+        return "unknown"
+
+    def server_status(self) -> List[Dict[str, Any]]:
+        """
+        Returns the connection state of every server in the server list.
+
+        :return: A list of dictionaries with the server, its name, status, tools,
+                 last error and the state of each replica.
+        :rtype: List[Dict[str, Any]]
+        """
+        return [state.describe() for state in self.servers]
+
     async def call_tool(self, tool_name: str, tool_args: Dict[str, Any] = None) -> list:
         """
         Calls a specific tool using the appropriate underlying MCPClient.
 
         It automatically maps the sanitized tool name (e.g., 'search_papers_enhanced')
         back to the original tool name required by the server, and routes the call
-        to the correct client instance.
+        to the least busy connected replica of that server. If the replica's
+        connection breaks during the call, the replica is reconnected in the
+        background. The call is retried once on another replica if the request
+        was never written, or if the tool is idempotent (cacheable in the cache
+        policies); otherwise it may already have run and the error is raised.
+
+        Results of tools marked cacheable in the cache policies are served from
+        the tool cache, and identical concurrent calls share one upstream call.
+        Upstream calls wait for the tool's rate limits and concurrency caps.
 
         :param tool_name: The sanitized name of the tool to call (e.g., 'tool_name').
         :type tool_name: str
         :param tool_args: A dictionary of arguments for the tool call. Defaults to None (empty dict).
         :type tool_args: Dict[str, Any], optional
         :raises KeyError: If the provided `tool_name` is not found in the available tools.
+        :raises ToolUnavailableError: If the tool's server is not connected at the moment.
+        :raises RateLimitExceeded: If the tool's limits are not met within RATE_LIMIT_MAX_WAIT.
         :raises RuntimeError: If the tool call on the server fails.
         :return: The processed result content from the tool call.
         :rtype: list
@@ -180,25 +667,118 @@ class MCPManager:
         if tool_args is None:
             tool_args = {}
 
-        if not self.tool_client.get(tool_name):
+        state = self.tool_ready.get(tool_name)
+        if state is None:
+            if self.tool_state(tool_name) == "unavailable":
+                TOOL_CALLS.inc(tool=tool_name, status="unavailable")
+                raise ToolUnavailableError(
+                    f"Tool '{tool_name}' is unavailable: its server is not connected yet."
+                )
             raise KeyError(f"Tool '{tool_name}' not found in tool list.")
 
-        # try:
+        start_time = time.time()
+        status = "error"
+        try:
+            result = await self.cache.get_or_call(
+                tool_name, tool_args, lambda: self._dispatch(state, tool_name, tool_args)
+            )
+            status = "ok"
+            return result
+        except ToolUnavailableError:
+            status = "unavailable"
+            raise
+        except RateLimitExceeded:
+            status = "rate_limited"
+            raise
+        finally:
+            TOOL_CALLS.inc(tool=tool_name, status=status)
+            TOOL_CALL_SECONDS.observe(time.time() - start_time, tool=tool_name)
+
+    async def _dispatch(self, state: ServerState, tool_name: str, tool_args: Dict[str, Any]) -> list:
+        """Sends a tool call to the least busy replica of its server, within the tool's limits."""
+        async with self.limiter.limit(tool_name, self.limiter.cost_of(tool_name, tool_args)):
+            return await self._send(state, tool_name, tool_args)
+
+    async def _send(self, state: ServerState, tool_name: str, tool_args: Dict[str, Any]) -> list:
         # Get the original tool name for the server
         call_tool_name = self.func_to_tool[tool_name]
 
-        # Route the call to the correct client
-        result = await self.tool_client[tool_name].call_tool(
-            call_tool_name, tool_args
+        last_error = None
+        for _ in range(2):
+            replica = state.pick()
+            if replica is None:
+                break
+            replica.in_flight += 1
+            replica.calls += 1
+            try:
+                # Route the call to the chosen replica
+                return await replica.client.call_tool(call_tool_name, tool_args)
+            except Exception as e:
+                if not is_connection_error(e):
+                    raise
+                last_error = e
+                self._drop(replica, f"connection lost during call: {e}")
+                if not (is_send_error(e) or self.cache.policy(tool_name).cacheable):
+                    # The server may have run the call; running it again could repeat side effects
+                    raise ToolUnavailableError(
+                        f"Tool '{tool_name}' is unavailable: connection lost during the call ({e})"
+                    ) from e
+            finally:
+                replica.in_flight -= 1
+
+        raise ToolUnavailableError(
+            f"Tool '{tool_name}' is unavailable: no connected replica of its server"
+            + (f" ({last_error})" if last_error else "")
         )
-        return result
-        # except Exception as e:
-        #     # Re-raise as a RuntimeError to signify a tool execution failure
-        #     raise RuntimeError(e)
 
-    async def close(self):
+    def collect_metrics(self):
+        """Returns scrape-time metric families for server replicas, the registry and the cache."""
+        replicas, in_flight = [], []
+        for state in self.servers:
+            server = state.name or state.server
+            counts: Dict[str, int] = {}
+            for replica in state.replicas:
+                counts[replica.status] = counts.get(replica.status, 0) + 1
+            for status, count in counts.items():
+                replicas.append(({"server": server, "status": status}, count))
+            in_flight.append(({"server": server}, sum(r.in_flight for r in state.replicas)))
+        cache = self.cache.stats()
+        return [
+            ("mcp_server_replicas", "gauge", "MCP server connections by status", replicas),
+            ("mcp_server_in_flight", "gauge", "Tool calls running per MCP server", in_flight),
+            ("mcp_tool_registry_version", "gauge", "Version of the tool registry",
+             [({}, self.registry_version)]),
+            ("mcp_tool_cache_events_total", "counter", "Tool cache lookups by result", [
+                ({"result": "memory_hit"}, cache["memory_hits"]),
+                ({"result": "disk_hit"}, cache["disk_hits"]),
+                ({"result": "miss"}, cache["misses"]),
+                ({"result": "coalesced"}, cache["coalesced"]),
+            ]),
+        ]
+
+    async def close(self, timeout: float = 10):
         """
-        Cleans up all resources by calling `cleanup()` on every managed `MCPClient`.
+        Stops all supervisors and cleans up every connection.
+
+        :param timeout: Seconds to wait for connections to close before their tasks are cancelled.
         """
-        for client in self.client_list:
-            await client.cleanup()
+        self._closing = True
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        tasks = []
+        for state in self.servers:
+            for replica in state.replicas:
+                if replica.task is None:
+                    continue
+                if replica.status == "ready":
+                    replica.stop.set()
+                else:
+                    # Connecting or waiting to retry: nothing to close gracefully
+                    replica.task.cancel()
+                tasks.append(replica.task)
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -1,41 +1,430 @@
 import httpx
-import hashlib
 import os, sys
+import time
+import asyncio
+import logging
 import uvicorn
 from uuid import uuid4
-from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse, JSONResponse
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+from starlette.background import BackgroundTask
+from pydantic import BaseModel
+from typing import Dict, Any, List, Optional
+from hash_ring import ConsistentHashRing
+from cluster import load_backends
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
 START_PORT = int(os.getenv("START_PORT", 30010))
 NUM_WORKERS = int(os.getenv("NUM_WORKERS", 1))
 
+PROXY_PORT = int(os.getenv("PROXY_PORT", 30010))
+PROXY_TIMEOUT = 36000
+# Connection pool settings for each backend worker
+PROXY_MAX_CONNECTIONS = int(os.getenv("PROXY_MAX_CONNECTIONS", 512))
+PROXY_KEEPALIVE_EXPIRY = float(os.getenv("PROXY_KEEPALIVE_EXPIRY", 60))
+# Routing and health check settings
+VIRTUAL_NODES = int(os.getenv("VIRTUAL_NODES", 160))
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", 5))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", 2))
+HEALTH_FAIL_THRESHOLD = int(os.getenv("HEALTH_FAIL_THRESHOLD", 2))
+MAX_TRACKED_SESSIONS = int(os.getenv("MAX_TRACKED_SESSIONS", 100000))
+# Seconds without requests after which a session pinned to a draining worker is
+# considered abandoned, so draining finishes even if clients never call /del_session
+DRAIN_SESSION_IDLE_TTL = float(os.getenv("DRAIN_SESSION_IDLE_TTL", 3600))
+
+# Hop-by-hop headers must not be forwarded by a proxy (RFC 7230, section 6.1)
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+}
+
+PROXY_ROUTES = REGISTRY.counter(
+    "proxy_routes_total",
+    "Routing decisions: sticky (pinned worker), new (ring owner), failover, unpinned",
+    ["backend", "decision"],
+)
+PROXY_BACKEND_ERRORS = REGISTRY.counter(
+    "proxy_backend_errors_total", "Requests that failed to reach a backend worker", ["backend"]
+)
+PROXY_RESPONSE_SECONDS = REGISTRY.histogram(
+    "proxy_response_seconds", "Time until a backend worker returned response headers", ["backend"]
+)
+
+
+class WorkerPool:
+    """
+    Routing state of the proxy: the hash ring of backend workers, their health,
+    and the sticky session-to-worker assignments.
+
+    A session is owned by the first healthy worker on the ring when it is first
+    seen and stays pinned to that worker afterwards, so adding workers only
+    affects new sessions. If the owner goes down, the session fails over to the
+    next healthy worker on the ring. Draining workers leave the ring for new
+    sessions but keep serving their pinned sessions until those are deleted or
+    stay idle for DRAIN_SESSION_IDLE_TTL seconds.
+
+    :ivar ring: Consistent-hash ring holding the workers that accept new sessions.
+    :ivar workers: State per worker ("host:port"): healthy, draining, failures.
+    :ivar sessions: LRU map of session ID to its pinned worker.
+    :ivar last_used: Time of the last request of each pinned session.
+    """
+
+    def __init__(self, backends: List[str]):
+        self.ring = ConsistentHashRing(vnodes=VIRTUAL_NODES)
+        self.workers: Dict[str, Dict[str, Any]] = {}
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.sessions: "OrderedDict[str, str]" = OrderedDict()
+        self.last_used: Dict[str, float] = {}
+        self.pinned: Dict[str, int] = {}
+        # Workers drained by an operator; self-registration does not bring them back
+        self.retired: set = set()
+        for backend in backends:
+            self.add(backend)
+
+    def get_client(self, backend: str) -> httpx.AsyncClient:
+        """
+        Returns the shared HTTP/1.1 keep-alive client for a backend worker,
+        creating it on first use.
+
+        :param backend: The worker address as "host:port".
+        :return: The pooled httpx.AsyncClient for that worker.
+        """
+        client = self.clients.get(backend)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=f"http://{backend}",
+                timeout=httpx.Timeout(PROXY_TIMEOUT, connect=10),
+                limits=httpx.Limits(
+                    max_connections=PROXY_MAX_CONNECTIONS,
+                    max_keepalive_connections=PROXY_MAX_CONNECTIONS,
+                    keepalive_expiry=PROXY_KEEPALIVE_EXPIRY,
+                ),
+                http1=True,
+                http2=False,
+            )
+            self.clients[backend] = client
+        return client
+
+    def add(self, backend: str):
+        """Adds a worker (or cancels its draining) so it receives new sessions."""
+        state = self.workers.setdefault(
+            backend, {"healthy": True, "draining": False, "failures": 0}
+        )
+        state["draining"] = False
+        self.retired.discard(backend)
+        self.pinned.setdefault(backend, 0)
+        self.ring.add_node(backend)
+        logger.info(f"Worker {backend} added to the ring")
+
+    def drain(self, backend: str, force: bool = False, retire: bool = True):
+        """
+        Stops routing new sessions to a worker. The worker is removed once its
+        pinned sessions are gone, or immediately when ``force`` is set.
+
+        :param retire: Keep the worker out even if it announces itself again later.
+        """
+        if backend not in self.workers:
+            raise KeyError(backend)
+        if retire:
+            self.retired.add(backend)
+        self.workers[backend]["draining"] = True
+        self.ring.remove_node(backend)
+        logger.info(f"Worker {backend} draining ({self.pinned.get(backend, 0)} sessions)")
+        if force or self.pinned.get(backend, 0) == 0:
+            self._forget(backend)
+
+    def _forget(self, backend: str):
+        self.ring.remove_node(backend)
+        self.workers.pop(backend, None)
+        self.pinned.pop(backend, None)
+        for session_id in [s for s, b in self.sessions.items() if b == backend]:
+            del self.sessions[session_id]
+            self.last_used.pop(session_id, None)
+        client = self.clients.pop(backend, None)
+        if client is not None:
+            asyncio.get_running_loop().create_task(client.aclose())
+        logger.info(f"Worker {backend} removed")
+
+    def _is_available(self, backend: str) -> bool:
+        state = self.workers.get(backend)
+        return bool(state and state["healthy"])
+
+    def _pin(self, session_id: str, backend: str):
+        previous = self.sessions.get(session_id)
+        self.last_used[session_id] = time.monotonic()
+        if previous == backend:
+            self.sessions.move_to_end(session_id)
+            return
+        if previous is not None:
+            self.pinned[previous] = self.pinned.get(previous, 1) - 1
+        self.sessions[session_id] = backend
+        self.sessions.move_to_end(session_id)
+        self.pinned[backend] = self.pinned.get(backend, 0) + 1
+        while len(self.sessions) > MAX_TRACKED_SESSIONS:
+            evicted_session, evicted = self.sessions.popitem(last=False)
+            self.last_used.pop(evicted_session, None)
+            self.pinned[evicted] = self.pinned.get(evicted, 1) - 1
+
+    def release(self, session_id: str):
+        """Forgets a session's pinned worker, e.g. after the session was deleted."""
+        backend = self.sessions.pop(session_id, None)
+        self.last_used.pop(session_id, None)
+        if backend is not None:
+            self.pinned[backend] = self.pinned.get(backend, 1) - 1
+
+    def expire_idle(self, backend: str, ttl: float = DRAIN_SESSION_IDLE_TTL) -> int:
+        """
+        Releases the sessions pinned to a worker that had no request for ``ttl`` seconds.
+
+        :return: The number of released sessions.
+        """
+        deadline = time.monotonic() - ttl
+        idle = [
+            s for s, b in self.sessions.items()
+            if b == backend and self.last_used.get(s, 0.0) < deadline
+        ]
+        for session_id in idle:
+            self.release(session_id)
+        if idle:
+            logger.info(f"Released {len(idle)} idle sessions of draining worker {backend}")
+        return len(idle)
+
+    def route(self, session_id: str, sticky: bool = True) -> str:
+        """
+        Selects the worker for a session.
+
+        :param session_id: The routing key.
+        :param sticky: Whether to pin the session to the selected worker.
+        :raises LookupError: If no worker is available.
+        :return: The selected worker as "host:port".
+        """
+        owner = self.sessions.get(session_id)
+        if owner is not None and self._is_available(owner):
+            self.sessions.move_to_end(session_id)
+            self.last_used[session_id] = time.monotonic()
+            PROXY_ROUTES.inc(backend=owner, decision="sticky")
+            return owner
+
+        candidates = list(self.ring.iter_nodes(session_id))
+        target = next((b for b in candidates if self._is_available(b)), None)
+        if target is None:
+            # Every worker looks down; health information may be stale, so try the owner anyway
+            target = candidates[0] if candidates else owner
+        if target is None:
+            raise LookupError("No backend workers are registered")
+
+        if owner is not None and owner != target:
+            logger.warning(f"Session {session_id} failed over from {owner} to {target}")
+            decision = "failover"
+        else:
+            decision = "new" if sticky else "unpinned"
+        PROXY_ROUTES.inc(backend=target, decision=decision)
+        if sticky:
+            self._pin(session_id, target)
+        return target
+
+    def collect_metrics(self):
+        """Returns scrape-time metric families for worker health and pinned sessions."""
+        return [
+            ("proxy_worker_healthy", "gauge", "1 if the worker passes health checks", [
+                ({"backend": b}, int(state["healthy"])) for b, state in self.workers.items()
+            ]),
+            ("proxy_worker_sessions", "gauge", "Sessions pinned to each worker", [
+                ({"backend": b}, self.pinned.get(b, 0)) for b in self.workers
+            ]),
+            ("proxy_tracked_sessions", "gauge", "Sessions with a pinned worker",
+             [({}, len(self.sessions))]),
+        ]
+
+    async def check_health(self, backend: str):
+        """
+        Probes a worker's /health endpoint and updates its state. A worker that
+        answers with an error status (e.g. 503 while its MCP servers are still
+        starting) is taken out of rotation at once; unreachable workers only after
+        HEALTH_FAIL_THRESHOLD consecutive failures.
+        """
+        state = self.workers.get(backend)
+        if state is None:
+            return
+        status_code = None
+        try:
+            resp = await self.get_client(backend).get("/health", timeout=HEALTH_CHECK_TIMEOUT)
+            status_code = resp.status_code
+        except Exception:
+            pass
+
+        if status_code == 200:
+            if not state["healthy"]:
+                logger.info(f"Worker {backend} is healthy again")
+            state["healthy"] = True
+            state["failures"] = 0
+        elif status_code is not None:
+            if state["healthy"]:
+                logger.warning(f"Worker {backend} not ready (HTTP {status_code})")
+            state["healthy"] = False
+            state["failures"] += 1
+        else:
+            state["failures"] += 1
+            if state["healthy"] and state["failures"] >= HEALTH_FAIL_THRESHOLD:
+                logger.warning(f"Worker {backend} marked unhealthy")
+                state["healthy"] = False
+
+    async def health_loop(self):
+        """
+        Periodically probes all workers, releases idle sessions of draining
+        workers and removes drained ones.
+        """
+        while True:
+            backends = list(self.workers)
+            await asyncio.gather(*(self.check_health(b) for b in backends))
+            for backend in backends:
+                state = self.workers.get(backend)
+                if not (state and state["draining"]):
+                    continue
+                self.expire_idle(backend)
+                if self.pinned.get(backend, 0) <= 0:
+                    self._forget(backend)
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """Returns the state of every worker."""
+        return [
+            {
+                "backend": backend,
+                "in_ring": backend in self.ring,
+                "sessions": self.pinned.get(backend, 0),
+                **state,
+            }
+            for backend, state in sorted(self.workers.items())
+        ]
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
+
+
+worker_pool = WorkerPool(load_backends(START_PORT, NUM_WORKERS))
+REGISTRY.add_collector(worker_pool.collect_metrics)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    health_task = asyncio.create_task(worker_pool.health_loop())
+    yield
+    health_task.cancel()
+    await worker_pool.close()
+
+
 # Initialize the FastAPI application
 app = FastAPI(
     title="Session-Sticky Proxy",
     description="A load balancer that uses consistent hashing on 'session_id' for sticky routing.",
+    lifespan=lifespan,
 )
 
-BACKEND_PORTS = range(START_PORT, START_PORT + NUM_WORKERS)
-PROXY_TIMEOUT = 36000
+
+class WorkerRequest(BaseModel):
+    """
+    Request body for the worker admin endpoints.
+
+    :ivar backend: The worker address as "host:port".
+    :ivar force: For draining, remove the worker immediately instead of waiting for its sessions.
+    """
+
+    backend: str
+    force: bool = False
+
+
+def filter_headers(headers) -> Dict[str, str]:
+    """
+    Drops hop-by-hop headers and 'host', keeping everything else unchanged.
+
+    :param headers: The incoming or backend response headers.
+    :return: The headers that should be forwarded.
+    """
+    return {
+        key: value
+        for key, value in headers.items()
+        if key.lower() not in HOP_BY_HOP_HEADERS and key.lower() != "host"
+    }
 
 
-def get_port_by_session_id(session_id: str) -> int:
+@app.get("/admin/workers")
+async def list_workers():
+    """Lists backend workers with their health, draining state and pinned session count."""
+    return {"workers": worker_pool.describe()}
+
+
+@app.post("/admin/workers")
+async def add_worker(request: WorkerRequest):
+    """Adds a backend worker at runtime; it starts receiving new sessions immediately."""
+    worker_pool.add(request.backend)
+    await worker_pool.check_health(request.backend)
+    return {"status": "success", "workers": worker_pool.describe()}
+
+
+@app.post("/admin/workers/heartbeat")
+async def worker_heartbeat(request: WorkerRequest):
+    """
+    Self-registration endpoint for tool_server workers. Unknown workers are added;
+    known workers, including draining ones, are left unchanged.
+    """
+    if request.backend in worker_pool.retired:
+        return {"status": "retired"}
+    if request.backend not in worker_pool.workers:
+        worker_pool.add(request.backend)
+        await worker_pool.check_health(request.backend)
+    return {"status": "success"}
+
+
+@app.post("/admin/workers/deregister")
+async def deregister_worker(request: WorkerRequest):
+    """
+    Removes a worker that is shutting down. Unlike draining, the worker is added
+    back when it registers again after a restart.
     """
-    Calculates the target backend port using consistent hashing based on the session ID.
+    if request.backend in worker_pool.workers:
+        worker_pool.drain(request.backend, force=True, retire=False)
+    return {"status": "success"}
 
-    This ensures that requests with the same session ID are consistently routed
-    to the same backend worker (session stickiness).
 
-    :param session_id: The unique identifier for the user session.
-    :return: The target port number for the backend worker.
+@app.post("/admin/workers/drain")
+async def drain_worker(request: WorkerRequest):
     """
-    # Use MD5 hash of the session_id to deterministically select a worker port
-    hash_value = int(hashlib.md5(session_id.encode()).hexdigest(), 16)
-    worker_index = hash_value % NUM_WORKERS
-    target_port = START_PORT + worker_index
-    return target_port
+    Drains a backend worker: it receives no new sessions and is removed once
+    its existing sessions are deleted or idle for DRAIN_SESSION_IDLE_TTL seconds
+    (or immediately with force=true).
+    """
+    try:
+        worker_pool.drain(request.backend, force=request.force)
+    except KeyError:
+        raise HTTPException(404, detail=f"Worker '{request.backend}' not found")
+    return {"status": "success", "workers": worker_pool.describe()}
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Returns the proxy's Prometheus metrics. Workers expose their own /metrics
+    and are scraped directly.
+    """
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
 
 
 @app.api_route(
@@ -45,83 +434,60 @@ async def proxy(path: str, request: Request):
     """
     A universal API route acting as a session-sticky proxy to backend workers.
 
-    It extracts the 'session_id' from headers, calculates the target port,
-    and forwards the request. GET requests are handled as streams, while
-    other methods (like POST) return a standard JSON response.
+    It extracts the 'session_id' from headers, selects the session's worker on
+    the consistent-hash ring, and forwards the request. Request and response
+    bodies are passed through as raw bytes in both directions without buffering
+    or re-encoding, so long-lived result streams and large tool results cost the
+    proxy almost nothing.
 
     :param path: The URL path requested by the client.
     :param request: The incoming FastAPI Request object.
-    :return: A FastAPI response (JSONResponse or StreamingResponse).
+    :return: A StreamingResponse relaying the backend response.
     """
-    session_id: str = request.headers.get("session_id")
-    print(f"!!!!!!!!!!!!!!!!!!!!{session_id}!!!!!!!!!!!!!!!!!!!!!!!!!")
+    session_id: Optional[str] = request.headers.get("session_id")
 
+    # Requests without a session are spread over the ring but not pinned
+    sticky = bool(session_id)
     if not session_id:
         session_id = str(uuid4())
 
-    port = get_port_by_session_id(session_id)
-    target_url = f"http://127.0.0.1:{port}/{path}"
+    try:
+        backend = worker_pool.route(session_id, sticky=sticky)
+    except LookupError as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    client = worker_pool.get_client(backend)
 
-    async with httpx.AsyncClient(timeout=PROXY_TIMEOUT) as client:
-        try:
-            headers = dict(request.headers)
-
-            if request.method == "POST":
-                body = await request.body()
-                response = await client.post(target_url, content=body, headers=headers)
-                return JSONResponse(
-                    status_code=response.status_code, content=response.json()
-                )
-
-            elif request.method == "GET":
-
-                async def stream_response():
-                    """Generator function to stream raw chunks from the backend response."""
-                    async with httpx.AsyncClient(
-                        timeout=PROXY_TIMEOUT
-                    ) as stream_client:
-                        async with stream_client.stream(
-                            "GET",
-                            target_url,
-                            headers=headers,
-                            params=request.query_params,
-                        ) as response:
-                            #! Forward necessary headers and then stream the content
-                            for header, value in response.headers.items():
-                                if header.lower() not in (
-                                    "content-length",
-                                    "transfer-encoding",
-                                ):
-                                    yield f"{header}: {value}\n".encode("utf-8")
-
-                            async for chunk in response.aiter_raw():
-                                yield chunk
-
-                return StreamingResponse(
-                    stream_response(),
-                    media_type=request.headers.get("Accept") or "application/json",
-                )
-
-            # Handle all other methods (PUT, DELETE, etc.)
-            else:
-                response = await client.request(
-                    request.method,
-                    target_url,
-                    headers=headers,
-                    params=request.query_params,
-                    content=await request.body(),
-                )
-
-                return JSONResponse(
-                    status_code=response.status_code, content=response.json()
-                )
-
-        except Exception as e:
-            error_message = f"Proxy error communicating with backend: {e}"
-            print(error_message)
-            return JSONResponse(status_code=500, content={"error": error_message})
+    # Only stream a request body when the client actually sent one
+    has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+
+    try:
+        backend_request = client.build_request(
+            request.method,
+            f"/{path}",
+            headers=filter_headers(request.headers),
+            params=request.query_params,
+            content=request.stream() if has_body else None,
+        )
+        start_time = time.time()
+        response = await client.send(backend_request, stream=True)
+        PROXY_RESPONSE_SECONDS.observe(time.time() - start_time, backend=backend)
+    except Exception as e:
+        PROXY_BACKEND_ERRORS.inc(backend=backend)
+        error_message = f"Proxy error communicating with backend {backend}: {e}"
+        logger.error(error_message)
+        return JSONResponse(status_code=502, content={"error": error_message})
+
+    if sticky and path.strip("/") == "del_session" and response.status_code == 200:
+        worker_pool.release(session_id)
+
+    return StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        headers=filter_headers(response.headers),
+        background=BackgroundTask(response.aclose),
+    )
 
 
 if __name__ == "__main__":
     # Runs the main proxy application using uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=30010)
+    uvicorn.run(app, host="0.0.0.0", port=PROXY_PORT)
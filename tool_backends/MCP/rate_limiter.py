@@ -0,0 +1,412 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import fnmatch
+import logging
+import tempfile
+import threading
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+RATE_LIMITS_FILE = os.getenv(
+    "RATE_LIMITS_FILE", os.path.join(current_dir, "config/rate_limits.json")
+)
+# SQLite file through which all workers on a host share their token buckets and concurrency slots
+RATE_LIMIT_DB = os.getenv(
+    "RATE_LIMIT_DB", os.path.join(tempfile.gettempdir(), "mcp_rate_limits.sqlite")
+)
+# Longest time a call may wait for a rate limit or concurrency slot before failing
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 30))
+# Seconds after which a concurrency slot held by a crashed or stuck worker is freed
+RATE_LIMIT_LEASE_TTL = float(os.getenv("RATE_LIMIT_LEASE_TTL", 600))
+# Interval at which a call waiting for a concurrency slot held by another worker checks again
+RATE_LIMIT_LEASE_POLL = float(os.getenv("RATE_LIMIT_LEASE_POLL", 0.05))
+
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram(
+    "mcp_rate_limit_wait_seconds", "Time tool calls waited for their limits", ["limit"]
+)
+RATE_LIMIT_REJECTED = REGISTRY.counter(
+    "mcp_rate_limit_rejected_total", "Tool calls that did not get through their limits in time", ["limit"]
+)
+
+
+class RateLimitExceeded(RuntimeError):
+    """Raised when a call could not get through its limits before the deadline."""
+
+
+class Limit:
+    """
+    Limits of one tool or upstream provider.
+
+    :ivar name: "tool:<pattern>" or "provider:<name>".
+    :ivar rate: Calls per second allowed across all workers; None for no rate limit.
+    :ivar burst: Bucket size, i.e. calls allowed at once after an idle period.
+    :ivar max_concurrency: Calls running at once across all workers; None for no cap.
+    :ivar cost_arg: For tool limits, the list argument whose distinct non-empty
+                    items are the upstream calls one tool call makes (e.g. the
+                    queries of a batch search); None if each tool call is one
+                    upstream call.
+    :ivar max_cost: Most upstream calls one tool call makes, matching the tool's
+                    own cap on the ``cost_arg`` items.
+    :ivar max_fanout: Most upstream calls one tool call runs at once; the call
+                      holds that many concurrency slots (at most its cost).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        cost_arg: Optional[str] = None,
+        max_cost: Optional[int] = None,
+        max_fanout: Optional[int] = None,
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate or 1.0)
+        self.max_concurrency = max_concurrency
+        self.cost_arg = cost_arg
+        self.max_cost = max_cost
+        self.max_fanout = max_fanout
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self.stats = {
+            "calls": 0,
+            "waited": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "rejected": 0,
+            "in_flight": 0,
+        }
+
+    @classmethod
+    def from_dict(cls, name: str, config: Dict[str, Any]) -> "Limit":
+        return cls(
+            name,
+            rate=config.get("rate"),
+            burst=config.get("burst"),
+            max_concurrency=config.get("max_concurrency"),
+            cost_arg=config.get("cost_arg"),
+            max_cost=config.get("max_cost"),
+            max_fanout=config.get("max_fanout"),
+        )
+
+    def record_wait(self, seconds: float):
+        RATE_LIMIT_WAIT_SECONDS.observe(seconds, limit=self.name)
+        self.stats["calls"] += 1
+        # Ignore the scheduling noise of calls that got through right away
+        if seconds > 0.001:
+            self.stats["waited"] += 1
+            self.stats["wait_seconds"] += seconds
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], seconds)
+
+
+class _BucketStore:
+    """
+    Token buckets and concurrency leases kept in a SQLite file so that every
+    worker process draws from the same buckets and slots. Each update runs in an
+    IMMEDIATE transaction.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases (id TEXT PRIMARY KEY, name TEXT, expires REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS leases_name ON leases (name)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def reserve(
+        self, name: str, rate: float, burst: float, max_wait: float, cost: int = 1
+    ) -> Optional[float]:
+        """
+        Takes ``cost`` tokens from a bucket, reserving future tokens if too few are left.
+
+        :return: Seconds to wait before the call may proceed, or None if that
+                 would exceed ``max_wait`` (nothing is reserved then).
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE name = ?", (name,)
+            ).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            # Tokens may go negative: each waiting call holds a reservation
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            if wait > max_wait:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (name, tokens - cost, now),
+            )
+            conn.execute("COMMIT")
+            return wait
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def refund(self, buckets: List[tuple]):
+        """
+        Returns the tokens reserved by a call that did not go ahead.
+
+        :param buckets: (name, burst, cost) of each bucket the call took tokens from.
+        """
+        self._conn().executemany(
+            "UPDATE buckets SET tokens = MIN(?, tokens + ?) WHERE name = ?",
+            [(burst, cost, name) for name, burst, cost in buckets],
+        )
+
+    def acquire_lease(
+        self, name: str, max_concurrency: int, ttl: float, slots: int = 1
+    ) -> Optional[List[str]]:
+        """
+        Takes ``slots`` of the ``max_concurrency`` slots of a limit at once, first
+        freeing the slots whose lease has expired.
+
+        :return: The lease ids, or None if not enough slots are free.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM leases WHERE name = ? AND expires < ?", (name, now))
+            (held,) = conn.execute(
+                "SELECT COUNT(*) FROM leases WHERE name = ?", (name,)
+            ).fetchone()
+            if held + slots > max_concurrency:
+                conn.execute("ROLLBACK")
+                return None
+            lease_ids = [f"{os.getpid()}:{uuid.uuid4().hex}" for _ in range(slots)]
+            conn.executemany(
+                "INSERT INTO leases (id, name, expires) VALUES (?, ?, ?)",
+                [(lease_id, name, now + ttl) for lease_id in lease_ids],
+            )
+            conn.execute("COMMIT")
+            return lease_ids
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def release_leases(self, lease_ids: List[str]):
+        self._conn().executemany(
+            "DELETE FROM leases WHERE id = ?", [(lease_id,) for lease_id in lease_ids]
+        )
+
+
+class RateLimiter:
+    """
+    Enforces per-tool and per-provider limits on upstream tool calls.
+
+    Rate limits are token buckets and concurrency caps are leases, both shared by
+    all workers on the host. A call over its limits waits for a slot instead of
+    failing, up to ``max_wait`` seconds, after which RateLimitExceeded is raised.
+    If the shared store cannot be opened, concurrency caps fall back to applying
+    per worker and rate limits are disabled.
+    """
+
+    def __init__(
+        self,
+        tools: Optional[List[tuple]] = None,
+        providers: Optional[Dict[str, Limit]] = None,
+        db_path: str = RATE_LIMIT_DB,
+        max_wait: float = RATE_LIMIT_MAX_WAIT,
+        lease_ttl: float = RATE_LIMIT_LEASE_TTL,
+    ):
+        # (pattern, Limit, provider name) in configuration order
+        self.tools = tools or []
+        self.providers = providers or {}
+        self.max_wait = max_wait
+        self.lease_ttl = lease_ttl
+        self._store: Optional[_BucketStore] = None
+        if any(limit.rate or limit.max_concurrency for limit in self.all_limits()):
+            try:
+                self._store = _BucketStore(db_path)
+            except sqlite3.Error as e:
+                logger.error(
+                    f"Failed to open rate limit store {db_path}, rate limits disabled "
+                    f"and concurrency caps applied per worker: {e}"
+                )
+
+    @classmethod
+    def from_config(cls, path: str = RATE_LIMITS_FILE) -> "RateLimiter":
+        """
+        Creates a limiter from a JSON file of the form
+        {"providers": {"name": {...}}, "tools": {"pattern": {"provider": "name", ...}}}.
+        Tool patterns are shell-style wildcards matched against sanitized tool names.
+        """
+        try:
+            with open(path, "r") as file:
+                config = json.load(file)
+        except FileNotFoundError:
+            return cls()
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"Failed to load rate limits from {path}: {e}")
+            return cls()
+
+        providers = {
+            name: Limit.from_dict(f"provider:{name}", limit)
+            for name, limit in config.get("providers", {}).items()
+        }
+        tools = [
+            (pattern, Limit.from_dict(f"tool:{pattern}", limit), limit.get("provider"))
+            for pattern, limit in config.get("tools", {}).items()
+        ]
+        return cls(tools, providers)
+
+    def all_limits(self) -> List[Limit]:
+        return [limit for _, limit, _ in self.tools] + list(self.providers.values())
+
+    def limits_for(self, tool_name: str) -> List[Limit]:
+        """Returns the limits that apply to a tool: its own, then its provider's."""
+        for pattern, limit, provider in self.tools:
+            if fnmatch.fnmatchcase(tool_name, pattern):
+                limits = [limit]
+                if provider in self.providers:
+                    limits.append(self.providers[provider])
+                return limits
+        return []
+
+    def cost_of(self, tool_name: str, tool_args: Dict[str, Any]) -> int:
+        """
+        Returns the number of upstream calls a tool call makes: the items of the
+        argument named by the tool's ``cost_arg`` that differ in more than case
+        and whitespace, up to its ``max_cost``; 1 for other tools.
+        """
+        limits = self.limits_for(tool_name)
+        tool_limit = limits[0] if limits else None
+        if tool_limit is None or tool_limit.cost_arg is None:
+            return 1
+        value = tool_args.get(tool_limit.cost_arg)
+        if not isinstance(value, (list, tuple)):
+            return 1
+        cost = len({" ".join(str(item).split()).casefold() for item in value} - {""})
+        if tool_limit.max_cost:
+            cost = min(cost, tool_limit.max_cost)
+        return max(1, cost)
+
+    @asynccontextmanager
+    async def limit(self, tool_name: str, cost: int = 1) -> AsyncIterator[float]:
+        """
+        Waits until a call to ``tool_name`` is within all of its limits.
+
+        :param tool_name: The sanitized tool name.
+        :param cost: Tokens the call takes from each rate limit, i.e. the number
+                     of upstream calls it makes. The call holds one concurrency
+                     slot per upstream call it runs at once: up to the tool's
+                     ``max_fanout``, else one.
+        :raises RateLimitExceeded: If the limits cannot be met within ``max_wait``.
+        :return: An async context manager yielding the total time waited.
+        """
+        limits = self.limits_for(tool_name)
+        if not limits:
+            yield 0.0
+            return
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.max_wait
+        acquired: List[Limit] = []
+        leases: List[str] = []
+        fanout = limits[0].max_fanout
+        slots = max(1, min(cost, fanout)) if fanout else 1
+        reserved: List[Limit] = []
+        try:
+            for limit in limits:
+                if limit.semaphore is None:
+                    continue
+                # The local semaphore keeps this worker's waiting calls off the
+                # store; the shared leases enforce the cap, counting fan-out
+                try:
+                    await asyncio.wait_for(limit.semaphore.acquire(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    self._reject(limit, f"No free slot for {limit.name} within {self.max_wait:g}s")
+                acquired.append(limit)
+                if self._store is None:
+                    continue
+                while True:
+                    lease_ids = await asyncio.to_thread(
+                        self._store.acquire_lease,
+                        limit.name,
+                        limit.max_concurrency,
+                        self.lease_ttl,
+                        min(slots, limit.max_concurrency),
+                    )
+                    if lease_ids is not None:
+                        leases.extend(lease_ids)
+                        break
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        self._reject(limit, f"No free slot for {limit.name} within {self.max_wait:g}s")
+                    await asyncio.sleep(min(RATE_LIMIT_LEASE_POLL, remaining))
+
+            try:
+                for limit in limits:
+                    if not limit.rate or self._store is None:
+                        continue
+                    remaining = max(0.0, deadline - loop.time())
+                    wait = await asyncio.to_thread(
+                        self._store.reserve, limit.name, limit.rate, limit.burst, remaining, cost
+                    )
+                    if wait is None:
+                        self._reject(
+                            limit,
+                            f"Rate limit of {limit.name} ({limit.rate:g}/s) not met within {self.max_wait:g}s",
+                        )
+                    reserved.append(limit)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+            except BaseException:
+                # The call does not go ahead, so give back the tokens it already took
+                if reserved:
+                    await asyncio.shield(asyncio.to_thread(
+                        self._store.refund, [(limit.name, limit.burst, cost) for limit in reserved]
+                    ))
+                raise
+
+            waited = loop.time() - start
+            for limit in limits:
+                limit.record_wait(waited)
+                limit.stats["in_flight"] += 1
+            try:
+                yield waited
+            finally:
+                for limit in limits:
+                    limit.stats["in_flight"] -= 1
+        finally:
+            for limit in acquired:
+                limit.semaphore.release()
+            if leases:
+                # Shielded so that a cancelled call still frees its slots for other workers
+                await asyncio.shield(asyncio.to_thread(self._store.release_leases, leases))
+
+    def _reject(self, limit: Limit, message: str):
+        limit.stats["rejected"] += 1
+        RATE_LIMIT_REJECTED.inc(limit=limit.name)
+        raise RateLimitExceeded(message)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {limit.name: dict(limit.stats) for limit in self.all_limits()}
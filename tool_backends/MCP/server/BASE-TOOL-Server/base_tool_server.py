@@ -72,6 +72,43 @@ async def web_search(query: str, top_k: int = 10):
     return result
 
 
+@mcp.tool()
+async def batch_web_search(queries: list[str], top_k: int = 10):
+    """
+    Use google search engine to search the web for several queries in one call.
+    The queries are searched concurrently; duplicate queries are searched once and
+    results found by several queries are merged.
+
+    Args:
+        queries (list[str]): The search queries to submit to the search engine.
+        top_k (int): The number of results to return for each query.
+
+    Returns:
+        dict: A dictionary with:
+            - queries: The queries that were searched, after removing duplicates.
+            - organic: The web page results of all queries, deduplicated by URL.
+                - title: The title of the web page.
+                - link: The URL of the web page.
+                - snippet: The snippet of the web page.
+                - queries: The queries that returned the web page.
+                - best_position: The best rank of the web page in any query.
+            - per_query: The other sections of each query's result, such as
+              knowledgeGraph and relatedSearches.
+            - errors: The queries that failed, if any.
+    """
+    # Use absolute import path to avoid relative import issues
+    import sys
+    import os
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    web_agent_dir = os.path.join(current_dir, 'web_agent')
+    if web_agent_dir not in sys.path:
+        sys.path.append(web_agent_dir)
+    from web_search import batch_google_search
+
+    result = await batch_google_search(queries, top_k)
+    return result
+
+
 @mcp.tool()
 async def web_parse(link: str, user_prompt: str, llm: str = "gpt-4.1-nano"):
     """
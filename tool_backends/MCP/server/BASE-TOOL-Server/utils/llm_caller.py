@@ -1,8 +1,10 @@
 import asyncio
 import openai
+import random
 import re
 import sys
 import os
+import time
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(os.path.dirname(current_dir)))
@@ -17,53 +19,168 @@ except ImportError:
     from configs.common_config import CommonConfig
 
 
-async def llm_call(query: str, model_name: str = "qwen-72b", max_retries: int = 3):
-    retry_count = 0
-    while retry_count < max_retries:
+# Default limits per model; a model entry in the LLM config may override them
+# with "max_concurrency", "rate" (requests per second) and "burst"
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_RATE = float(os.getenv("LLM_RATE", 0))
+LLM_BURST = float(os.getenv("LLM_BURST", 0))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 120))
+# Backoff between attempts: base * 2^attempt with full jitter, capped at max
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", 1))
+LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX", 30))
+
+_model_configs = {}
+_clients = {}
+_limiters = {}
+
+
+def _get_model_config(model_name: str) -> dict:
+    """Returns the configuration of a model, read from the config once per process."""
+    if model_name not in _model_configs:
+        if use_config_manager:
+            model_config = config_manager.get_llm_config().get(model_name)
+        else:
+            model_config = CommonConfig()[model_name]
+        if model_config is None:
+            raise ValueError(f"Model '{model_name}' not found in configuration")
+        if not model_config.get("url"):
+            raise ValueError(f"No URL configured for model '{model_name}'")
+        _model_configs[model_name] = model_config
+    return _model_configs[model_name]
+
+
+def _get_client(model_config: dict) -> openai.AsyncOpenAI:
+    """Returns a client per endpoint, so HTTP connections are pooled across calls."""
+    api_key = model_config.get("authorization", "EMPTY")
+    base_url = model_config["url"]
+    key = (base_url, api_key)
+    if key not in _clients:
+        # Retries are done by llm_call, with backoff and fallback models
+        _clients[key] = openai.AsyncOpenAI(
+            api_key=api_key, base_url=base_url, timeout=LLM_TIMEOUT, max_retries=0
+        )
+    return _clients[key]
+
+
+class _ModelLimiter:
+    """
+    Smooths the calls to one model: a semaphore caps calls in flight and a token
+    bucket caps the request rate. Callers over the rate wait for their reserved
+    token instead of failing.
+    """
+
+    def __init__(self, max_concurrency: int, rate: float, burst: float):
+        self.semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    async def wait_for_token(self):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+def _get_limiter(model_name: str, model_config: dict) -> _ModelLimiter:
+    if model_name not in _limiters:
+        _limiters[model_name] = _ModelLimiter(
+            int(model_config.get("max_concurrency", LLM_MAX_CONCURRENCY)),
+            float(model_config.get("rate", LLM_RATE)),
+            float(model_config.get("burst", LLM_BURST)),
+        )
+    return _limiters[model_name]
+
+
+class _EmptyResponse(ValueError):
+    pass
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409) or error.status_code >= 500
+    # Empty or invalid completions
+    return isinstance(error, _EmptyResponse)
+
+
+def _retry_after(error: Exception):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+async def _call_model(query: str, model_name: str, max_retries: int) -> str:
+    model_config = _get_model_config(model_name)
+    client = _get_client(model_config)
+    limiter = _get_limiter(model_name, model_config)
+    for attempt in range(max_retries):
         try:
-            # Use config_manager if available, otherwise fall back to CommonConfig
-            if use_config_manager:
-                llm_config = config_manager.get_llm_config()
-                model_config = llm_config.get(model_name)
-            else:
-                config = CommonConfig()
-                model_config = config[model_name]
-            
-            if model_config is None:
-                raise ValueError(f"Model '{model_name}' not found in configuration")
-            
-            api_key = model_config.get("authorization", "EMPTY")
-            base_url = model_config.get("url")
-            
-            if not base_url:
-                raise ValueError(f"No URL configured for model '{model_name}'")
-            
-            client = openai.AsyncOpenAI(
-                api_key=api_key,
-                base_url=base_url,
-            )
-            response = await client.chat.completions.create(
-                model=model_name, messages=[{"role": "user", "content": query}]
-            )
-            
-            if not response or not response.choices or len(response.choices) == 0:
-                raise ValueError("Empty response from LLM API")
-            
+            await limiter.wait_for_token()
+            async with limiter.semaphore:
+                response = await client.chat.completions.create(
+                    model=model_name, messages=[{"role": "user", "content": query}]
+                )
+            if not response or not response.choices:
+                raise _EmptyResponse("Empty response from LLM API")
             content = response.choices[0].message.content
             if isinstance(content, str) and content.strip():
                 return content
-            else:
-                raise ValueError("Invalid content received, not a non-empty string")
+            raise _EmptyResponse("Invalid content received, not a non-empty string")
+        except Exception as e:
+            print(f"Attempt {attempt + 1} with {model_name} failed: {e}")
+            if attempt + 1 == max_retries or not _is_retryable(e):
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = random.uniform(0, min(LLM_RETRY_MAX, LLM_RETRY_BASE * 2**attempt))
+            await asyncio.sleep(min(delay, LLM_RETRY_MAX))
 
+
+async def llm_call(
+    query: str, model_name: str = "qwen-72b", max_retries: int = 3, fallback_models=None
+):
+    """
+    Sends a single-turn chat completion and returns the text of the answer.
+
+    Calls to a model are limited by its concurrency cap and rate, and transient
+    errors (connection errors, rate limits, 5xx, empty answers) are retried with
+    jittered exponential backoff, honoring Retry-After. When a model keeps
+    failing, the fallback models are tried in order.
+
+    :param query: The user message.
+    :param model_name: The model to call first.
+    :param max_retries: Attempts per model.
+    :param fallback_models: Models tried after ``model_name`` fails; defaults to
+                            the "fallback" list in the model's configuration.
+    :raises RuntimeError: If every model failed.
+    """
+    if fallback_models is None:
+        try:
+            fallback_models = _get_model_config(model_name).get("fallback", [])
+        except ValueError:
+            fallback_models = []
+    chain = [model_name] + [m for m in fallback_models if m and m != model_name]
+
+    last_error = None
+    for model in chain:
+        try:
+            return await _call_model(query, model, max_retries)
         except Exception as e:
-            retry_count += 1
-            print(f"Attempt {retry_count} failed: {e}")
-            if retry_count == max_retries:
-                raise RuntimeError(
-                    f"llm_call_async failed after {max_retries} retries."
-                ) from e
-            await asyncio.sleep(1)
-    return None
+            last_error = e
+            if model != chain[-1]:
+                print(f"{model} failed, falling back to the next model: {e}")
+    raise RuntimeError(
+        f"llm_call_async failed after {max_retries} retries with {', '.join(chain)}."
+    ) from last_error
 
 
 async def conclude_abstract(abstract, question):
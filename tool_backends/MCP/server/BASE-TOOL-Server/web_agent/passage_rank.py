@@ -0,0 +1,226 @@
+import re
+import math
+from collections import Counter
+from html.parser import HTMLParser
+
+# Elements whose content is never part of the readable page
+SKIP_TAGS = {
+    "script", "style", "noscript", "svg", "template", "iframe",
+    "nav", "header", "footer", "aside", "form", "button", "select",
+}
+# Elements that end a line of text
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "br", "li", "ul", "ol", "tr",
+    "table", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "dd", "dt",
+    "figcaption", "caption",
+}
+# Short lines matching these are navigation or legal boilerplate when they are
+# repeated on the page or sit among its first or last BOILERPLATE_EDGE_LINES lines
+BOILERPLATE = re.compile(
+    r"cookie|privacy policy|terms of (use|service)|all rights reserved|sign in|log in|"
+    r"subscribe|newsletter|skip to (main )?content|accept all|share this|follow us",
+    re.I,
+)
+BOILERPLATE_MAX_CHARS = 120
+BOILERPLATE_EDGE_LINES = 10
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s*")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "he",
+    "in", "is", "it", "its", "of", "on", "or", "that", "the", "to", "was", "were",
+    "will", "with", "what", "when", "where", "which", "who", "how", "did", "does",
+    "do", "this", "these", "those", "please", "about", "also", "s", "t",
+}
+
+
+class _TextExtractor(HTMLParser):
+    """
+    Converts HTML to plain text lines. Link targets and image sources are kept
+    inline, since the parser is asked to return related URLs.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+        self._href = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth:
+            return
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+        attrs = dict(attrs)
+        if tag == "img" and (attrs.get("src") or "").startswith("http"):
+            self.parts.append(f" [image: {attrs.get('alt') or ''}]({attrs['src']}) ")
+        elif tag == "a" and (attrs.get("href") or "").startswith("http"):
+            self._href = attrs["href"]
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.skip_depth:
+            return
+        if tag == "a" and self._href:
+            self.parts.append(f" ({self._href})")
+            self._href = None
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+
+def looks_like_html(text: str) -> bool:
+    head = text[:2048].lower()
+    return "<html" in head or "<!doctype html" in head or head.count("<div") > 2
+
+
+def html_to_text(html: str) -> str:
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        # Malformed markup: keep whatever was extracted so far
+        pass
+    return "".join(parser.parts)
+
+
+def clean_text(text: str, query: str = "") -> str:
+    """
+    Turns a fetched page (HTML, markdown or text) into readable lines: markup is
+    removed, whitespace collapsed, and boilerplate short lines dropped. A short
+    line counts as boilerplate only if it matches BOILERPLATE and is repeated or
+    near the start or end of the page; lines sharing a term with ``query`` are
+    always kept.
+    """
+    if looks_like_html(text):
+        text = html_to_text(text)
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    counts = Counter(line for line in lines if len(line) <= BOILERPLATE_MAX_CHARS)
+    query_terms = set(tokenize(query))
+    kept = []
+    for i, line in enumerate(lines):
+        if (
+            len(line) <= BOILERPLATE_MAX_CHARS
+            and BOILERPLATE.search(line)
+            and (
+                counts[line] > 1
+                or i < BOILERPLATE_EDGE_LINES
+                or i >= len(lines) - BOILERPLATE_EDGE_LINES
+            )
+            and not query_terms.intersection(tokenize(line))
+        ):
+            continue
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def split_passages(text: str, max_chars: int = 1200) -> list:
+    """
+    Groups consecutive lines into passages of at most ``max_chars`` characters;
+    longer lines are split at sentence ends.
+    """
+    passages = []
+    current = []
+    size = 0
+    for line in text.splitlines():
+        pieces = [line]
+        if len(line) > max_chars:
+            pieces = [s for s in _SENTENCE_END.split(line) if s]
+            pieces = [p[i : i + max_chars] for p in pieces for i in range(0, len(p), max_chars)]
+        for piece in pieces:
+            if current and size + len(piece) + 1 > max_chars:
+                passages.append("\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 1
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+
+def tokenize(text: str) -> list:
+    """Lowercased words without stopwords, plus unigrams and bigrams of CJK runs."""
+    text = text.lower()
+    tokens = [w for w in _WORD.findall(text) if w not in STOPWORDS]
+    for run in _CJK.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def bm25_scores(passages: list, query: str, k1: float = 1.5, b: float = 0.75) -> list:
+    """Scores each passage against the query with Okapi BM25."""
+    docs = [Counter(tokenize(p)) for p in passages]
+    if not docs:
+        return []
+    lengths = [sum(d.values()) for d in docs]
+    avg_length = (sum(lengths) / len(docs)) or 1.0
+    terms = set(tokenize(query))
+    df = {t: sum(1 for d in docs if t in d) for t in terms}
+    n = len(docs)
+    scores = []
+    for doc, length in zip(docs, lengths):
+        score = 0.0
+        for t in terms:
+            tf = doc.get(t)
+            if not tf:
+                continue
+            idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+        scores.append(score)
+    return scores
+
+
+def select_passages(passages: list, query: str, max_chars: int) -> list:
+    """
+    Picks the passages most relevant to the query that fit in ``max_chars``,
+    returned in page order. The first passage (usually the title and lead) is always kept.
+    """
+    if sum(len(p) + 1 for p in passages) <= max_chars:
+        return list(passages)
+    scores = bm25_scores(passages, query)
+    order = [0] + sorted(range(1, len(passages)), key=lambda i: (-scores[i], i))
+    chosen = []
+    size = 0
+    for i in order:
+        if size + len(passages[i]) + 1 > max_chars:
+            continue
+        chosen.append(i)
+        size += len(passages[i]) + 1
+    return [passages[i] for i in sorted(chosen)]
+
+
+def pack_chunks(passages: list, query: str, chunk_chars: int, max_chunks: int) -> list:
+    """
+    Packs passages in page order into chunks of at most ``chunk_chars``. If there
+    are more than ``max_chunks``, the chunks with the highest BM25 mass are kept.
+    """
+    chunks = []
+    current = []
+    size = 0
+    for i, passage in enumerate(passages):
+        if current and size + len(passage) + 1 > chunk_chars:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += len(passage) + 1
+    if current:
+        chunks.append(current)
+
+    if len(chunks) > max_chunks:
+        scores = bm25_scores(passages, query)
+        mass = [sum(scores[i] for i in chunk) for chunk in chunks]
+        keep = sorted(sorted(range(len(chunks)), key=lambda c: (-mass[c], c))[:max_chunks])
+        chunks = [chunks[c] for c in keep]
+    return ["\n".join(passages[i] for i in chunk) for chunk in chunks]
@@ -0,0 +1,94 @@
+import os
+import time
+import threading
+
+# Directory with local tokenizer copies, one sub-directory per repository name
+# (e.g. $TOKENIZER_DIR/Qwen-72B); used instead of downloading from the hub
+TOKENIZER_DIR = os.getenv("TOKENIZER_DIR", "")
+# Seconds to use length estimates after a failed tokenizer load before trying again
+TOKENIZER_RETRY_INTERVAL = float(os.getenv("TOKENIZER_RETRY_INTERVAL", 300))
+
+# (tokenizer source, chunk token limit) per model family
+GPT_TOKENIZER = ("tiktoken:gpt-4o", 120000)
+DEEPSEEK_TOKENIZER = ("deepseek-ai/deepseek-r1", 120000)
+QWEN_TOKENIZER = ("Qwen/Qwen-72B", 30000)
+
+# Byte-level BPE tokens cover at least one byte; this margin absorbs special tokens
+SPECIAL_TOKEN_MARGIN = 16
+# A UTF-8 character is at most 4 bytes
+MAX_BYTES_PER_CHAR = 4
+
+_tokenizers = {}
+# Tokenizer source -> time after which a failed load is attempted again
+_retry_after = {}
+_lock = threading.Lock()
+
+
+def tokenizer_spec(model: str) -> tuple:
+    """Returns (tokenizer source, chunk token limit) for a model name."""
+    model = model or ""
+    if "gpt" in model:
+        return GPT_TOKENIZER
+    if model == "deepseek-r1":
+        return DEEPSEEK_TOKENIZER
+    return QWEN_TOKENIZER
+
+
+def _load(source: str):
+    if source.startswith("tiktoken:"):
+        import tiktoken
+
+        return tiktoken.encoding_for_model(source.split(":", 1)[1])
+
+    from transformers import AutoTokenizer
+
+    if TOKENIZER_DIR:
+        local_path = os.path.join(TOKENIZER_DIR, source.split("/")[-1])
+        if os.path.isdir(local_path):
+            return AutoTokenizer.from_pretrained(
+                local_path, trust_remote_code=True, local_files_only=True
+            )
+    return AutoTokenizer.from_pretrained(source, trust_remote_code=True)
+
+
+def get_tokenizer(model: str):
+    """
+    Returns the tokenizer of a model, loading it once per process. Returns None
+    if it cannot be loaded (e.g. offline without a local copy); callers then
+    fall back to estimates. A failed load is retried after
+    TOKENIZER_RETRY_INTERVAL seconds, so a transient network error does not
+    disable the tokenizer for the life of the process.
+    """
+    source, _ = tokenizer_spec(model)
+    if source in _tokenizers:
+        return _tokenizers[source]
+    if time.monotonic() < _retry_after.get(source, 0):
+        return None
+    with _lock:
+        if source in _tokenizers:
+            return _tokenizers[source]
+        if time.monotonic() < _retry_after.get(source, 0):
+            return None
+        try:
+            _tokenizers[source] = _load(source)
+        except Exception as e:
+            print(
+                f"Failed to load tokenizer {source}, using length estimates for "
+                f"{TOKENIZER_RETRY_INTERVAL:g}s: {e}"
+            )
+            _retry_after[source] = time.monotonic() + TOKENIZER_RETRY_INTERVAL
+            return None
+        _retry_after.pop(source, None)
+    return _tokenizers[source]
+
+
+def fits_in_tokens(text: str, token_limit: int) -> bool:
+    """
+    Cheap upper-bound check: True if the text certainly has at most
+    ``token_limit`` tokens, without tokenizing it. Byte-level BPE tokenizers
+    never produce more tokens than the text has UTF-8 bytes.
+    """
+    budget = token_limit - SPECIAL_TOKEN_MARGIN
+    if len(text) * MAX_BYTES_PER_CHAR <= budget:
+        return True
+    return len(text.encode("utf-8", errors="ignore")) <= budget
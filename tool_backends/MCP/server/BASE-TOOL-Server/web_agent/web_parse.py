@@ -3,7 +3,7 @@ import os
 import sys
 import json
 import asyncio
-import tiktoken
+import tempfile
 import warnings
 import aiohttp
 
@@ -17,14 +17,16 @@ sys.path.append(os.path.dirname(current_dir))
 project_root = '/mnt'
 sys.path.append(project_root)
 from MCP.config_manager import config_manager
+from MCP.tool_cache import CachePolicy, ToolCache
 has_config_manager = True
 print("Successfully loaded config manager")
 
 
 # Try to import required modules
 from get_html import fetch_web_content
+from passage_rank import clean_text, pack_chunks, select_passages, split_passages
+from token_counter import SPECIAL_TOKEN_MARGIN, fits_in_tokens, get_tokenizer, tokenizer_spec
 from utils.llm_caller import llm_call
-from transformers import AutoTokenizer
 
 # Load configuration
 tools_config = {}
@@ -55,28 +57,65 @@ if not has_config_manager:
 # Set global variables
 USE_PROMPT = tools_config.get("user_prompt", {})
 USE_LLM = tools_config.get("USE_MODEL", "gpt-4o")
+# Models tried by llm_call when the requested model keeps failing
+FALLBACK_MODELS = [m for m in [tools_config.get("BASE_MODEL")] if m]
 warnings.filterwarnings("ignore")
 
+# "rank": send the passages most relevant to the query; "map_reduce": parse chunks of
+# the page concurrently and merge the results; "first_chunk": the first chunk of the raw page
+WEB_PARSE_MODE = os.getenv("WEB_PARSE_MODE", "rank")
+# Characters of page content sent to the LLM in one call
+WEB_PARSE_MAX_CHARS = int(os.getenv("WEB_PARSE_MAX_CHARS", 32000))
+# map_reduce: most chunks parsed per page and chunks parsed at once
+WEB_PARSE_MAX_CHUNKS = int(os.getenv("WEB_PARSE_MAX_CHUNKS", 6))
+WEB_PARSE_CONCURRENCY = int(os.getenv("WEB_PARSE_CONCURRENCY", 3))
 
-def split_chunks(text: str, model: str):
-    if "gpt" in model:
-        tokenizer = tiktoken.encoding_for_model("gpt-4o")
-        chunk_token_limit = 120000
-    elif model == "deepseek-r1":
-        tokenizer = AutoTokenizer.from_pretrained(
-            "deepseek-ai/deepseek-r1", trust_remote_code=True
-        )
-        chunk_token_limit = 120000
-    else:
-        tokenizer = AutoTokenizer.from_pretrained(
-            "Qwen/Qwen-72B", trust_remote_code=True
-        )
-        chunk_token_limit = 30000
+# Cache of parse results by (url, normalized prompt, model, mode)
+PARSE_CACHE_ENABLED = os.getenv("PARSE_CACHE_ENABLED", "1") != "0"
+PARSE_CACHE_TTL = float(os.getenv("PARSE_CACHE_TTL", 86400))
+PARSE_CACHE_MAX_ENTRIES = int(os.getenv("PARSE_CACHE_MAX_ENTRIES", 2000))
+PARSE_CACHE_MAX_DISK_ENTRIES = int(os.getenv("PARSE_CACHE_MAX_DISK_ENTRIES", 50000))
+# SQLite file shared by every tool server worker on the host; empty keeps the cache in memory
+PARSE_CACHE_DB = os.getenv(
+    "PARSE_CACHE_DB", os.path.join(tempfile.gettempdir(), "web_parse_cache.sqlite")
+)
+
+parse_cache = ToolCache(
+    default_policy=CachePolicy(cacheable=True, ttl=PARSE_CACHE_TTL),
+    max_entries=PARSE_CACHE_MAX_ENTRIES,
+    db_path=PARSE_CACHE_DB if PARSE_CACHE_ENABLED else "",
+    max_disk_entries=PARSE_CACHE_MAX_DISK_ENTRIES,
+    enabled=PARSE_CACHE_ENABLED,
+)
+# Prompts differing only in case or whitespace share a cache entry
+_PROMPT_NORMALIZER = CachePolicy(normalize=("strip", "collapse_whitespace", "casefold"))
+
+
+def split_chunks(text: str, model: str, max_chunks: int = None):
+    """
+    Splits text into chunks that fit the context of ``model``.
+
+    Text that is clearly under the limit is returned as is without tokenizing.
+    Tokenizers are loaded once per process; if none is available, chunks are cut
+    by UTF-8 byte length, which never exceeds the token count of byte-level BPE.
+    """
+    _, chunk_token_limit = tokenizer_spec(model)
+    if fits_in_tokens(text, chunk_token_limit):
+        return [text]
+
+    tokenizer = get_tokenizer(model)
+    if tokenizer is None:
+        data = text.encode("utf-8")
+        size = chunk_token_limit - SPECIAL_TOKEN_MARGIN
+        starts = range(0, len(data), size)
+        if max_chunks:
+            starts = starts[:max_chunks]
+        return [data[i : i + size].decode("utf-8", errors="ignore") for i in starts]
 
     all_tokens = tokenizer.encode(text)
     chunks = []
     start = 0
-    while start < len(all_tokens):
+    while start < len(all_tokens) and not (max_chunks and len(chunks) >= max_chunks):
         end = min(start + chunk_token_limit, len(all_tokens))
         chunk_tokens = all_tokens[start:end]
         chunk_text = tokenizer.decode(chunk_tokens)
@@ -85,38 +124,146 @@ def split_chunks(text: str, model: str):
     return chunks
 
 
-async def read_html(text, user_prompt, model=None):
+async def _conclude(info: str, user_prompt: str, model: str):
+    template = USE_PROMPT["search_conclusion"]
+    final_prompt = template.format(user=user_prompt, info=info)
+    answer = await llm_call(final_prompt, model, fallback_models=FALLBACK_MODELS)
+    if answer is None:
+        return {"content": "LLM returned no response", "urls": [], "score": -1}
+    return _get_contents(answer)
+
+
+def _merge_results(results: list):
+    """Combines partial results without an LLM: best-scored content first, URLs deduplicated."""
+    results = sorted(results, key=lambda r: _score(r), reverse=True)
+    urls = []
+    seen = set()
+    for result in results:
+        for url in result.get("urls") or []:
+            key = url.get("url") if isinstance(url, dict) else url
+            if key not in seen:
+                seen.add(key)
+                urls.append(url)
+    return {
+        "content": "\n\n".join(str(r.get("content", "")) for r in results),
+        "urls": urls[:2],
+        "score": _score(results[0]),
+    }
+
+
+def _score(result) -> float:
     try:
-        chunks = split_chunks(text, model)
-        # only select the first chunk
-        chunks = chunks[:1]
-        template = USE_PROMPT["search_conclusion"]
-        final_prompt = template.format(user=user_prompt, info=chunks[0])
-        answer = await llm_call(final_prompt, model)
-        if answer is None:
-            return {"content": "LLM returned no response", "urls": [], "score": -1}
-        return _get_contents(answer)
+        return float(result.get("score", -1))
+    except (TypeError, ValueError):
+        return -1.0
+
+
+async def _map_reduce(chunks: list, user_prompt: str, model: str):
+    """
+    Parses each chunk concurrently (at most WEB_PARSE_CONCURRENCY at once), then
+    asks the LLM to merge the relevant partial results into one answer.
+    """
+    semaphore = asyncio.Semaphore(WEB_PARSE_CONCURRENCY)
+
+    async def parse_chunk(chunk):
+        async with semaphore:
+            return await _conclude(chunk, user_prompt, model)
+
+    partials = await asyncio.gather(*[parse_chunk(c) for c in chunks], return_exceptions=True)
+    results = [p for p in partials if isinstance(p, dict) and _score(p) != -1]
+    if not results:
+        failed = next((p for p in partials if isinstance(p, dict)), None)
+        if failed is not None:
+            return failed
+        raise partials[0]
+    if len(results) == 1:
+        return results[0]
+
+    relevant = [r for r in results if _score(r) > 0] or results
+    info = json.dumps(
+        [{"content": r.get("content"), "urls": r.get("urls", [])} for r in relevant],
+        ensure_ascii=False,
+    )
+    merged = await _conclude(info, user_prompt, model)
+    if _score(merged) == -1:
+        return _merge_results(relevant)
+    return merged
+
+
+async def read_html(text, user_prompt, model=None, mode=None):
+    """
+    Parses page content with the LLM according to ``mode`` (WEB_PARSE_MODE by default).
+    The "rank" and "map_reduce" modes first strip markup and boilerplate and rank
+    passages by BM25 against the user prompt.
+    """
+    mode = mode or WEB_PARSE_MODE
+    try:
+        if mode == "first_chunk":
+            # only select the first chunk
+            chunks = split_chunks(text, model, max_chunks=1)
+            return await _conclude(chunks[0], user_prompt, model)
+
+        passages = split_passages(clean_text(text, user_prompt))
+        if not passages:
+            return {"content": "The web page has no readable content", "urls": [], "score": -1}
+        if mode == "map_reduce":
+            chunks = pack_chunks(
+                passages, user_prompt, WEB_PARSE_MAX_CHARS, WEB_PARSE_MAX_CHUNKS
+            )
+            return await _map_reduce(chunks, user_prompt, model)
+        info = "\n".join(select_passages(passages, user_prompt, WEB_PARSE_MAX_CHARS))
+        return await _conclude(info, user_prompt, model)
     except Exception as e:
         print(f"Error in read_html: {str(e)}")
         return {"content": f"Error parsing content: {str(e)}", "urls": [], "score": -1}
 
 
+class _UncachedResult(Exception):
+    """Carries a failed parse result out of the cache, so that it is not stored."""
+
+    def __init__(self, result):
+        super().__init__("parse failed")
+        self.result = result
+
+
 async def parse_htmlpage(url: str, user_prompt: str = "", llm: str = None):
+    """
+    Parses a web page for a user prompt, returning {"content", "urls", "score"}.
+
+    Results are cached by URL, normalized prompt, model and parse mode, across
+    all workers sharing PARSE_CACHE_DB. Concurrent identical parses share one
+    fetch and LLM call, and failed parses are not cached.
+    """
+    model_to_use = llm if llm else USE_LLM
+    if not PARSE_CACHE_ENABLED:
+        return await _parse_htmlpage(url, user_prompt, model_to_use)
+
+    async def call():
+        result = await _parse_htmlpage(url, user_prompt, model_to_use)
+        if not isinstance(result, dict) or result.get("score") == -1:
+            raise _UncachedResult(result)
+        return result
+
+    args = {
+        "url": url.strip(),
+        "prompt": _PROMPT_NORMALIZER.normalize_value(user_prompt or ""),
+        "model": model_to_use,
+        "mode": WEB_PARSE_MODE,
+    }
+    try:
+        return await parse_cache.get_or_call("web_parse", args, call)
+    except _UncachedResult as e:
+        return e.result
+
+
+async def _parse_htmlpage(url: str, user_prompt: str, model_to_use: str):
     try:
         is_fetch, text = await fetch_web_content(url)
         if not is_fetch:
             return {"content": "failed to fetch web content", "urls": [], "score": -1}
 
-        model_to_use = llm if llm else USE_LLM
-        try:
-            print(f"Using {model_to_use} to parse web pages...")
-            result = await read_html(text, user_prompt, model=model_to_use)
-            return result
-        except Exception as e:
-            USE_LLM = tools_config["BASE_MODEL"]
-            print(f"Using {USE_LLM} for parsing: {e}")
-            result = await read_html(text, user_prompt, model=USE_LLM)
-            return result
+        print(f"Using {model_to_use} to parse web pages...")
+        return await read_html(text, user_prompt, model=model_to_use)
 
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -2,6 +2,7 @@ import aiohttp
 import asyncio
 import os
 import sys
+from urllib.parse import urlsplit, urlunsplit
 
 # Get the directory of the current file
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -12,12 +13,138 @@ import tool_api
 
 web_search_api = tool_api.web_search_api
 
+# Searches of one batch running at once, and the most queries accepted per batch;
+# keep in step with max_fanout and max_cost of batch_web_search in MCP/config/rate_limits.json
+BATCH_SEARCH_CONCURRENCY = int(os.getenv("BATCH_SEARCH_CONCURRENCY", 8))
+BATCH_SEARCH_MAX_QUERIES = int(os.getenv("BATCH_SEARCH_MAX_QUERIES", 20))
+
+_session = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Returns the HTTP session shared by all searches of this server process."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=64, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=60),
+        )
+    return _session
+
 
 async def google_search(query: str, top_k: int = 10):
-    async with aiohttp.ClientSession() as session:
-        result = await web_search_api(session, query, top_k)
+    result = await web_search_api(get_session(), query, top_k)
+    return result
+
+
+def _normalize_url(url: str) -> str:
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+    path = parts.path.rstrip("/")
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+def dedupe_queries(queries: list) -> list:
+    """Drops empty queries and queries differing only in case or whitespace, keeping order."""
+    unique = []
+    seen = set()
+    for query in queries:
+        query = " ".join(str(query).split())
+        key = query.casefold()
+        if query and key not in seen:
+            seen.add(key)
+            unique.append(query)
+    return unique
+
+
+def _search_error(result) -> str:
+    """
+    Returns why a search result is a failure, or "" for a search result. Besides
+    exceptions, failures come back as api_proxy errors ({"detail": ...}), upstream
+    errors ({"error": ...}) and the fallback results of tool_api, none of which
+    have an "organic" section.
+    """
+    if isinstance(result, str):
         return result
+    if not isinstance(result, dict) or not result:
+        return "No results"
+    for key in ("error", "detail"):
+        if result.get(key):
+            return str(result[key])
+    if "organic" not in result:
+        return "Search returned no organic results"
+    return ""
+
+
+def merge_search_results(results: dict) -> dict:
+    """
+    Merges the results of several searches. Organic results are deduplicated by
+    URL and ordered by their best position in any search; each keeps the queries
+    that found it. Other sections (knowledgeGraph, answerBox, ...) stay per query.
+    Failed searches are reported under "errors" instead.
+    """
+    merged = {}
+    other = {}
+    errors = {}
+    for query, result in results.items():
+        error = _search_error(result)
+        if error:
+            errors[query] = error
+            continue
+        other_sections = {k: v for k, v in result.items() if k != "organic"}
+        if other_sections:
+            other[query] = other_sections
+        for rank, item in enumerate(result.get("organic") or []):
+            link = item.get("link") or item.get("url")
+            if not link:
+                continue
+            key = _normalize_url(link)
+            position = item.get("position", rank + 1)
+            if key not in merged:
+                merged[key] = dict(item, queries=[query], best_position=position)
+            else:
+                entry = merged[key]
+                entry["queries"].append(query)
+                entry["best_position"] = min(entry["best_position"], position)
+                if len(item.get("snippet") or "") > len(entry.get("snippet") or ""):
+                    entry["snippet"] = item["snippet"]
+
+    organic = sorted(
+        merged.values(), key=lambda e: (e["best_position"], -len(e["queries"]))
+    )
+    response = {"queries": list(results), "organic": organic, "per_query": other}
+    if errors:
+        response["errors"] = errors
+    return response
+
+
+async def batch_google_search(
+    queries: list, top_k: int = 10, max_concurrency: int = BATCH_SEARCH_CONCURRENCY
+):
+    """
+    Runs several searches concurrently over the shared session, at most
+    ``max_concurrency`` at a time, and merges their results by URL.
+    """
+    queries = dedupe_queries(queries)[:BATCH_SEARCH_MAX_QUERIES]
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def search(query):
+        async with semaphore:
+            try:
+                return await google_search(query, top_k)
+            except Exception as e:
+                return f"Search failed: {e}"
+
+    results = await asyncio.gather(*[search(q) for q in queries])
+    return merge_search_results(dict(zip(queries, results)))
+
+
+async def main():
+    print(await google_search("what is google"))
+    await get_session().close()
 
 
 if __name__ == "__main__":
-    print(asyncio.run(google_search("what is google")))
+    asyncio.run(main())
@@ -0,0 +1,200 @@
+import os
+import json
+import hashlib
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Number of events kept per session for consumers that are slow or reconnect
+STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", 1024))
+# Events whose encoded size exceeds this many bytes are written to disk
+STREAM_SPILL_BYTES = int(os.getenv("STREAM_SPILL_BYTES", 256 * 1024))
+# Encoded bytes of events kept in memory per session; further events are written
+# to disk, or the oldest events are dropped when there is no spill directory
+STREAM_MEMORY_BYTES = int(os.getenv("STREAM_MEMORY_BYTES", 8 * 1024 * 1024))
+# Maximum number of events written to a consumer in one chunk
+STREAM_MAX_BATCH = int(os.getenv("STREAM_MAX_BATCH", 256))
+
+
+def is_end_item(item: Dict[str, Any]) -> bool:
+    """
+    Returns True for the item that closes a result stream: a main-stream item
+    (no sub_stream_type) whose stream_state is 'end'.
+    """
+    return (not item.get("sub_stream_type")) and item.get("stream_state") == "end"
+
+
+class _Event:
+    """
+    A buffered stream event. The item is JSON-encoded once at publish time;
+    large payloads live in a spill file instead of memory.
+    """
+
+    __slots__ = ("event_id", "data", "spill_path", "is_end")
+
+    def __init__(self, event_id: int, data: Optional[str], spill_path: Optional[str], is_end: bool):
+        self.event_id = event_id
+        self.data = data
+        self.spill_path = spill_path
+        self.is_end = is_end
+
+    def load(self) -> str:
+        if self.data is not None:
+            return self.data
+        try:
+            with open(self.spill_path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError as e:
+            logger.error(f"Failed to read spilled stream event {self.event_id}: {e}")
+            return json.dumps({"error": f"spilled event {self.event_id} unavailable"})
+
+    def discard(self):
+        if self.spill_path is not None:
+            try:
+                os.remove(self.spill_path)
+            except OSError:
+                pass
+
+
+class SessionStream:
+    """
+    A bounded, replayable stream of result items for one session.
+
+    Items get monotonically increasing event ids and are kept in a ring buffer of
+    ``capacity`` events, so a consumer can resume after a disconnect from the last
+    id it received (SSE ``Last-Event-ID``) and unread items never grow without
+    bound. Encoded items larger than ``spill_bytes`` are stored in ``spill_dir``,
+    as are all further items once the items in memory reach ``memory_bytes``.
+    Without ``spill_dir``, the oldest items are dropped to stay within
+    ``memory_bytes`` instead.
+
+    :ivar cursor: Id of the last event delivered to a consumer that did not ask
+                  for a specific position; a new such consumer continues from here.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        spill_dir: Optional[str] = None,
+        capacity: int = STREAM_BUFFER_SIZE,
+        spill_bytes: int = STREAM_SPILL_BYTES,
+        memory_bytes: int = STREAM_MEMORY_BYTES,
+    ):
+        self.session_id = session_id
+        # Session ids come from clients; spill file names use a digest of them instead
+        self._file_key = hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+        self.spill_dir = spill_dir
+        self.capacity = capacity
+        self.spill_bytes = spill_bytes
+        self.memory_bytes = memory_bytes
+        # Encoded size of the events currently held in memory
+        self.buffered_bytes = 0
+        self.cursor = 0
+        self.closed = False
+        self._events: Deque[_Event] = deque()
+        self._next_id = 1
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    @property
+    def last_id(self) -> int:
+        return self._next_id - 1
+
+    def publish(self, item: Dict[str, Any]) -> int:
+        """
+        Appends an item to the stream and wakes up waiting consumers.
+
+        :param item: The stream item to append.
+        :return: The event id assigned to the item.
+        """
+        event_id = self._next_id
+        self._next_id += 1
+        data = json.dumps(item)
+
+        spill_path = None
+        over_budget = self.buffered_bytes + len(data) > self.memory_bytes
+        if self.spill_dir and (len(data) > self.spill_bytes or over_budget):
+            spill_path = os.path.join(self.spill_dir, f"stream_{self._file_key}_{event_id}.json")
+            try:
+                with open(spill_path, "w", encoding="utf-8") as f:
+                    f.write(data)
+                data = None
+            except OSError as e:
+                logger.warning(f"Failed to spill stream event to disk, keeping it in memory: {e}")
+                spill_path = None
+
+        self._events.append(_Event(event_id, data, spill_path, is_end_item(item)))
+        if data is not None:
+            self.buffered_bytes += len(data)
+        while len(self._events) > self.capacity:
+            self._drop_oldest()
+        # Without a spill file the budget is kept by dropping events, never the newest one
+        while self.buffered_bytes > self.memory_bytes and len(self._events) > 1:
+            self._drop_oldest()
+
+        self._notify()
+        return event_id
+
+    def _drop_oldest(self):
+        event = self._events.popleft()
+        if event.data is not None:
+            self.buffered_bytes -= len(event.data)
+        event.discard()
+
+    def _notify(self):
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    def _collect(self, after_id: int) -> List[_Event]:
+        if not self._events or after_id >= self.last_id:
+            return []
+        first_id = self._events[0].event_id
+        if after_id + 1 < first_id:
+            logger.warning(
+                f"Session {self.session_id}: events {after_id + 1}..{first_id - 1} "
+                f"were dropped from the stream buffer before being read"
+            )
+            after_id = first_id - 1
+        start = after_id + 1 - first_id
+        end = min(len(self._events), start + STREAM_MAX_BATCH)
+        return [self._events[i] for i in range(start, end)]
+
+    async def read(
+        self, after_id: Optional[int] = None, heartbeat: Optional[float] = None
+    ) -> AsyncIterator[List[Tuple[int, str, bool]]]:
+        """
+        Yields batches of buffered events newer than ``after_id`` as they arrive.
+
+        Every event available at wake-up time is returned in one batch, so bursts of
+        small events are written to the consumer together. When ``heartbeat`` is set,
+        an empty batch is yielded after that many idle seconds.
+
+        :param after_id: Id of the last event the consumer already has; defaults to ``cursor``.
+        :param heartbeat: Idle interval in seconds after which an empty batch is yielded.
+        :return: An async iterator of lists of (event_id, json_data, is_end).
+        """
+        last_id = self.cursor if after_id is None else after_id
+        while not self.closed:
+            events = self._collect(last_id)
+            if events:
+                last_id = events[-1].event_id
+                yield [(e.event_id, e.load(), e.is_end) for e in events]
+                continue
+
+            wakeup = self._wakeup
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield []
+
+    def close(self):
+        """Drops all buffered events, removes spill files and ends active readers."""
+        self.closed = True
+        while self._events:
+            self._drop_oldest()
+        self._notify()
@@ -0,0 +1,471 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "1") != "0"
+TOOL_CACHE_POLICIES = os.getenv(
+    "TOOL_CACHE_POLICIES", os.path.join(current_dir, "config/tool_cache_policies.json")
+)
+# Entries kept in the in-memory LRU tier of each worker
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", 10000))
+# SQLite file shared by all workers on a host; empty disables the disk tier
+TOOL_CACHE_DB = os.getenv("TOOL_CACHE_DB", "")
+# Rows kept in the disk tier; the entries closest to expiry are evicted first
+TOOL_CACHE_MAX_DISK_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_DISK_ENTRIES", 100000))
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Where a result returned by ToolCache came from
+CACHE_HIT = "HIT"
+CACHE_DISK_HIT = "DISK_HIT"
+CACHE_COALESCED = "COALESCED"
+CACHE_MISS = "MISS"
+CACHE_BYPASS = "BYPASS"
+
+
+class CachePolicy:
+    """
+    Caching rules for one tool.
+
+    :ivar cacheable: Whether results of the tool are cached at all.
+    :ivar ttl: Seconds a cached result stays valid.
+    :ivar normalize: Normalizations applied to string arguments before building
+                     the key: "strip", "collapse_whitespace" and "casefold".
+    :ivar ignore_args: Arguments that do not affect the result and are left out of the key.
+    :ivar reject_empty: Do not store empty results (no items, or only empty strings,
+                        lists or objects).
+    :ivar reject_patterns: Regular expressions (case-insensitive); results with a text
+                           item matching one of them are not stored, e.g. error messages.
+    :ivar require_keys: Keys every result item must have as a JSON object with a
+                        non-empty value; other results (e.g. fallback payloads) are not stored.
+    """
+
+    def __init__(
+        self,
+        cacheable: bool = False,
+        ttl: float = 3600,
+        normalize: Tuple[str, ...] = (),
+        ignore_args: Tuple[str, ...] = (),
+        reject_empty: bool = True,
+        reject_patterns: Tuple[str, ...] = (),
+        require_keys: Tuple[str, ...] = (),
+    ):
+        self.cacheable = cacheable
+        self.ttl = ttl
+        self.normalize = tuple(normalize)
+        self.ignore_args = tuple(ignore_args)
+        self.reject_empty = reject_empty
+        self.reject_patterns = tuple(reject_patterns)
+        self.require_keys = tuple(require_keys)
+        self._rejects = [re.compile(p, re.IGNORECASE) for p in self.reject_patterns]
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any], base: Optional["CachePolicy"] = None) -> "CachePolicy":
+        base = base or cls()
+        return cls(
+            cacheable=config.get("cacheable", base.cacheable),
+            ttl=config.get("ttl", base.ttl),
+            normalize=config.get("normalize", base.normalize),
+            ignore_args=config.get("ignore_args", base.ignore_args),
+            reject_empty=config.get("reject_empty", base.reject_empty),
+            reject_patterns=config.get("reject_patterns", base.reject_patterns),
+            require_keys=config.get("require_keys", base.require_keys),
+        )
+
+    def accepts(self, result: Any) -> bool:
+        """
+        Returns True if a tool result may be stored. Tools report some failures as
+        normal results (error strings, empty or fallback payloads); those must not
+        be served from the cache for the whole TTL.
+
+        :param result: The tool result, usually a list of text items.
+        """
+        items = result if isinstance(result, (list, tuple)) else [result]
+        if self.reject_empty and not items:
+            return False
+        for item in items:
+            value = item
+            if isinstance(item, str):
+                if any(pattern.search(item) for pattern in self._rejects):
+                    return False
+                try:
+                    value = json.loads(item)
+                except ValueError:
+                    value = item
+            if self.reject_empty and (value is None or value in ("", [], {})):
+                return False
+            if self.require_keys and not (
+                isinstance(value, dict) and all(value.get(k) for k in self.require_keys)
+            ):
+                return False
+        return True
+
+    def normalize_value(self, value: Any) -> Any:
+        if isinstance(value, str):
+            if "strip" in self.normalize:
+                value = value.strip()
+            if "collapse_whitespace" in self.normalize:
+                value = _WHITESPACE.sub(" ", value)
+            if "casefold" in self.normalize:
+                value = value.casefold()
+            return value
+        if isinstance(value, dict):
+            return {k: self.normalize_value(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.normalize_value(v) for v in value]
+        return value
+
+
+def load_policies(path: str = TOOL_CACHE_POLICIES) -> Tuple[CachePolicy, Dict[str, CachePolicy]]:
+    """
+    Loads the cache policies from a JSON file of the form
+    {"default": {...}, "tools": {"tool_name": {...}}}. Tool entries inherit
+    unspecified fields from "default".
+
+    :param path: Path of the policy file.
+    :return: A tuple (default_policy, {tool_name: policy}).
+    """
+    try:
+        with open(path, "r") as file:
+            config = json.load(file)
+    except FileNotFoundError:
+        return CachePolicy(), {}
+    except (json.JSONDecodeError, OSError) as e:
+        logger.error(f"Failed to load tool cache policies from {path}: {e}")
+        return CachePolicy(), {}
+
+    default = CachePolicy.from_dict(config.get("default", {}))
+    tools = {
+        name: CachePolicy.from_dict(policy, default)
+        for name, policy in config.get("tools", {}).items()
+    }
+    return default, tools
+
+
+class _DiskTier:
+    """
+    A SQLite-backed cache shared by all worker processes on a host. Each thread
+    uses its own connection; WAL mode lets readers and a writer work concurrently.
+    """
+
+    # Writes between two checks of the row count
+    TRIM_INTERVAL = 64
+
+    def __init__(self, path: str, max_entries: int = TOOL_CACHE_MAX_DISK_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._writes = 0
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache "
+            "(key TEXT PRIMARY KEY, tool TEXT, expires REAL, value TEXT)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        row = self._conn().execute(
+            "SELECT expires, value FROM tool_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[0] < time.time():
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, key: str, tool: str, expires: float, value: Any):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO tool_cache (key, tool, expires, value) VALUES (?, ?, ?, ?)",
+            (key, tool, expires, json.dumps(value)),
+        )
+        # Opportunistically drop a few expired rows to keep the file bounded
+        conn.execute(
+            "DELETE FROM tool_cache WHERE key IN "
+            "(SELECT key FROM tool_cache WHERE expires < ? LIMIT 16)",
+            (time.time(),),
+        )
+        self._writes += 1
+        if self.max_entries and self._writes % self.TRIM_INTERVAL == 0:
+            (count,) = conn.execute("SELECT COUNT(*) FROM tool_cache").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM tool_cache WHERE key IN "
+                    "(SELECT key FROM tool_cache ORDER BY expires LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+        conn.commit()
+
+
+class _Inflight:
+    """
+    An upstream call shared by identical concurrent calls. The call runs in its
+    own task so that cancelling the caller that started it does not cancel it
+    for the callers waiting on it.
+    """
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class ToolCache:
+    """
+    A result cache for idempotent tool calls.
+
+    Lookups go to an in-memory LRU tier first and then, if configured, to a
+    SQLite tier shared by all workers. Identical calls that are in flight at the
+    same time are coalesced into one upstream call (single-flight). Only tools
+    whose policy marks them cacheable are cached, and only successful results
+    that pass the policy's result checks (``CachePolicy.accepts``).
+
+    Each cache is switched on and off by its own ``enabled`` flag, so services
+    that reuse this class keep their own settings; only ``from_config`` reads
+    TOOL_CACHE_ENABLED.
+    """
+
+    def __init__(
+        self,
+        default_policy: Optional[CachePolicy] = None,
+        policies: Optional[Dict[str, CachePolicy]] = None,
+        max_entries: int = TOOL_CACHE_MAX_ENTRIES,
+        db_path: str = TOOL_CACHE_DB,
+        max_disk_entries: int = TOOL_CACHE_MAX_DISK_ENTRIES,
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.default_policy = default_policy or CachePolicy()
+        self.policies = policies or {}
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, _Inflight] = {}
+        self._disk: Optional[_DiskTier] = None
+        if db_path:
+            try:
+                self._disk = _DiskTier(db_path, max_disk_entries)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to open tool cache database {db_path}, disk tier disabled: {e}")
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "stores": 0,
+            "rejected": 0,
+            "disk_errors": 0,
+        }
+
+    @classmethod
+    def from_config(cls) -> "ToolCache":
+        """Creates a cache from TOOL_CACHE_POLICIES and the TOOL_CACHE_* settings."""
+        default, policies = load_policies()
+        return cls(default, policies, enabled=TOOL_CACHE_ENABLED)
+
+    def policy(self, tool_name: str) -> CachePolicy:
+        return self.policies.get(tool_name, self.default_policy)
+
+    @staticmethod
+    def make_key(tool_name: str, tool_args: Dict[str, Any], policy: CachePolicy) -> str:
+        """
+        Builds the cache key of a call from the tool name and its normalized arguments.
+        """
+        args = {
+            k: policy.normalize_value(v)
+            for k, v in (tool_args or {}).items()
+            if k not in policy.ignore_args
+        }
+        payload = json.dumps([tool_name, args], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _memory_get(self, key: str) -> Optional[Any]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.time():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return entry
+
+    def _memory_set(self, key: str, expires: float, value: Any):
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def _disk_get(self, key: str) -> Optional[Tuple[float, Any]]:
+        if self._disk is None:
+            return None
+        try:
+            return await asyncio.to_thread(self._disk.get, key)
+        except Exception as e:
+            self._stats["disk_errors"] += 1
+            logger.warning(f"Tool cache disk read failed: {e}")
+            return None
+
+    async def _disk_set(self, key: str, tool_name: str, expires: float, value: Any):
+        if self._disk is None:
+            return
+        try:
+            await asyncio.to_thread(self._disk.set, key, tool_name, expires, value)
+        except Exception as e:
+            self._stats["disk_errors"] += 1
+            logger.warning(f"Tool cache disk write failed: {e}")
+
+    async def get(self, tool_name: str, tool_args: Dict[str, Any]) -> Optional[Any]:
+        """
+        Looks up a value stored with ``set`` (or a cached call result) without calling anything.
+
+        :return: The cached value, or None if there is none, it expired or the
+                 cache is disabled.
+        """
+        if not self.enabled:
+            return None
+        key = self.make_key(tool_name, tool_args, self.policy(tool_name))
+        entry = self._memory_get(key)
+        if entry is not None:
+            self._stats["memory_hits"] += 1
+            return entry[1]
+        entry = await self._disk_get(key)
+        if entry is not None:
+            self._stats["disk_hits"] += 1
+            self._memory_set(key, *entry)
+            return entry[1]
+        self._stats["misses"] += 1
+        return None
+
+    async def set(
+        self, tool_name: str, tool_args: Dict[str, Any], value: Any, ttl: Optional[float] = None
+    ):
+        """Stores a value under a tool call key, for ``ttl`` seconds or the policy TTL."""
+        if not self.enabled:
+            return
+        policy = self.policy(tool_name)
+        key = self.make_key(tool_name, tool_args, policy)
+        expires = time.time() + (policy.ttl if ttl is None else ttl)
+        self._memory_set(key, expires, value)
+        self._stats["stores"] += 1
+        await self._disk_set(key, tool_name, expires, value)
+
+    async def get_or_call(
+        self,
+        tool_name: str,
+        tool_args: Dict[str, Any],
+        call: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Returns the cached result of a tool call, or performs the call and caches it.
+
+        :param tool_name: The sanitized tool name.
+        :param tool_args: The arguments of the call.
+        :param call: A coroutine function performing the actual call.
+        :return: The tool result.
+        """
+        result, _ = await self.get_or_call_with_status(tool_name, tool_args, call)
+        return result
+
+    async def get_or_call_with_status(
+        self,
+        tool_name: str,
+        tool_args: Dict[str, Any],
+        call: Callable[[], Awaitable[Any]],
+    ) -> Tuple[Any, str]:
+        """
+        Like ``get_or_call``, but also reports where the result came from.
+
+        :return: A tuple (result, status), status being one of CACHE_HIT,
+                 CACHE_DISK_HIT, CACHE_COALESCED, CACHE_MISS and CACHE_BYPASS.
+        """
+        policy = self.policy(tool_name)
+        if not (self.enabled and policy.cacheable):
+            return await call(), CACHE_BYPASS
+
+        key = self.make_key(tool_name, tool_args, policy)
+        entry = self._memory_get(key)
+        if entry is not None:
+            self._stats["memory_hits"] += 1
+            return entry[1], CACHE_HIT
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._stats["coalesced"] += 1
+            inflight.waiters += 1
+            try:
+                result, _ = await asyncio.shield(inflight.task)
+            finally:
+                inflight.waiters -= 1
+            return result, CACHE_COALESCED
+
+        inflight = _Inflight(
+            asyncio.ensure_future(self._fill(key, tool_name, policy, call))
+        )
+        self._inflight[key] = inflight
+        inflight.task.add_done_callback(lambda task: self._forget(key, inflight))
+        try:
+            return await asyncio.shield(inflight.task)
+        except asyncio.CancelledError:
+            # Waiters still get the result; with none left the call is abandoned
+            if not inflight.task.done() and inflight.waiters == 0:
+                self._forget(key, inflight)
+                inflight.task.cancel()
+            raise
+
+    async def _fill(
+        self,
+        key: str,
+        tool_name: str,
+        policy: CachePolicy,
+        call: Callable[[], Awaitable[Any]],
+    ) -> Tuple[Any, str]:
+        """Looks up the disk tier, then performs the call and caches an accepted result."""
+        entry = await self._disk_get(key)
+        if entry is not None:
+            self._stats["disk_hits"] += 1
+            self._memory_set(key, *entry)
+            return entry[1], CACHE_DISK_HIT
+
+        self._stats["misses"] += 1
+        result = await call()
+        if policy.accepts(result):
+            expires = time.time() + policy.ttl
+            self._memory_set(key, expires, result)
+            self._stats["stores"] += 1
+            await self._disk_set(key, tool_name, expires, result)
+        else:
+            self._stats["rejected"] += 1
+        return result, CACHE_MISS
+
+    def _forget(self, key: str, inflight: _Inflight):
+        if self._inflight.get(key) is inflight:
+            del self._inflight[key]
+        # Failures are never cached; mark them retrieved so an unawaited task does not warn
+        if inflight.task.done() and not inflight.task.cancelled():
+            inflight.task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "memory_entries": len(self._memory),
+            "disk": self._disk is not None,
+            "inflight": len(self._inflight),
+            **self._stats,
+        }
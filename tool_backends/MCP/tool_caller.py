@@ -1,9 +1,10 @@
 ## FastAPI request call tool
 
-import requests,json
+import json
 import time
 import os
 from typing import Dict, Any
+from http_session import get_http_session
 
 PORT = os.getenv('PORT', 30010)
 
@@ -20,7 +21,7 @@ def post_item_info(session_id:str, item:Dict[str, Any]):
         "session_id":session_id,
         "item":item
     }
-    resp = requests.post(
+    resp = get_http_session().post(
         f"{url}/put_item",
         headers=headers,
         json=payload
@@ -50,7 +51,7 @@ def call_tool(tool_name: str, tool_args: dict, session_id:str=None):
         # List all tools
         try:
             t1 = time.time()
-            resp = requests.get(f"{url}/get_tool")
+            resp = get_http_session().get(f"{url}/get_tool")
             result = resp.json()
             t2 = time.time()
             return {
@@ -63,7 +64,7 @@ def call_tool(tool_name: str, tool_args: dict, session_id:str=None):
     else:
         try:
             t1 = time.time()
-            resp = requests.post(
+            resp = get_http_session().post(
                 f"{url}/call_tool/{tool_name}",
                 json=tool_args
             )
@@ -83,7 +84,7 @@ def call_tool(tool_name: str, tool_args: dict, session_id:str=None):
 
 def code_tool(code:str, timeout=1800):
     try:
-        resp = requests.post(
+        resp = get_http_session().post(
             f"{url}/execute",
             json={"code":code, "timeout": timeout},
         )
@@ -8,9 +8,10 @@ import time
 import builtins
 import logging
 import traceback
+from uuid import uuid4
 from typing import Dict, Any, Optional, Tuple
 from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 
 
 # setting log
@@ -28,25 +29,96 @@ sys.path.append(temp_dir)
 from mcp_manager import MCPManager
 
 from io_manage import ThreadOutputManager
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from admission import AdmissionController, AdmissionRejected
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from MCP.utils import (
     CodeRequest,
     CodeResponse,
+    CodeBatchRequest,
+    CodeBatchResult,
+    CodeBatchResponse,
+    ToolCallsRequest,
+    ReloadToolsRequest,
+    ToolCallResult,
+    ToolCallsResponse,
     SandboxStreamRequest,
     SandboxStreamResponse,
     SessionInformHandler,
     CodeSubmitRequest,
     CodeSubmitResponse,
     SessionManager,
+    needs_session,
+    session_tool_args,
     post_item_info,
     form_item,
     create_lifespan,
 )
 
-executor = ThreadPoolExecutor(max_workers=1000)
+# Admission limits for sandbox code execution
+MAX_CONCURRENT_EXECUTIONS = int(os.getenv("MAX_CONCURRENT_EXECUTIONS", 256))
+MAX_EXECUTION_QUEUE = int(os.getenv("MAX_EXECUTION_QUEUE", 1024))
+MAX_EXECUTIONS_PER_SESSION = int(os.getenv("MAX_EXECUTIONS_PER_SESSION", 1))
+MAX_BATCH_SNIPPETS = int(os.getenv("MAX_BATCH_SNIPPETS", 64))
+# Default result-size cap (in characters) for the direct /call_tools path
+MAX_TOOL_RESULT_CHARS = int(os.getenv("MAX_TOOL_RESULT_CHARS", 200000))
+
+executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_EXECUTIONS)
+admission = AdmissionController(
+    max_in_flight=MAX_CONCURRENT_EXECUTIONS,
+    max_queue=MAX_EXECUTION_QUEUE,
+    per_session=MAX_EXECUTIONS_PER_SESSION,
+)
+# Idle interval after which an SSE keep-alive comment is sent
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", 15))
+
 output_manager = ThreadOutputManager()
 manager = MCPManager()
-session_manager = SessionManager(manager)
+session_manager = SessionManager(manager, spill_dir=temp_dir)
+
+EXECUTE_SECONDS = REGISTRY.histogram(
+    "tool_server_execute_seconds",
+    "Code execution latency by phase: queue (admission), compile, exec and total",
+    ["phase"],
+)
+EXECUTIONS = REGISTRY.counter(
+    "tool_server_executions_total", "Code executions by outcome", ["status"]
+)
+OUTPUT_BYTES = REGISTRY.counter(
+    "tool_server_output_bytes_total", "Bytes written to stdout by executed code"
+)
+OUTPUT_TRUNCATED = REGISTRY.counter(
+    "tool_server_output_truncated_total", "Executions whose output was truncated"
+)
+
+
+def collect_server_metrics():
+    """Scrape-time metrics for sessions, result streams and the executor."""
+    stream_depths = []
+    for module in list(session_manager.sessions.values()):
+        inform_handler = module.__dict__.get("inform_handler")
+        if inform_handler is not None:
+            stream_depths.append(len(inform_handler.result_stream))
+    stats = admission.stats()
+    return [
+        ("tool_server_active_sessions", "gauge", "Sessions with a live namespace",
+         [({}, len(stream_depths))]),
+        ("tool_server_stream_buffered_events", "gauge", "Events buffered in session result streams", [
+            ({"stat": "total"}, sum(stream_depths)),
+            ({"stat": "max"}, max(stream_depths, default=0)),
+        ]),
+        ("tool_server_executor_threads", "gauge",
+         "Executor threads busy, lingering (timed out but still running) and available", [
+            ({"state": "busy"}, stats["in_flight"]),
+            ({"state": "lingering"}, stats["lingering"]),
+            ({"state": "max"}, stats["max_in_flight"]),
+        ]),
+        ("tool_server_execution_queue_depth", "gauge", "Executions waiting for admission",
+         [({}, stats["queue_depth"])]),
+    ]
+
+
+REGISTRY.add_collector(collect_server_metrics)
 
 
 # Load agent tools configuration
@@ -72,52 +144,63 @@ app = FastAPI(lifespan=create_lifespan(manager, temp_dir))
 
 async def put_item_with_session_id(session_id: str, item: Dict[str, Any]) -> bool:
     """
-    Puts an item into the asynchronous queue associated with a specific session.
+    Publishes an item to the result stream associated with a specific session.
 
     Args:
         session_id: The unique identifier for the session.
-        item: The data item (e.g., tool result, code output) to be queued.
+        item: The data item (e.g., tool result, code output) to be published.
 
     Returns:
-        True if the item was successfully put into the queue, False otherwise.
+        True if the item was successfully published, False otherwise.
     """
     try:
         inform_handler: SessionInformHandler = session_manager.sessions[
             session_id
         ].__dict__["inform_handler"]
-        await inform_handler.async_inform_queue.put(item)
+        inform_handler.result_stream.publish(item)
         return True
     except KeyError:
         logger.error(f"Session ID {session_id} not found when attempting to put item.")
         return False
     except Exception as e:
-        logger.error(f"Failed to put item into session queue: {e}", exc_info=True)
+        logger.error(f"Failed to publish item to session stream: {e}", exc_info=True)
         return False
 
 
 def _execute_code_safely(
-    code: str, session_id: str, timeout: int
-) -> Tuple[float, Optional[str], Optional[str]]:
+    code: str, session_id: str, timeout: int, stream_output: bool = False
+) -> Tuple[float, Optional[str], Optional[str], Dict[str, Any], Optional[Future]]:
     """
     Safely executes Python code within a sandboxed environment in a worker thread.
 
     This function handles I/O redirection, limits access to file writing,
-    and manages execution timeout within the thread.
+    and manages execution timeout within the thread. Captured stdout is bounded
+    by MAX_OUTPUT_BYTES (head and tail are kept).
 
     Args:
         code: The Python code string to execute.
         session_id: The ID of the session context (for variable persistence).
         timeout: The maximum execution time in seconds.
+        stream_output: Whether to post stdout to the session stream as
+            'code_output' items while the code runs.
 
     Returns:
-        A tuple containing (execution_time, stdout_output, error_output).
+        A tuple containing (execution_time, stdout_output, error_output, output_stats,
+        pending), where output_stats holds 'output_bytes' and 'output_truncated' and
+        pending is the future of a timed-out execution that is still running in the
+        session's namespace (None otherwise).
     """
     logger.info(
         f"Executing in thread {threading.current_thread().ident}, process {os.getpid()} for session {session_id}"
     )
 
     module = session_manager.get_session(session_id)
-    capture = output_manager.get_capture()
+    on_chunk = None
+    if stream_output:
+        on_chunk = lambda chunk: post_item_info(
+            session_id, form_item("code_output", chunk, "running")
+        )
+    capture = output_manager.get_capture(on_chunk=on_chunk)
 
     # Define the sandboxed environment dictionary for execution
     sandbox_globals = {
@@ -139,13 +222,16 @@ def _execute_code_safely(
     }
 
     # Update module dictionary with sandbox globals, preserving existing tools
-    # This ensures tool functions injected by session manager are not overwritten
+    # This ensures tool functions injected by session manager are not overwritten.
+    # print and sys are always rebound, since every execution has its own capture.
     for key, value in sandbox_globals.items():
-        if key not in module.__dict__:  # Only add if not already present (preserve tools)
+        if key in ("print", "sys") or key not in module.__dict__:
             module.__dict__[key] = value
 
     error_value = None
     output_value = None
+    status = "ok"
+    pending = None
     start_time = time.time()
 
     # Use a single dedicated executor for the code execution within the worker thread
@@ -157,16 +243,24 @@ def _execute_code_safely(
         post_item_info(session_id, start_item)
 
         cleaned_code = code.replace('\u00a0', ' ').replace('\xa0', ' ')
-        
+
+        # Compile once and execute the code object, timing both phases
+        phase_start = time.time()
         try:
-            compile(cleaned_code, '<string>', 'exec')
+            code_object = compile(cleaned_code, '<string>', 'exec')
             print("Code compilation successful")
         except Exception as e:
             print(f"Code compilation error: {e}")
             raise
-        
-        # Execute the cleaned code string within the session module's dictionary
-        exec(cleaned_code, module.__dict__)
+        finally:
+            EXECUTE_SECONDS.observe(time.time() - phase_start, phase="compile")
+
+        # Execute the compiled code within the session module's dictionary
+        phase_start = time.time()
+        try:
+            exec(code_object, module.__dict__)
+        finally:
+            EXECUTE_SECONDS.observe(time.time() - phase_start, phase="exec")
 
         return capture.get_stdout(), capture.get_stderr()
 
@@ -176,10 +270,14 @@ def _execute_code_safely(
         output_value, error_value = future.result(timeout=timeout)
 
     except FutureTimeoutError:
+        status = "timeout"
         error_value = f"Execution timed out after {timeout} seconds"
+        # The sub-thread cannot be killed; the caller keeps the session busy until it ends
+        pending = future
         logger.warning(f"Code execution timeout: {timeout}s")
 
     except SystemExit as se:
+        status = "error"
         error_value = f"Code called sys.exit({se.code})"
         if capture.stderr:
             capture.stderr.write(error_value)
@@ -196,15 +294,37 @@ def _execute_code_safely(
             capture.stderr.write(error)
         logger.warning(f"Code execution error: {error}\n\n-----\n{code}")
         error_value = error
+        status = "error"
 
     finally:
         execution_time = time.time() - start_time
+        # Do not wait for a timed-out sub-thread; it is abandoned rather than joined
+        single_executor.shutdown(wait=False)
 
         # Ensure output is captured even if an error occurred
         output_value = (
             output_value if output_value is not None else capture.get_stdout()
         )
         error_value = error_value if error_value is not None else capture.get_stderr()
+        # Send whatever streamed output is still pending before the final result
+        try:
+            capture.flush()
+        except Exception as e:
+            logger.warning(f"Failed to flush streamed output: {e}")
+        output_manager.record(capture)
+        EXECUTIONS.inc(status=status)
+        OUTPUT_BYTES.inc(capture.total_bytes)
+        if capture.truncated:
+            OUTPUT_TRUNCATED.inc()
+        output_stats = {
+            "output_bytes": capture.total_bytes,
+            "output_truncated": capture.truncated,
+        }
+        if capture.truncated:
+            logger.info(
+                f"Output of session {session_id} truncated: "
+                f"{capture.dropped_bytes} of {capture.total_bytes} bytes dropped"
+            )
 
         # Post results back to the session stream
         code_result_content = output_value if not error_value else error_value
@@ -219,45 +339,89 @@ def _execute_code_safely(
         )
 
     # Return output and error without the execution time from this inner thread
-    return execution_time, output_value, error_value if error_value else None
+    return (
+        execution_time,
+        output_value,
+        error_value if error_value else None,
+        output_stats,
+        pending,
+    )
 
 
 async def execute_python_code(
-    code: str, session_id: str, timeout: int
-) -> Tuple[str, Optional[str], float]:
+    code: str, session_id: str, timeout: int, stream_output: bool = False
+) -> Tuple[str, Optional[str], float, float, Dict[str, Any]]:
     """
     Asynchronously executes Python code by submitting the task to the shared ThreadPoolExecutor.
 
+    The execution first passes through the admission controller, which bounds the
+    number of concurrent executions globally and per session, and rejects the call
+    when the wait queue is full. A timed-out execution returns at once, but its
+    session stays busy until the abandoned thread finishes, so the next execution
+    of that session cannot run in the same namespace concurrently.
+
     Args:
         code: The Python code string to execute.
         session_id: The ID of the session context.
         timeout: The maximum execution time in seconds.
+        stream_output: Whether to stream stdout to the session while the code runs.
+
+    Raises:
+        AdmissionRejected: If the execution wait queue is full.
 
     Returns:
-        A tuple containing (stdout_output, error_output, total_execution_time).
+        A tuple containing (stdout_output, error_output, total_execution_time,
+        queue_time, output_stats).
     """
-    loop = asyncio.get_event_loop()
+    loop = asyncio.get_running_loop()
     start_time = loop.time()
 
-    # Use a semaphore to limit the total number of concurrent code execution tasks
-    execution_semaphore = asyncio.Semaphore(2000)
-
-    async with execution_semaphore:
-        try:
-            # Run the synchronous, blocking code execution function in the thread pool
-            execution_time, output, error = await loop.run_in_executor(
-                executor, _execute_code_safely, code, session_id, timeout
-            )
-        except Exception as e:
-            error = f"Execution failed in executor: {str(e)}"
-            output = ""
-            logger.error(f"Unexpected executor error: {error}", exc_info=True)
-            execution_time = loop.time() - start_time
+    try:
+        async with admission.admit(session_id) as admitted:
+            queue_time = admitted.wait_time
+            EXECUTE_SECONDS.observe(queue_time, phase="queue")
+            try:
+                # Run the synchronous, blocking code execution function in the thread pool
+                execution_time, output, error, output_stats, pending = (
+                    await loop.run_in_executor(
+                        executor, _execute_code_safely, code, session_id, timeout, stream_output
+                    )
+                )
+                if pending is not None:
+                    admitted.hold_session_until(asyncio.wrap_future(pending))
+            except Exception as e:
+                error = f"Execution failed in executor: {str(e)}"
+                output = ""
+                output_stats = {}
+                logger.error(f"Unexpected executor error: {error}", exc_info=True)
+                execution_time = loop.time() - start_time
+    except AdmissionRejected:
+        EXECUTIONS.inc(status="rejected")
+        raise
 
     total_exec_time = loop.time() - start_time
+    EXECUTE_SECONDS.observe(total_exec_time, phase="total")
     # Note: The `execution_time` returned by `_execute_code_safely` is only the thread's wall time.
-    # We use the time measured in the async context for total time.
-    return output, error, total_exec_time
+    # We use the time measured in the async context for total time, which includes queueing.
+    return output, error, total_exec_time, queue_time, output_stats
+
+
+async def _run_submitted_code(
+    code: str, session_id: str, timeout: int, stream_output: bool = False
+):
+    """
+    Background task for /submit. If the execution is rejected by the admission
+    controller after the response was sent, the rejection is reported through the
+    session stream so that stream consumers are not left waiting.
+    """
+    try:
+        await execute_python_code(code, session_id, timeout, stream_output)
+    except AdmissionRejected as e:
+        logger.warning(f"Submitted code for session {session_id} rejected: {e}")
+        await put_item_with_session_id(
+            session_id, form_item("code_result", f"Execution rejected: {e}", "running")
+        )
+        await put_item_with_session_id(session_id, form_item("tool_result", "", "end"))
 
 
 def restricted_open(*args, **kwargs):
@@ -275,8 +439,79 @@ def restricted_open(*args, **kwargs):
 
 @app.get("/health")
 async def health():
-    """Returns a simple status check for the service."""
-    return {"status": "ok"}
+    """
+    Readiness check for the service. Returns 503 with status "starting" while
+    some MCP server has not finished its first connection attempt, so proxies
+    do not route sessions to a worker without tools; "ok" afterwards.
+    """
+    servers = manager.server_status()
+    counts = {}
+    for server in servers:
+        counts[server["status"]] = counts.get(server["status"], 0) + 1
+    if manager.is_starting():
+        return JSONResponse(
+            status_code=503,
+            content={"status": "starting", "servers": counts},
+            headers={"Retry-After": "5"},
+        )
+    return {"status": "ok", "servers": counts}
+
+
+@app.get("/stats")
+async def stats():
+    """
+    Runtime statistics of this worker:
+
+    - admission: queue depth, concurrency and wait times of code executions
+    - output: bytes captured and truncated executions
+    - tool_cache: hits per tier, misses and coalesced calls
+    - rate_limits: waits, rejections and in-flight calls per limit
+    """
+    return {
+        "admission": admission.stats(),
+        "output": output_manager.stats(),
+        "tool_cache": manager.cache.stats(),
+        "rate_limits": manager.limiter.stats(),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Returns Prometheus metrics: execution latency by phase, tool call latency and
+    outcomes, rate limiter waits, cache hits, sessions, stream depths and executor use.
+    """
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/servers")
+async def get_servers():
+    """
+    Returns the connection state of every MCP server. Servers connect in the
+    background, so tools only appear in /get_tool once their server is ready.
+    """
+    return manager.server_status()
+
+
+@app.post("/reload_tools")
+async def reload_tools(request: ReloadToolsRequest = ReloadToolsRequest()):
+    """
+    Refreshes the tool registry without restarting the server.
+
+    Tool lists are fetched again from every connected server and, unless disabled,
+    the server list is re-read. The new registry is swapped in atomically: new
+    sessions get the new tool wrappers, and existing sessions are rebound to
+    them before their next execution.
+    """
+    try:
+        diff = await manager.refresh_tools(
+            reload_config=request.reload_config, restart=request.restart
+        )
+    except Exception as e:
+        logger.error(f"Failed to reload tools: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to reload tools: {e}")
+    logger.info(f"Tool registry reloaded: {diff}")
+    return diff
 
 
 @app.get("/get_tool")
@@ -372,8 +607,13 @@ async def stream_put_item(request: Request):
 @app.get("/get_mcp_result/{session_id}")
 async def get_mcp_result(session_id: str, request: Request):
     """
-    Establishes a StreamingResponse (Server-Sent Events style) to stream
-    results from the session's asynchronous queue back to the client.
+    Streams results from the session's result stream back to the client.
+
+    Clients sending ``Accept: text/event-stream`` (or ``?format=sse``) get
+    Server-Sent Events with event ids and can resume after a disconnect by sending
+    ``Last-Event-ID`` (or ``?last_event_id=``). Other clients get newline-delimited
+    JSON continuing from the last item delivered on this session. The stream
+    closes after the main-stream 'end' item.
     """
     try:
         inform_handler: SessionInformHandler = session_manager.sessions[
@@ -386,31 +626,120 @@ async def get_mcp_result(session_id: str, request: Request):
     except Exception:
         raise HTTPException(status_code=500, detail="Error retrieving session handler.")
 
-    async def event_generator():
-        """Generator function to yield queued items."""
-        while True:
-            try:
-                # Wait for the next item in the queue
-                item = await inform_handler.async_inform_queue.get()
+    stream = inform_handler.result_stream
+    use_sse = (
+        "text/event-stream" in request.headers.get("accept", "")
+        or request.query_params.get("format") == "sse"
+    )
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get(
+        "last_event_id"
+    )
+    try:
+        after_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be an integer")
 
-                # Yield the item as a JSON string followed by a newline separator
-                yield json.dumps(item) + "\n"
+    async def event_generator():
+        """Generator function to yield buffered items, coalescing each batch into one write."""
+        try:
+            async for batch in stream.read(
+                after_id, heartbeat=SSE_HEARTBEAT_INTERVAL if use_sse else None
+            ):
+                if not batch:
+                    # Keep idle SSE connections alive through proxies
+                    yield ": keep-alive\n\n"
+                    continue
 
-                # Check for the 'end' signal to close the stream
-                if (not item.get("sub_stream_type")) and (
-                    item.get("stream_state") == "end"
-                ):
+                frames = []
+                last_sent = None
+                finished = False
+                for event_id, data, is_end in batch:
+                    if use_sse:
+                        frames.append(f"id: {event_id}\ndata: {data}\n\n")
+                    else:
+                        frames.append(data + "\n")
+                    last_sent = event_id
+                    if is_end:
+                        finished = True
+                        break
+
+                yield "".join(frames)
+                stream.cursor = max(stream.cursor, last_sent)
+
+                # Close the stream after the 'end' signal
+                if finished:
                     break
 
-            except asyncio.CancelledError:
-                # The client closed the connection
-                logger.info(f"Stream cancelled by client for session {session_id}")
-                break
-            except Exception as e:
-                logger.error(f"Error yielding item for session {session_id}: {e}")
-                break  # Exit the loop on unexpected error
+        except asyncio.CancelledError:
+            # The client closed the connection
+            logger.info(f"Stream cancelled by client for session {session_id}")
+            raise
+        except Exception as e:
+            logger.error(f"Error yielding item for session {session_id}: {e}")
+
+    media_type = "text/event-stream" if use_sse else "application/json"
+    return StreamingResponse(
+        event_generator(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    return StreamingResponse(event_generator(), media_type="application/json")
+
+async def invoke_tool(tool_name: str, tool_args: Dict[str, Any]) -> Tuple[bool, Any]:
+    """
+    Calls a registered tool through the MCPManager and normalizes its result.
+
+    Args:
+        tool_name: The sanitized name of the tool.
+        tool_args: The arguments for the tool call.
+
+    Returns:
+        A tuple (status, result). On success the result is the first item of the
+        tool's result list, with JSON strings parsed; on failure it is the error message.
+    """
+    try:
+        raw_results = await manager.call_tool(tool_name, tool_args)
+    except Exception as e:
+        error_msg = f"Error: {str(e)}\n\n{traceback.format_exc()}\n\ntool name: {tool_name}\n\ntool args: {tool_args}"
+        logger.error(error_msg)
+        return False, error_msg
+
+    # Attempt to parse results that might be JSON strings
+    final_result = []
+    for item in raw_results:
+        try:
+            final_result.append(json.loads(item))
+        except Exception:
+            final_result.append(item)
+
+    # The original code returns only the first item of the result list,
+    # maintaining that behavior:
+    return True, final_result[0] if final_result else final_result
+
+
+def cap_tool_result(result: Any, max_chars: int, truncate: bool) -> Tuple[Any, int, bool]:
+    """
+    Applies the result-size cap of the direct tool-call path.
+
+    Args:
+        result: The tool result.
+        max_chars: Maximum size of the result in characters (as text or JSON).
+        truncate: Whether to truncate oversized results instead of rejecting them.
+
+    Raises:
+        ValueError: If the result is too large and truncation is disabled.
+
+    Returns:
+        A tuple (result, size_in_chars, truncated). Truncated results are returned
+        as text ending with a truncation marker.
+    """
+    text = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False, default=str)
+    size = len(text)
+    if size <= max_chars:
+        return result, size, False
+    if not truncate:
+        raise ValueError(f"Tool result too large: {size} > {max_chars} characters")
+    return text[:max_chars] + f"\n... [truncated {size - max_chars} characters]", size, True
 
 
 @app.post("/call_tool/{tool_name}")
@@ -420,36 +749,93 @@ async def create_tool_task(tool_name: str, tool_args: Dict[str, Any]):
     """
     logger.info(f"Calling tool: {tool_name} with args: {tool_args}")
 
-    if tool_name not in manager.get_toolnames():
+    availability = manager.tool_state(tool_name)
+    if availability == "unknown":
         raise HTTPException(404, detail=f"Tool '{tool_name}' not found")
+    if availability == "unavailable":
+        # The tool's server is still starting or reconnecting
+        raise HTTPException(
+            503,
+            detail=f"Tool '{tool_name}' is temporarily unavailable",
+            headers={"Retry-After": "5"},
+        )
 
-    result = None
-    status = False
+    status, result = await invoke_tool(tool_name, tool_args)
+    return {"status": status, "result": result}
 
-    try:
-        raw_results = await manager.call_tool(tool_name, tool_args)
-        status = True
 
-        # Attempt to parse results that might be JSON strings
-        final_result = []
-        for item in raw_results:
-            try:
-                final_result.append(json.loads(item))
-            except Exception:
-                final_result.append(item)
-        result = final_result
+@app.post("/call_tools", response_model=ToolCallsResponse)
+async def call_tools_handler(request: ToolCallsRequest):
+    """
+    Direct tool-call fast path: calls tools from structured (tool_name, args)
+    pairs concurrently and returns structured results in request order, without
+    generating, compiling or executing any Python code.
 
-    except Exception as e:
-        error_msg = f"Error: {str(e)}\n\n{traceback.format_exc()}\n\ntool name: {tool_name}\n\ntool args: {tool_args}"
-        logger.error(error_msg)
-        result = error_msg
-        status = False
+    Agent tools get the same 'stream_id' / 'session_id' argument as in the
+    sandbox: the request's session, or a temporary session cleared afterwards.
+    """
+    if not request.calls:
+        raise HTTPException(status_code=400, detail="Calls cannot be empty")
+
+    loop = asyncio.get_running_loop()
+    batch_start = loop.time()
+    max_chars = request.max_result_chars or MAX_TOOL_RESULT_CHARS
+
+    session_id = request.session_id
+    temporary_session = None
+    if any(needs_session(call.tool_name) for call in request.calls):
+        if not session_id:
+            session_id = temporary_session = f"call_{uuid4()}"
+        # Agent tools publish to the session's result stream, so it must exist
+        session_manager.get_session(session_id)
+
+    async def run_call(index: int, call) -> ToolCallResult:
+        start_time = loop.time()
+        availability = manager.tool_state(call.tool_name)
+        if availability != "ready":
+            error = (
+                f"Tool '{call.tool_name}' not found"
+                if availability == "unknown"
+                else f"Tool '{call.tool_name}' is temporarily unavailable"
+            )
+            return ToolCallResult(
+                index=index, tool_name=call.tool_name, status=False, error=error,
+            )
 
-    # The original code returns only the first item of the result list,
-    # maintaining that behavior:
-    final_response_result = result[0] if isinstance(result, list) and result else result
+        tool_args = session_tool_args(call.tool_name, call.args, session_id)
+        status, result = await invoke_tool(call.tool_name, tool_args)
+        elapsed = loop.time() - start_time
+        if not status:
+            return ToolCallResult(
+                index=index, tool_name=call.tool_name, status=False,
+                error=result, elapsed=elapsed,
+            )
+        try:
+            result, size, truncated = cap_tool_result(result, max_chars, request.truncate)
+        except ValueError as e:
+            return ToolCallResult(
+                index=index, tool_name=call.tool_name, status=False,
+                error=str(e), elapsed=elapsed,
+            )
+        return ToolCallResult(
+            index=index,
+            tool_name=call.tool_name,
+            status=True,
+            result=result,
+            elapsed=elapsed,
+            result_chars=size,
+            truncated=truncated,
+        )
 
-    return {"status": status, "result": final_response_result}
+    logger.info(f"Calling {len(request.calls)} tools directly: {[c.tool_name for c in request.calls]}")
+    try:
+        results = await asyncio.gather(
+            *(run_call(i, call) for i, call in enumerate(request.calls))
+        )
+    finally:
+        if temporary_session is not None:
+            session_manager.clear_session(temporary_session)
+    return ToolCallsResponse(results=list(results), total_time=loop.time() - batch_start)
 
 
 @app.post("/execute", response_model=CodeResponse)
@@ -466,21 +852,28 @@ async def execute_code_handler(request: CodeRequest):
     )
 
     try:
-        output, error, exec_time = await execute_python_code(
+        output, error, exec_time, queue_time, output_stats = await execute_python_code(
             request.code, request.session_id, request.timeout
         )
 
         logger.info(
-            f"Code execution completed in {exec_time:.2f}s. " f"Error: {bool(error)}"
+            f"Code execution completed in {exec_time:.2f}s "
+            f"(queued {queue_time:.2f}s). Error: {bool(error)}"
         )
 
         return CodeResponse(
             output=output,
             error=error,
             execution_time=exec_time,
+            queue_time=queue_time,
             session_id=request.session_id,
+            **output_stats,
         )
 
+    except AdmissionRejected as e:
+        logger.warning(f"Rejected /execute for session {request.session_id}: {e}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
     except Exception as e:
         logger.error(
             f"Unexpected server error during /execute: {str(e)}", exc_info=True
@@ -488,6 +881,73 @@ async def execute_code_handler(request: CodeRequest):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@app.post("/execute_batch", response_model=CodeBatchResponse)
+async def execute_batch_handler(request: CodeBatchRequest):
+    """
+    Executes several independent snippets concurrently under the admission
+    controller and returns their results in request order in one response.
+
+    Snippets sharing a session run one after another in request order; a
+    snippet that fails or is rejected only affects its own result.
+    """
+    if not request.snippets:
+        raise HTTPException(status_code=400, detail="Snippets cannot be empty")
+    if len(request.snippets) > MAX_BATCH_SNIPPETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many snippets: {len(request.snippets)} > {MAX_BATCH_SNIPPETS}",
+        )
+
+    loop = asyncio.get_running_loop()
+    batch_start = loop.time()
+    temporary_sessions = set()
+
+    async def run_snippet(index: int, snippet) -> CodeBatchResult:
+        session_id = snippet.session_id or request.session_id
+        if not session_id:
+            session_id = f"batch_{uuid4()}"
+            temporary_sessions.add(session_id)
+        timeout = snippet.timeout or request.timeout
+
+        if not snippet.code.strip():
+            return CodeBatchResult(
+                index=index, output="", error="Code cannot be empty",
+                execution_time=0.0, session_id=session_id,
+            )
+
+        start_time = loop.time()
+        try:
+            output, error, exec_time, queue_time, output_stats = await execute_python_code(
+                snippet.code, session_id, timeout
+            )
+        except AdmissionRejected as e:
+            output, error, queue_time = "", f"Execution rejected: {e}", 0.0
+            exec_time = loop.time() - start_time
+            output_stats = {}
+        return CodeBatchResult(
+            index=index,
+            output=output,
+            error=error,
+            execution_time=exec_time,
+            queue_time=queue_time,
+            session_id=session_id,
+            **output_stats,
+        )
+
+    logger.info(f"Executing batch of {len(request.snippets)} snippets")
+    try:
+        results = await asyncio.gather(
+            *(run_snippet(i, snippet) for i, snippet in enumerate(request.snippets))
+        )
+    finally:
+        for session_id in temporary_sessions:
+            session_manager.clear_session(session_id)
+
+    total_time = loop.time() - batch_start
+    logger.info(f"Batch of {len(results)} snippets completed in {total_time:.2f}s")
+    return CodeBatchResponse(results=list(results), total_time=total_time)
+
+
 @app.post("/submit", response_model=CodeSubmitResponse)
 async def submit_code_handler(
     request: CodeSubmitRequest, background_tasks: BackgroundTasks
@@ -503,10 +963,21 @@ async def submit_code_handler(
         f"Submitting code for background execution (timeout: {request.timeout}s) for session: {request.session_id}"
     )
 
+    if not admission.has_capacity():
+        raise HTTPException(
+            status_code=429,
+            detail="Execution queue is full, please retry later",
+            headers={"Retry-After": "1"},
+        )
+
     try:
         # Add the code execution task to be run in the background
         background_tasks.add_task(
-            execute_python_code, request.code, request.session_id, request.timeout
+            _run_submitted_code,
+            request.code,
+            request.session_id,
+            request.timeout,
+            request.stream_output,
         )
         logger.info(f"Task submitted to background tasks.")
         return CodeSubmitResponse(status="success", session_id=request.session_id)
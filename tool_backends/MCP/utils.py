@@ -1,10 +1,13 @@
 import os
 import asyncio
-import requests
+import threading
 
 from pydantic import BaseModel
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List
 from mcp_manager import MCPManager
+from http_session import get_http_session
+from cluster import registration_loop, deregister
+from session_stream import SessionStream
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from pyext import RuntimeModule, _RuntimeModule
@@ -33,14 +36,21 @@ class CodeResponse(BaseModel):
 
     :ivar output: The standard output (stdout) from the code execution.
     :ivar error: Optional error message if an exception occurred.
-    :ivar execution_time: The time taken for code execution in seconds.
+    :ivar execution_time: The time taken for code execution in seconds, including queueing.
+    :ivar queue_time: The time spent waiting for admission in seconds.
     :ivar session_id: Identifier for the current session.
+    :ivar output_bytes: Total bytes written to stdout, including any truncated part.
+    :ivar output_truncated: Whether the middle of the output was dropped to stay
+                            within MAX_OUTPUT_BYTES.
     """
 
     output: str
     error: Optional[str]
     execution_time: float
+    queue_time: float = 0.0
     session_id: str
+    output_bytes: int = 0
+    output_truncated: bool = False
 
 
 class CodeSubmitRequest(BaseModel):
@@ -50,11 +60,14 @@ class CodeSubmitRequest(BaseModel):
     :ivar code: The Python code string to be submitted.
     :ivar timeout: Optional execution timeout in seconds (default is 180).
     :ivar session_id: Identifier for the current session (default is "test_id").
+    :ivar stream_output: Whether stdout is streamed to the session as 'code_output'
+                         items while the code runs (default is False).
     """
 
     code: str
     timeout: Optional[int] = 180
     session_id: str = "test_id"
+    stream_output: bool = False
 
 
 class CodeSubmitResponse(BaseModel):
@@ -69,6 +82,151 @@ class CodeSubmitResponse(BaseModel):
     session_id: str
 
 
+class ReloadToolsRequest(BaseModel):
+    """
+    Represents a request body for reloading the tool registry.
+
+    :ivar reload_config: Whether to re-read config/server_list.json and connect
+                         added servers / disconnect removed ones (default is True).
+    :ivar restart: Whether to reopen every server connection, one replica at a
+                   time, e.g. after upgrading a stdio server (default is False).
+    """
+
+    reload_config: bool = True
+    restart: bool = False
+
+
+class CodeBatchItem(BaseModel):
+    """
+    Represents one snippet of a batched code execution request.
+
+    :ivar code: The Python code string to be executed.
+    :ivar session_id: Optional session for this snippet; overrides the batch-level session.
+    :ivar timeout: Optional execution timeout in seconds; overrides the batch-level timeout.
+    """
+
+    code: str
+    session_id: Optional[str] = None
+    timeout: Optional[int] = None
+
+
+class CodeBatchRequest(BaseModel):
+    """
+    Represents a request body for executing several independent snippets at once.
+
+    :ivar snippets: The snippets to execute.
+    :ivar timeout: Default execution timeout in seconds for each snippet (default is 180).
+    :ivar session_id: Default session for snippets without their own. Snippets with
+                      neither run in a temporary session that is cleared afterwards.
+    """
+
+    snippets: List[CodeBatchItem]
+    timeout: Optional[int] = 180
+    session_id: Optional[str] = None
+
+
+class CodeBatchResult(BaseModel):
+    """
+    Represents the result of one snippet of a batched execution.
+
+    :ivar index: Position of the snippet in the request.
+    :ivar output: The standard output (stdout) from the code execution.
+    :ivar error: Optional error message if the snippet failed or was rejected.
+    :ivar execution_time: The time taken for the snippet in seconds, including queueing.
+    :ivar queue_time: The time spent waiting for admission in seconds.
+    :ivar session_id: The session the snippet ran in.
+    :ivar output_bytes: Total bytes written to stdout, including any truncated part.
+    :ivar output_truncated: Whether the middle of the output was dropped.
+    """
+
+    index: int
+    output: str
+    error: Optional[str]
+    execution_time: float
+    queue_time: float = 0.0
+    session_id: str
+    output_bytes: int = 0
+    output_truncated: bool = False
+
+
+class CodeBatchResponse(BaseModel):
+    """
+    Represents the response body of a batched execution, with results in request order.
+
+    :ivar results: One result per snippet, in the order of the request.
+    :ivar total_time: Wall time of the whole batch in seconds.
+    """
+
+    results: List[CodeBatchResult]
+    total_time: float
+
+
+class ToolCall(BaseModel):
+    """
+    Represents one structured tool call.
+
+    :ivar tool_name: The sanitized name of the tool to call.
+    :ivar args: The arguments for the tool call.
+    """
+
+    tool_name: str
+    args: Dict[str, Any] = {}
+
+
+class ToolCallsRequest(BaseModel):
+    """
+    Represents a request body for the direct tool-call path.
+
+    :ivar calls: The tool calls to run concurrently.
+    :ivar session_id: Optional session passed to tools that take one (agent tools).
+                      Without it, such calls run in a temporary session that is
+                      cleared afterwards, as snippets of /execute_batch do.
+    :ivar max_result_chars: Optional per-result size cap in characters; defaults to the server's cap.
+    :ivar truncate: Truncate oversized results (default) instead of returning an error.
+    """
+
+    calls: List[ToolCall]
+    session_id: Optional[str] = None
+    max_result_chars: Optional[int] = None
+    truncate: bool = True
+
+
+class ToolCallResult(BaseModel):
+    """
+    Represents the result of one direct tool call.
+
+    :ivar index: Position of the call in the request.
+    :ivar tool_name: The name of the called tool.
+    :ivar status: True if the tool call succeeded.
+    :ivar result: The structured tool result (text if it was truncated).
+    :ivar error: Error message if the call failed.
+    :ivar elapsed: Time taken by the tool call in seconds.
+    :ivar result_chars: Size of the full result in characters.
+    :ivar truncated: Whether the result was truncated to the size cap.
+    """
+
+    index: int
+    tool_name: str
+    status: bool
+    result: Any = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    result_chars: int = 0
+    truncated: bool = False
+
+
+class ToolCallsResponse(BaseModel):
+    """
+    Represents the response body of the direct tool-call path, with results in request order.
+
+    :ivar results: One result per call, in the order of the request.
+    :ivar total_time: Wall time of all calls in seconds.
+    """
+
+    results: List[ToolCallResult]
+    total_time: float
+
+
 class SandboxStreamRequest(BaseModel):
     """
     Represents a request for streaming data related to a sandbox session.
@@ -96,7 +254,8 @@ class SandboxStreamResponse(BaseModel):
 def create_lifespan(manager: MCPManager, temp_dir: str):
     """
     Creates an async context manager for the FastAPI application lifespan.
-    It handles startup (e.g., manager readiness) and shutdown (e.g., client cleanup).
+    It handles startup (e.g., manager readiness, registration with the proxy) and
+    shutdown (e.g., deregistration, client cleanup).
 
     :param manager: The MCPManager instance to handle client connections.
     :param temp_dir: A temporary directory path (though not used in the function body,
@@ -107,11 +266,15 @@ def create_lifespan(manager: MCPManager, temp_dir: str):
     @asynccontextmanager
     async def lifespan(app: FastAPI):
         print("Lifespan startup")
-        await manager.ready()
+        # Connect MCP servers in the background; tools appear as their servers get ready
+        manager.start()
+        # Announce this worker to the proxy when running in cluster mode
+        registration_task = asyncio.create_task(registration_loop(int(PORT)))
         yield
         print("Lifespan shutdown")
-        for client in manager.client_list:
-            await client.cleanup()
+        registration_task.cancel()
+        await deregister(int(PORT))
+        await manager.close()
 
     return lifespan
 
@@ -120,7 +283,34 @@ agent_tools = ["browse_master", "info_master", "intern_s1"]
 browse_comp_tools = ["batch_search_and_filter"]
 
 
-def build_tools_functions(manager: MCPManager) -> str:
+def session_tool_args(
+    tool_name: str, tool_args: Dict[str, Any], session_id: str
+) -> Dict[str, Any]:
+    """
+    Adds the session argument that agent tools expect, the same way the sandbox
+    tool wrappers built by build_tools_functions do: 'stream_id' for agent_tools
+    and 'session_id' for browse_comp_tools. Other tools' arguments are unchanged.
+
+    :param tool_name: The name of the tool.
+    :param tool_args: The arguments for the tool call.
+    :param session_id: The session whose result stream the tool reports to.
+    :return: The arguments to call the tool with.
+    """
+    if tool_name in browse_comp_tools:
+        return {**tool_args, "session_id": session_id}
+    if tool_name in agent_tools:
+        return {**tool_args, "stream_id": session_id}
+    return tool_args
+
+
+def needs_session(tool_name: str) -> bool:
+    """Returns True for tools that report to a session's result stream."""
+    return tool_name in agent_tools or tool_name in browse_comp_tools
+
+
+def build_tools_functions(
+    manager: MCPManager, tools: Optional[List[Dict[str, Any]]] = None
+) -> str:
     """
     Generates a Python code string containing wrapper functions for all tools
     managed by the MCPManager. These wrappers handle argument parsing,
@@ -128,6 +318,7 @@ def build_tools_functions(manager: MCPManager) -> str:
     tool via 'call_tool'.
 
     :param manager: The MCPManager instance containing tool definitions.
+    :param tools: The tool descriptions to wrap; defaults to the manager's current tools.
     :return: A string of Python code defining the tool wrapper functions.
     """
     initial = """import sys, os
@@ -135,7 +326,7 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(os.path.dirname(current_dir)))
 from tool_caller import call_tool\n"""
     code = ""
-    for tool in manager.get_tools():
+    for tool in (manager.get_tools() if tools is None else tools):
         schema = tool.get("input_schema")
         arg = ""
         arg_dict = "    tool_args = {"
@@ -201,7 +392,7 @@ def post_item_info(session_id: str, item: Dict[str, Any]) -> Dict[str, Any]:
     url = f"http://127.0.0.1:{PORT}"
     headers = {"Content-Type": "application/json"}
     payload = {"session_id": session_id, "item": item}
-    resp = requests.post(f"{url}/put_item", headers=headers, json=payload)
+    resp = get_http_session().post(f"{url}/put_item", headers=headers, json=payload)
     response = resp.json()
 
     return response
@@ -213,16 +404,18 @@ class SessionInformHandler:
     from the sandbox environment back to the main server.
 
     :ivar session_id: The identifier for the current session.
-    :ivar async_inform_queue: An asyncio.Queue for potentially asynchronous
-                              information handling (though currently unused in methods).
+    :ivar result_stream: The bounded, replayable SessionStream that items posted
+                         for this session are published to.
     """
 
-    def __init__(self, session_id: str):
+    def __init__(self, session_id: str, spill_dir: Optional[str] = None):
         """
         Initializes the SessionInformHandler with a specific session ID.
+
+        :param spill_dir: Directory where large stream items are written to disk.
         """
         self.session_id = session_id
-        self.async_inform_queue = asyncio.Queue()
+        self.result_stream = SessionStream(session_id, spill_dir=spill_dir)
 
     def post_tool_start(
         self,
@@ -262,16 +455,25 @@ class SessionManager:
     can execute code in an isolated, repeatable environment with access
     to dynamically built tool functions.
 
+    The tool wrapper library is compiled once per tool registry version and
+    shared by all sessions. When the registry version has advanced since a
+    session was bound (e.g. servers finished connecting, or tools were reloaded),
+    the session is rebound to the current library before its next execution.
+
     :ivar sessions: A dictionary mapping session IDs to their RuntimeModule instances.
     :ivar mcp_manager: The MCPManager instance used to retrieve tool information.
+    :ivar spill_dir: Directory where large result stream items are written to disk.
     """
 
-    def __init__(self, mcp_manager: MCPManager):
+    def __init__(self, mcp_manager: MCPManager, spill_dir: Optional[str] = None):
         """
         Initializes the SessionManager.
         """
         self.sessions: Dict[str, _RuntimeModule] = {}
         self.mcp_manager = mcp_manager
+        self.spill_dir = spill_dir
+        self._lib: Optional[Tuple[int, Any, List[str]]] = None
+        self._lib_lock = threading.Lock()
 
     def build_lib(self) -> str:
         """
@@ -281,30 +483,90 @@ class SessionManager:
         """
         return build_tools_functions(self.mcp_manager)
 
+    def get_lib(self) -> Tuple[int, Any, List[str]]:
+        """
+        Returns the compiled tool wrapper library for the current tool registry,
+        compiling it only when the registry version has changed.
+
+        :return: A tuple (registry_version, compiled library code object, tool names).
+        """
+        version, tools = self.mcp_manager.registry
+        lib = self._lib
+        if lib is not None and lib[0] == version:
+            return lib
+        with self._lib_lock:
+            if self._lib is None or self._lib[0] != version:
+                code_string = build_tools_functions(self.mcp_manager, tools)
+                self._lib = (
+                    version,
+                    compile(code_string, "<tool_lib>", "exec"),
+                    [tool["name"] for tool in tools],
+                )
+            return self._lib
+
+    def _bind_tools(self, module: _RuntimeModule):
+        """
+        Binds the current tool wrappers into a session module, if the registry
+        version changed since the module was last bound.
+
+        Wrappers are built in a scratch namespace and copied in, so names the
+        session's own code rebound (e.g. a variable named like a tool) are kept.
+        Wrappers of tools that no longer exist are removed.
+
+        :param module: The session's RuntimeModule.
+        """
+        version, tool_lib, tool_names = self.get_lib()
+        namespace = module.__dict__
+        if namespace.get("__tool_version__") == version:
+            return
+
+        scratch = {
+            key: namespace[key]
+            for key in ("__name__", "__file__", "__builtins__", "inform_handler")
+            if key in namespace
+        }
+        exec(tool_lib, scratch)
+
+        previous = namespace.get("__tool_wrappers__", {})
+        for name, wrapper in previous.items():
+            if name not in tool_names and namespace.get(name) is wrapper:
+                del namespace[name]
+        wrappers = {}
+        for name in tool_names:
+            # A name defined by the session's own code keeps its value
+            if name not in namespace or (name in previous and namespace[name] is previous[name]):
+                namespace[name] = scratch[name]
+                wrappers[name] = scratch[name]
+        # Helpers the library defines for the session's code
+        for name in ("sys", "os", "current_dir", "call_tool"):
+            namespace.setdefault(name, scratch[name])
+        namespace["__tool_wrappers__"] = wrappers
+        namespace["__tool_version__"] = version
+
     def get_session(self, session_id: str) -> _RuntimeModule:
         """
         Retrieves an existing session's RuntimeModule or creates a new one
         if the session ID is not found. The new module is initialized with
-        the tool functions and a SessionInformHandler.
+        the tool functions and a SessionInformHandler. An existing module is
+        rebound to the current tool wrappers if the tool registry changed.
 
         :param session_id: The ID of the session to retrieve or create.
         :return: The pyext._RuntimeModule instance for the session.
         """
-        if session_id not in self.sessions:
+        module = self.sessions.get(session_id)
+        if module is None:
             # Use pyext.RuntimeModule to create a repeatable execution module
-            code_string = self.build_lib()
-            # print(code_string)
-            self.sessions[session_id] = RuntimeModule.from_string(
-                f"session_{session_id}", "", ""
-            )
-            
+            module = RuntimeModule.from_string(f"session_{session_id}", "", "")
+
             # First add the inform_handler to the session
-            self.sessions[session_id].__dict__["inform_handler"] = SessionInformHandler(session_id=session_id)
-            
-            # Then execute the tool functions code to inject them into the session
-            exec(code_string, self.sessions[session_id].__dict__)
+            module.__dict__["inform_handler"] = SessionInformHandler(
+                session_id=session_id, spill_dir=self.spill_dir
+            )
+            self.sessions[session_id] = module
 
-        return self.sessions[session_id]
+        # Then inject the tool functions of the current registry into the session
+        self._bind_tools(module)
+        return module
 
     def clear_session(self, session_id: str):
         """
@@ -313,4 +575,7 @@ class SessionManager:
         :param session_id: The ID of the session to clear.
         """
         if session_id in self.sessions:
-            del self.sessions[session_id]
+            module = self.sessions.pop(session_id)
+            inform_handler = module.__dict__.get("inform_handler")
+            if inform_handler is not None:
+                inform_handler.result_stream.close()
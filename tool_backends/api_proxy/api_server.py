@@ -1,17 +1,40 @@
 import uvicorn
 import os
-from fastapi import FastAPI, HTTPException, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from fastapi.responses import JSONResponse
 from models import SearchRequest, ReadPdfInfo, FetchWebContent
-from api_utils.web_search_api import serper_google_search
-from api_utils.pdf_read_api import read_pdf_from_url
-from api_utils.fetch_web_page_api import fetch_web_content
+from api_utils.web_search_api import cached_google_search, search_cache
+from api_utils.pdf_read_api import pdf_cache, read_pdf_from_url
+from api_utils.fetch_web_page_api import fetch_web_content, page_cache
+from api_utils.http_client import start_session, close_session
+from api_utils.executors import (
+    API_WORKERS,
+    PoolOverloaded,
+    executor_stats,
+    shutdown_executors,
+)
 
+# Requests per second accepted by the whole server; each worker process enforces its share
+API_RATE_LIMIT = int(os.getenv("API_RATE_LIMIT", 200))
+WORKER_RATE_LIMIT = f"{max(1, -(-API_RATE_LIMIT // API_WORKERS))}/second"
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled HTTP session per process, so upstream calls reuse keep-alive connections
+    await start_session()
+    try:
+        yield
+    finally:
+        await close_session()
+        shutdown_executors()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # initialize limiter
 limiter = Limiter(key_func=get_remote_address)
@@ -19,10 +42,10 @@ app.state.limiter = limiter
 
 
 @app.post("/search")
-@limiter.limit("200/second")
-async def search(request: Request, search_request: SearchRequest):
+@limiter.limit(WORKER_RATE_LIMIT)
+async def search(request: Request, response: Response, search_request: SearchRequest):
     try:
-        result = await serper_google_search(
+        result, cache_status = await cached_google_search(
             search_request.query,
             search_request.serper_api_key,
             search_request.top_k,
@@ -30,6 +53,7 @@ async def search(request: Request, search_request: SearchRequest):
             search_request.lang,
             depth=search_request.depth,
         )
+        response.headers["X-Cache"] = cache_status
         return result
     except HTTPException as e:
         raise e
@@ -38,19 +62,26 @@ async def search(request: Request, search_request: SearchRequest):
 
 
 @app.post("/read_pdf")
-@limiter.limit("200/second")
+@limiter.limit(WORKER_RATE_LIMIT)
 async def read_pdf(request: Request, read_pdf_request: ReadPdfInfo):
     try:
-        result = await read_pdf_from_url(read_pdf_request.url)
+        result = await read_pdf_from_url(
+            read_pdf_request.url,
+            start_page=read_pdf_request.start_page,
+            end_page=read_pdf_request.end_page,
+            max_pages=read_pdf_request.max_pages,
+        )
         return result
     except HTTPException as e:
         raise e
+    except PoolOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
 @app.post("/fetch_web")
-@limiter.limit("200/second")
+@limiter.limit(WORKER_RATE_LIMIT)
 async def fetch_web(request: Request, fetch_web_request: FetchWebContent):
     try:
         result = await fetch_web_content(fetch_web_request.url)
@@ -61,11 +92,21 @@ async def fetch_web(request: Request, fetch_web_request: FetchWebContent):
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
+@app.get("/stats")
+async def stats():
+    return {
+        "search_cache": search_cache.stats(),
+        "pdf_cache": pdf_cache.stats(),
+        "page_cache": page_cache.stats(),
+        "executors": executor_stats(),
+    }
+
+
 @app.exception_handler(RateLimitExceeded)
 async def rate_limit_exception_handler(request: Request, exc: RateLimitExceeded):
     return JSONResponse(
         status_code=429,
-        content={"detail": "Too many requests. Limit is 200 requests per second."},
+        content={"detail": f"Too many requests. Limit is {API_RATE_LIMIT} requests per second."},
         headers={"Retry-After": "1"},
     )
 
@@ -73,5 +114,9 @@ async def rate_limit_exception_handler(request: Request, exc: RateLimitExceeded)
 if __name__ == "__main__":
     PORT = os.getenv("PORT", 1234)
     uvicorn.run(
-        "api_server:app", host="0.0.0.0", port=int(PORT), lifespan="on", workers=1
+        "api_server:app",
+        host="0.0.0.0",
+        port=int(PORT),
+        lifespan="on",
+        workers=API_WORKERS,
     )
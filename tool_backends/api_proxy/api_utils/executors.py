@@ -0,0 +1,128 @@
+import os
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# Number of uvicorn worker processes; pool sizes below are per worker
+API_WORKERS = int(os.getenv("API_WORKERS", 1))
+
+# Processes for CPU-bound parsing (PDF text extraction) and callers allowed to wait for them
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", max(1, min(8, (os.cpu_count() or 1) // API_WORKERS))))
+CPU_QUEUE = int(os.getenv("CPU_QUEUE", CPU_WORKERS * 4))
+# Threads for blocking I/O (file access, opening documents) and callers allowed to wait for them
+IO_THREADS = int(os.getenv("IO_THREADS", 32))
+IO_QUEUE = int(os.getenv("IO_QUEUE", 256))
+
+
+class PoolOverloaded(Exception):
+    """Raised when a task is submitted to a pool whose wait queue is full."""
+
+
+class BoundedExecutor:
+    """
+    An executor with a bounded number of running tasks and a bounded wait queue.
+
+    At most ``max_workers`` tasks are handed to the underlying executor at once.
+    Up to ``max_queue`` more callers wait for a free worker; callers arriving when
+    the queue is full are rejected at once instead of piling up behind slow work.
+    The underlying executor is created on first use.
+
+    :ivar name: Name used in errors and statistics.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[int], Executor],
+        max_workers: int,
+        max_queue: int,
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._factory = factory
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.running = 0
+        self.completed_total = 0
+        self.rejected_total = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self._factory(self.max_workers)
+        return self._executor
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Runs ``fn(*args, **kwargs)`` on the pool.
+
+        :raises PoolOverloaded: If the wait queue of the pool is full.
+        :return: The result of the call.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected_total += 1
+            raise PoolOverloaded(
+                f"The {self.name} pool is overloaded ({self.running} running, {self.waiting} waiting)"
+            )
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            self.running -= 1
+            self.completed_total += 1
+            self._semaphore.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed_total": self.completed_total,
+            "rejected_total": self.rejected_total,
+        }
+
+
+# Spawned rather than forked, since the server process runs threads
+cpu_pool = BoundedExecutor(
+    "cpu",
+    lambda workers: ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ),
+    CPU_WORKERS,
+    CPU_QUEUE,
+)
+io_pool = BoundedExecutor(
+    "io",
+    lambda workers: ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-io"),
+    IO_THREADS,
+    IO_QUEUE,
+)
+
+
+def shutdown_executors():
+    cpu_pool.shutdown()
+    io_pool.shutdown()
+
+
+def executor_stats() -> Dict[str, Dict[str, int]]:
+    return {"cpu": cpu_pool.stats(), "io": io_pool.stats()}
@@ -1,52 +1,250 @@
 import aiohttp
 import asyncio
+import codecs
 import json
 import os, sys
-import functools
-import requests
+import re
+import time
+import tempfile
 
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(os.path.dirname(current_dir)))
 
+try:
+    from api_utils.http_client import close_session, get_session
+except ImportError:
+    # Run as a script from the api_utils directory
+    from http_client import close_session, get_session
+from MCP.tool_cache import CachePolicy, ToolCache
+
 FAILED_INFO = "Failed to fetch web page"
 
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", 10))
+# Bytes of a page read at most; longer pages are truncated
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", 5 * 1024 * 1024))
+FETCH_CHUNK_BYTES = 64 * 1024
+# Seconds the direct fetch runs alone before the scrape API is raced against it
+FETCH_HEDGE_DELAY = float(os.getenv("FETCH_HEDGE_DELAY", 3))
+
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "1") != "0"
+# Seconds a fetched page is served without asking the site again
+PAGE_CACHE_FRESH_TTL = float(os.getenv("PAGE_CACHE_FRESH_TTL", 600))
+# Seconds a page with an ETag or Last-Modified is kept for revalidation
+PAGE_CACHE_MAX_AGE = float(os.getenv("PAGE_CACHE_MAX_AGE", 86400))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", 256))
+PAGE_CACHE_MAX_DISK_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_DISK_ENTRIES", 20000))
+# SQLite file shared by all api_proxy workers; empty keeps the cache in memory only
+PAGE_CACHE_DB = os.getenv(
+    "PAGE_CACHE_DB", os.path.join(tempfile.gettempdir(), "api_proxy_pages.sqlite")
+)
+
+page_cache = ToolCache(
+    default_policy=CachePolicy(cacheable=True, ttl=PAGE_CACHE_FRESH_TTL),
+    max_entries=PAGE_CACHE_MAX_ENTRIES,
+    db_path=PAGE_CACHE_DB if PAGE_CACHE_ENABLED else "",
+    max_disk_entries=PAGE_CACHE_MAX_DISK_ENTRIES,
+    enabled=PAGE_CACHE_ENABLED,
+)
+
 with open(f"{current_dir}/../../configs/web_agent.json", "r") as f:
     config = json.load(f)
     serper_api_key = config["serper_api_key"]
 
 
-def sync_fetch_html(url: str, timeout=10) -> tuple[bool, str]:
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
-        "Accept-Language": "zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7",
-        "Accept-Encoding": "gzip, deflate",
-        "Upgrade-Insecure-Requests": "1",
-        "DNT": "1",
+BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+    "Accept-Language": "zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7",
+    "Accept-Encoding": "gzip, deflate",
+    "Upgrade-Insecure-Requests": "1",
+    "DNT": "1",
+}
+
+# Content types that are never readable pages; application/octet-stream is sniffed instead
+BINARY_CONTENT_TYPES = (
+    "image/",
+    "audio/",
+    "video/",
+    "font/",
+    "application/pdf",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-tar",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/msword",
+    "application/vnd.ms-",
+    "application/vnd.openxmlformats",
+)
+
+# Leading bytes of common binary formats
+BINARY_SIGNATURES = (
+    b"%PDF",
+    b"\x89PNG",
+    b"GIF8",
+    b"\xff\xd8\xff",
+    b"PK\x03\x04",
+    b"\x1f\x8b",
+    b"Rar!",
+    b"7z\xbc\xaf",
+    b"RIFF",
+    b"OggS",
+    b"ID3",
+    b"\x00\x00\x01\x00",
+    b"wOFF",
+    b"\xd0\xcf\x11\xe0",
+)
+
+_CHARSET_RE = re.compile(r"charset=[\"']?([\w.:-]+)", re.I)
+_META_CHARSET_RE = re.compile(rb"<meta[^>]+charset=[\"']?([\w.:-]+)", re.I)
+
+
+def is_binary_content_type(content_type: str) -> bool:
+    content_type = content_type.lower()
+    return any(content_type.startswith(prefix) for prefix in BINARY_CONTENT_TYPES)
+
+
+def looks_binary(data: bytes) -> bool:
+    """Sniffs the first bytes of a body for binary file signatures and NUL bytes."""
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return False
+    if data.startswith(BINARY_SIGNATURES) or data[4:8] == b"ftyp":
+        return True
+    return b"\x00" in data[:1024]
+
+
+def _codec(name):
+    if not name:
+        return None
+    if isinstance(name, bytes):
+        name = name.decode("ascii", errors="ignore")
+    try:
+        return codecs.lookup(name.strip()).name
+    except LookupError:
+        return None
+
+
+def decode_html(body: bytes, content_type: str = "") -> str:
+    """
+    Decodes a page body using, in order: the charset of the Content-Type header,
+    a byte order mark, a <meta> charset declaration, strict UTF-8, and a guess
+    by charset_normalizer if it is installed.
+    """
+    match = _CHARSET_RE.search(content_type or "")
+    declared = _codec(match.group(1)) if match else None
+    if declared is None:
+        if body.startswith(codecs.BOM_UTF8):
+            declared = "utf-8-sig"
+        elif body.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            declared = "utf-16"
+        else:
+            match = _META_CHARSET_RE.search(body[:4096])
+            declared = _codec(match.group(1)) if match else None
+    if declared:
+        return body.decode(declared, errors="replace")
+
+    try:
+        # The body may be cut off mid-character by the size limit
+        return codecs.getincrementaldecoder("utf-8")("strict").decode(body, final=False)
+    except UnicodeDecodeError:
+        pass
+    try:
+        from charset_normalizer import from_bytes
+
+        best = from_bytes(body[:65536]).best()
+        if best is not None and best.encoding:
+            return body.decode(best.encoding, errors="replace")
+    except ImportError:
+        pass
+    return body.decode("utf-8", errors="replace")
+
+
+async def get_cached_page(url: str):
+    """Returns the cache entry of a page: a dict with text, etag, last_modified and validated_at."""
+    if not PAGE_CACHE_ENABLED:
+        return None
+    return await page_cache.get("fetch_web", {"url": url})
+
+
+async def store_page(url: str, text: str, etag: str = None, last_modified: str = None):
+    """
+    Caches a fetched page. Pages with a validator are kept for PAGE_CACHE_MAX_AGE
+    so they can be revalidated; others expire after PAGE_CACHE_FRESH_TTL.
+    """
+    if not PAGE_CACHE_ENABLED:
+        return
+    entry = {
+        "text": text,
+        "etag": etag,
+        "last_modified": last_modified,
+        "validated_at": time.time(),
     }
+    ttl = PAGE_CACHE_MAX_AGE if (etag or last_modified) else PAGE_CACHE_FRESH_TTL
+    await page_cache.set("fetch_web", {"url": url}, entry, ttl=ttl)
+
 
-    session = requests.Session()
+async def download_htmlpage(
+    url: str,
+    timeout: float = FETCH_TIMEOUT,
+    max_bytes: int = FETCH_MAX_BYTES,
+    cached: dict = None,
+) -> tuple[bool, str]:
+    """
+    Fetches a page on the shared session, reading the body in chunks, and caches it.
+
+    Binary content is rejected as soon as the headers or the first chunk give it
+    away, and reading stops after ``max_bytes`` (the page is then truncated).
+    With a ``cached`` entry the request is conditional, and a 304 response
+    returns the cached text.
+
+    :return: A tuple (ok, text or FAILED_INFO).
+    """
+    headers = BROWSER_HEADERS
+    if cached and (cached.get("etag") or cached.get("last_modified")):
+        headers = dict(BROWSER_HEADERS)
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
     try:
-        response = session.get(
-            url, headers=headers, timeout=timeout, allow_redirects=True
-        )
-        response.encoding = "utf-8"
-        response.raise_for_status()
+        session = get_session()
+        async with session.get(
+            url,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            allow_redirects=True,
+        ) as response:
+            if cached and response.status == 304:
+                await store_page(url, cached["text"], cached.get("etag"), cached.get("last_modified"))
+                return (True, cached["text"])
+            response.raise_for_status()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            content_type = response.headers.get("Content-Type", "")
+            if is_binary_content_type(content_type):
+                print(f"[error] request {url} skipped: binary content type {content_type}")
+                return (False, FAILED_INFO)
+
+            body = bytearray()
+            async for chunk in response.content.iter_chunked(FETCH_CHUNK_BYTES):
+                if not body and looks_binary(chunk):
+                    print(f"[error] request {url} skipped: binary content")
+                    return (False, FAILED_INFO)
+                body.extend(chunk)
+                if len(body) >= max_bytes:
+                    print(f"[warning] request {url} truncated at {max_bytes} bytes")
+                    del body[max_bytes:]
+                    break
 
-        return (True, response.text)
+        text = decode_html(bytes(body), content_type)
+        if text:
+            await store_page(url, text, etag, last_modified)
+        return (True, text)
 
     except Exception as e:
         print(f"[error] request {url} failed：{e}")
         return (False, FAILED_INFO)
-    finally:
-        session.close()
-
-
-async def download_htmlpage(url: str, timeout=10) -> tuple[bool, str]:
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(
-        None, functools.partial(sync_fetch_html, url, timeout)
-    )
 
 
 async def get_web_content_api(url: str):
@@ -55,11 +253,14 @@ async def get_web_content_api(url: str):
     headers = {"X-API-KEY": serper_api_key, "Content-Type": "application/json"}
 
     try:
-        async with aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=15)
-        ) as session:
-            async with session.post(api_url, json=payload, headers=headers) as response:
-                result = await response.json()
+        session = get_session()
+        async with session.post(
+            api_url,
+            json=payload,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=15),
+        ) as response:
+            result = await response.json()
     except Exception as e:
         print(f"\033[91mAPI request failed: {e}\033[0m")
         return FAILED_INFO
@@ -67,14 +268,56 @@ async def get_web_content_api(url: str):
     return result.get("markdown") or result.get("text") or FAILED_INFO
 
 
+async def _scrape_web_content(url: str) -> tuple[bool, str]:
+    result = await get_web_content_api(url)
+    is_ok = bool(result) and FAILED_INFO not in result
+    if is_ok:
+        await store_page(url, result)
+    return (is_ok, result)
+
+
 async def fetch_web_content(url: str):
-    is_download, result = await download_htmlpage(url)
-    if not is_download or not result:
-        print(f"\033[91mFailed to crawl web content, using API: {url}\033[0m")
-        result = await get_web_content_api(url)
-    if FAILED_INFO in result:
+    """
+    Fetches a page directly, hedged by the scrape API.
+
+    If the direct fetch fails, the scrape API is called at once. If it is still
+    running after FETCH_HEDGE_DELAY seconds, the scrape API is started alongside
+    it and whichever succeeds first wins; the other request is cancelled.
+
+    Pages fetched within PAGE_CACHE_FRESH_TTL are served from the page cache;
+    older cached pages are revalidated with their ETag or Last-Modified, and
+    served stale if the page cannot be fetched at all.
+    """
+    cached = await get_cached_page(url)
+    if cached and time.time() - cached["validated_at"] < PAGE_CACHE_FRESH_TTL:
+        return True, cached["text"]
+
+    tasks = {asyncio.create_task(download_htmlpage(url, cached=cached))}
+    hedged = False
+    try:
+        while tasks:
+            timeout = None if hedged else FETCH_HEDGE_DELAY
+            done, tasks = await asyncio.wait(
+                tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                is_ok, result = task.result()
+                if is_ok and result:
+                    return True, result
+            if not hedged and (not done or not tasks):
+                if done:
+                    print(f"\033[91mFailed to crawl web content, using API: {url}\033[0m")
+                else:
+                    print(f"\033[93mSlow direct fetch, racing API: {url}\033[0m")
+                tasks.add(asyncio.create_task(_scrape_web_content(url)))
+                hedged = True
+        if cached:
+            print(f"\033[93mServing stale cached page: {url}\033[0m")
+            return True, cached["text"]
         return False, FAILED_INFO
-    return True, result
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
 async def main():
@@ -84,6 +327,7 @@ async def main():
         print(html)
     else:
         print("❌ Failed to fetch web content.")
+    await close_session()
 
 
 if __name__ == "__main__":
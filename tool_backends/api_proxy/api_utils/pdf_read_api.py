@@ -1,60 +1,245 @@
-import requests
 import fitz
-import io
-import traceback
+import os
+import sys
+import aiohttp
 import asyncio
-
-
-def sync_read_pdf(url: str) -> str:
+import tempfile
+import traceback
+from typing import Optional
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(os.path.dirname(current_dir)))
+
+try:
+    from api_utils.http_client import close_session, get_session
+    from api_utils.executors import PoolOverloaded, cpu_pool, io_pool, shutdown_executors
+except ImportError:
+    # Run as a script from the api_utils directory
+    from http_client import close_session, get_session
+    from executors import PoolOverloaded, cpu_pool, io_pool, shutdown_executors
+from MCP.tool_cache import CachePolicy, ToolCache
+
+READ_FAILED = "Failed to read the PDF"
+EMPTY_CONTENT = "Failed to get the PDF content"
+
+# Largest PDF downloaded, in bytes
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", 50 * 1024 * 1024))
+PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT", 60))
+# Documents with at least this many pages to extract are split across the CPU pool
+PDF_PARALLEL_PAGES = int(os.getenv("PDF_PARALLEL_PAGES", 32))
+# Pages extracted when the request does not set max_pages; 0 means all
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", 0))
+
+PDF_CACHE_ENABLED = os.getenv("PDF_CACHE_ENABLED", "1") != "0"
+PDF_CACHE_TTL = float(os.getenv("PDF_CACHE_TTL", 24 * 3600))
+PDF_CACHE_MAX_ENTRIES = int(os.getenv("PDF_CACHE_MAX_ENTRIES", 256))
+# SQLite file for an on-disk tier of extracted text; empty disables it
+PDF_CACHE_DB = os.getenv("PDF_CACHE_DB", "")
+
+pdf_cache = ToolCache(
+    default_policy=CachePolicy(cacheable=True, ttl=PDF_CACHE_TTL),
+    max_entries=PDF_CACHE_MAX_ENTRIES,
+    db_path=PDF_CACHE_DB,
+    enabled=PDF_CACHE_ENABLED,
+)
+
+
+class PdfReadError(Exception):
+    """Raised for failed reads, so that they are returned as text but never cached."""
+
+    def __init__(self, message: str = READ_FAILED):
+        super().__init__(message)
+        self.message = message
+
+
+def _page_count(path: str) -> int:
+    doc = fitz.open(path, filetype="pdf")
     try:
-        headers = {"Accept": "application/pdf", "User-Agent": "Mozilla/5.0"}
-
-        if "arxiv.org/abs/" in url:
-            paper_id = url.split("/")[-1]
-            url = f"https://arxiv.org/pdf/{paper_id}.pdf"
+        return doc.page_count
+    finally:
+        doc.close()
 
-        response = None
-
-        try:
-            response = requests.get(url, headers=headers, stream=True, timeout=15)
-            response.raise_for_status()
-        except Exception as e:
-            print(f"\033[91mrequest failed: {e},{traceback.format_exc()}\033[0m")
-            return "Failed to read the PDF"
-
-        if response is None or response.content is None or len(response.content) == 0:
-            print("Content is None or empty")
-            return "Failed to get the PDF content"
 
+def _extract_pages(path: str, start: int, end: int) -> str:
+    """Extracts the text of pages [start, end) (0-based). Runs in pool workers."""
+    doc = fitz.open(path, filetype="pdf")
+    try:
+        return "".join(doc[i].get_text() for i in range(start, end))
+    finally:
+        doc.close()
+
+
+def page_range(
+    page_count: int,
+    start_page: int = 1,
+    end_page: Optional[int] = None,
+    max_pages: Optional[int] = None,
+) -> tuple[int, int]:
+    """
+    Turns 1-based, inclusive page parameters into a 0-based range [start, end).
+    """
+    start = min(max(start_page, 1), page_count + 1) - 1
+    end = page_count if end_page is None else min(max(end_page, start), page_count)
+    if max_pages is None:
+        max_pages = PDF_MAX_PAGES
+    if max_pages and max_pages > 0:
+        end = min(end, start + max_pages)
+    return start, end
+
+
+async def extract_text(
+    path: str,
+    start_page: int = 1,
+    end_page: Optional[int] = None,
+    max_pages: Optional[int] = None,
+) -> str:
+    """
+    Extracts the text of a PDF file in the CPU pool. Large page ranges are split
+    into contiguous chunks that are extracted in parallel.
+
+    :raises PoolOverloaded: If the CPU or I/O pool cannot take more work.
+    """
+    page_count = await io_pool.run(_page_count, path)
+    start, end = page_range(page_count, start_page, end_page, max_pages)
+    pages = end - start
+    if pages <= 0:
+        return ""
+    if pages < PDF_PARALLEL_PAGES or cpu_pool.max_workers <= 1:
+        return await cpu_pool.run(_extract_pages, path, start, end)
+
+    chunk = -(-pages // cpu_pool.max_workers)
+    parts = await asyncio.gather(
+        *[
+            cpu_pool.run(_extract_pages, path, i, min(i + chunk, end))
+            for i in range(start, end, chunk)
+        ]
+    )
+    return "".join(parts)
+
+
+def _append(path: str, chunk: bytes):
+    with open(path, "ab") as file:
+        file.write(chunk)
+
+
+async def _download(response: aiohttp.ClientResponse, path: str):
+    """
+    Streams a response body to ``path``, enforcing PDF_MAX_BYTES. File writes run
+    in the I/O pool so that they do not block the event loop.
+
+    :raises PoolOverloaded: If the I/O pool cannot take more work.
+    """
+    if response.content_length and response.content_length > PDF_MAX_BYTES:
+        raise PdfReadError(f"The PDF is larger than the limit of {PDF_MAX_BYTES} bytes")
+    size = 0
+    async for chunk in response.content.iter_chunked(256 * 1024):
+        size += len(chunk)
+        if size > PDF_MAX_BYTES:
+            raise PdfReadError(f"The PDF is larger than the limit of {PDF_MAX_BYTES} bytes")
+        await io_pool.run(_append, path, chunk)
+    if size == 0:
+        print("Content is None or empty")
+        raise PdfReadError(EMPTY_CONTENT)
+
+
+async def _read_response(response: aiohttp.ClientResponse, **pages) -> str:
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        await _download(response, path)
         try:
-            pdf_bytes = io.BytesIO(response.content)
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-
-            text = ""
-            for i, page in enumerate(doc):
-                text += page.get_text()
-
-            return text.strip()
+            text = await extract_text(path, **pages)
+        except PoolOverloaded:
+            raise
         except Exception as e:
             print(f"\033[91mRead failed {e},{traceback.format_exc()}\033[0m")
-            return "Failed to read the PDF"
-
+            raise PdfReadError()
+        return text.strip()
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+async def read_pdf_from_url(
+    url: str,
+    start_page: int = 1,
+    end_page: Optional[int] = None,
+    max_pages: Optional[int] = None,
+) -> str:
+    """
+    Downloads a PDF to a temporary file and returns its text.
+
+    Extracted text is cached under the URL, the page parameters and the ETag
+    (or Last-Modified) of the response. When the text of a document is cached,
+    the request is conditional (If-None-Match / If-Modified-Since) and a 304
+    response is answered from the cache without a body; text of a document
+    without validators is served from the cache without a request.
+
+    :param url: URL of the PDF; arxiv.org/abs/ links are rewritten to the PDF.
+    :param start_page: First page to read, 1-based.
+    :param end_page: Last page to read (inclusive); None for the last page.
+    :param max_pages: Maximum number of pages to read; None for PDF_MAX_PAGES.
+    :raises PoolOverloaded: If the server has no capacity left for the extraction.
+    :return: The text, or an error message.
+    """
+    headers = {"Accept": "application/pdf", "User-Agent": "Mozilla/5.0"}
+
+    if "arxiv.org/abs/" in url:
+        paper_id = url.split("/")[-1]
+        url = f"https://arxiv.org/pdf/{paper_id}.pdf"
+
+    pages = {"start_page": start_page, "end_page": end_page, "max_pages": max_pages}
+    try:
+        # Validators of the last response for the URL, and the text cached under them
+        known = await pdf_cache.get("read_pdf_validators", {"url": url}) or {}
+        validator = known.get("etag") or known.get("last_modified") or ""
+        cached = await pdf_cache.get("read_pdf", {"url": url, "validator": validator, **pages})
+        if cached is not None:
+            if not validator:
+                return cached
+            if known.get("etag"):
+                headers["If-None-Match"] = known["etag"]
+            if known.get("last_modified"):
+                headers["If-Modified-Since"] = known["last_modified"]
+
+        session = get_session()
+        async with session.get(
+            url,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=PDF_TIMEOUT, sock_read=15),
+        ) as response:
+            if cached is not None and response.status == 304:
+                return cached
+            response.raise_for_status()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                await pdf_cache.set(
+                    "read_pdf_validators",
+                    {"url": url},
+                    {"etag": etag, "last_modified": last_modified},
+                )
+            args = {"url": url, "validator": etag or last_modified or "", **pages}
+            return await pdf_cache.get_or_call(
+                "read_pdf", args, lambda: _read_response(response, **pages)
+            )
+    except PdfReadError as e:
+        return e.message
+    except PoolOverloaded:
+        raise
     except Exception as e:
-        print(f"\033[91mRead failed: {e},{traceback.format_exc()}\033[0m")
-        return "Failed to read the PDF"
-
-
-async def read_pdf_from_url(url: str) -> str:
-    import functools
-
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, functools.partial(sync_read_pdf, url))
+        print(f"\033[91mrequest failed: {e},{traceback.format_exc()}\033[0m")
+        return READ_FAILED
 
 
 async def main():
     url = "https://arxiv.org/pdf/2305.14342"
     content = await read_pdf_from_url(url)
     print(content)
+    await close_session()
+    shutdown_executors()
 
 
 if __name__ == "__main__":
@@ -27,14 +27,98 @@ def get_config_path():
 # 获取基础路径
 base_dir = get_config_path()
 
+try:
+    from api_utils.http_client import (
+        RETRYABLE_STATUSES,
+        close_session,
+        get_session,
+        parse_retry_after,
+        sleep_before_retry,
+    )
+except ImportError:
+    # Run as a script from the api_utils directory
+    from http_client import (
+        RETRYABLE_STATUSES,
+        close_session,
+        get_session,
+        parse_retry_after,
+        sleep_before_retry,
+    )
+
+from MCP.tool_cache import CACHE_BYPASS, CACHE_MISS, CachePolicy, ToolCache
+
 # 加载web_agent配置
 with open(os.path.join(base_dir, "configs/web_agent.json"), "r") as f:
     config = json.load(f)
 
 
+# Retries after the first attempt of a search
+SEARCH_MAX_RETRIES = int(os.getenv("SEARCH_MAX_RETRIES", 3))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", 10))
+
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "1") != "0"
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", 3600))
+# Entries kept in memory per process
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 10000))
+# SQLite file for an on-disk tier that survives restarts; empty disables it
+SEARCH_CACHE_DB = os.getenv("SEARCH_CACHE_DB", "")
+
+# Queries that differ only in case or whitespace share an entry; the API key is not part of the key
+search_cache = ToolCache(
+    default_policy=CachePolicy(
+        cacheable=True,
+        ttl=SEARCH_CACHE_TTL,
+        normalize=("strip", "collapse_whitespace", "casefold"),
+    ),
+    max_entries=SEARCH_CACHE_MAX_ENTRIES,
+    db_path=SEARCH_CACHE_DB,
+    enabled=SEARCH_CACHE_ENABLED,
+)
+
+
+class SearchAPIError(Exception):
+    def __init__(self, message: str, retryable: bool = True, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+async def _serper_request(url: str, payload: dict, headers: dict):
+    session = get_session()
+    async with session.post(
+        url,
+        json=payload,
+        headers=headers,
+        timeout=aiohttp.ClientTimeout(total=SEARCH_TIMEOUT),
+    ) as response:
+        if response.status != 200:
+            raise SearchAPIError(
+                f"API Error: {response.status}",
+                retryable=response.status in RETRYABLE_STATUSES,
+                retry_after=parse_retry_after(response.headers.get("Retry-After")),
+            )
+        data = await response.json()
+
+    data.pop("searchParameters", None)
+    data.pop("credits", None)
+
+    if not data:
+        raise SearchAPIError(
+            "The google search API is temporarily unavailable, please try again later."
+        )
+    return data
+
+
 async def serper_google_search(
     query: str, serper_api_key: str, top_k: int, region: str, lang: str, depth: int = 0
 ):
+    """
+    Searches Google through serper.dev over the shared connection pool.
+
+    Throttling, server errors and network failures are retried with jittered
+    exponential backoff, honoring Retry-After; other errors (e.g. an invalid
+    API key) fail at once. ``depth`` is the number of attempts already made.
+    """
     url = "https://google.serper.dev/search"
     payload = {
         "q": query,
@@ -46,36 +130,53 @@ async def serper_google_search(
 
     headers = {"X-API-KEY": serper_api_key, "Content-Type": "application/json"}
 
+    attempt = depth
+    while True:
+        try:
+            return await _serper_request(url, payload, headers)
+        except (SearchAPIError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            retryable = getattr(e, "retryable", True)
+            if not retryable or attempt >= SEARCH_MAX_RETRIES:
+                print(f"search failed: {e}")
+                print(traceback.format_exc())
+                return []
+            await sleep_before_retry(attempt, getattr(e, "retry_after", None))
+            attempt += 1
+        except Exception as e:
+            print(f"search failed: {e}")
+            print(traceback.format_exc())
+            return []
+
+
+class _EmptySearchResult(Exception):
+    """Raised inside the cache so that failed searches are not stored."""
+
+
+async def cached_google_search(
+    query: str, serper_api_key: str, top_k: int, region: str, lang: str, depth: int = 0
+):
+    """
+    Runs serper_google_search through the search cache. Concurrent identical
+    searches share one upstream call, and failed searches are never cached.
+
+    :return: A tuple (result, cache_status), cache_status being HIT, DISK_HIT,
+             COALESCED, MISS or BYPASS.
+    """
+    if not SEARCH_CACHE_ENABLED:
+        result = await serper_google_search(query, serper_api_key, top_k, region, lang, depth)
+        return result, CACHE_BYPASS
+
+    async def call():
+        result = await serper_google_search(query, serper_api_key, top_k, region, lang, depth)
+        if not result:
+            raise _EmptySearchResult()
+        return result
+
+    args = {"query": query, "top_k": top_k, "region": region, "lang": lang}
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url,
-                json=payload,
-                headers=headers,
-                timeout=aiohttp.ClientTimeout(total=10),
-            ) as response:
-                if response.status != 200:
-                    raise Exception(f"API Error: {response.status}")
-                data = await response.json()
-
-                data.pop("searchParameters", None)
-                data.pop("credits", None)
-
-                if not data:
-                    raise Exception(
-                        "The google search API is temporarily unavailable, please try again later."
-                    )
-                return data
-
-    except Exception as e:
-        if depth < 3:
-            await asyncio.sleep(1)
-            return await serper_google_search(
-                query, serper_api_key, top_k, region, lang, depth=depth + 1
-            )
-        print(f"search failed: {e}")
-        print(traceback.format_exc())
-        return []
+        return await search_cache.get_or_call_with_status("serper_google_search", args, call)
+    except _EmptySearchResult:
+        return [], CACHE_MISS
 
 
 async def main():
@@ -88,6 +189,7 @@ async def main():
         lang=config["search_lang"],
     )
     print(json.dumps(result, indent=2))
+    await close_session()
 
 
 if __name__ == "__main__":
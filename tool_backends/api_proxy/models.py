@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 
@@ -16,6 +17,9 @@ class SearchPaperInfo(BaseModel):
 
 class ReadPdfInfo(BaseModel):
     url: str
+    start_page: int = 1
+    end_page: Optional[int] = None
+    max_pages: Optional[int] = None
 
 
 class FetchWebContent(BaseModel):